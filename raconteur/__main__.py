@@ -57,6 +57,12 @@ def run_website() -> None:
     )
 
 
+def run_benchmarks() -> None:
+    from raconteur.benchmarks import run_benchmarks
+
+    run_benchmarks()
+
+
 if __name__ == "__main__":
     arg_parser = ArgumentParser()
     arg_parser.add_argument("component")
@@ -65,5 +71,7 @@ if __name__ == "__main__":
         run_bot()
     elif args.component == "web":
         run_website()
+    elif args.component == "benchmark":
+        run_benchmarks()
     else:
-        raise ValueError(f'Invalid component "{args.component}", must be one of: "bot", "web"')
+        raise ValueError(f'Invalid component "{args.component}", must be one of: "bot", "web", "benchmark"')
@@ -0,0 +1,61 @@
+import random
+import timeit
+from typing import Callable
+
+BENCHMARK_REPEATS = 5
+
+
+def run_benchmarks() -> None:
+    from raconteur.plugins.character.dice import parse_dice_expression, roll_dice_expression
+    from raconteur.plugins.character.odds import get_distribution, clear_distribution_cache
+    from raconteur.plugins.umbreal.choices import DiceResult, determine_best_choices, determine_plot_point_choices
+    from raconteur.plugins.umbreal.odds import get_cortex_odds, clear_cortex_odds_cache
+
+    rng = random.Random(0)
+    _benchmark("dice: parse (cached)", lambda: parse_dice_expression("4d6kh3 + 2"), 100_000)
+    for expression_text, number in (
+            ("1d20 + 5", 20_000),
+            ("6x 3d6", 10_000),
+            ("4d6kh3", 20_000),
+            ("10d6!", 10_000),
+            ("1000d6", 1_000),
+    ):
+        expression = parse_dice_expression(expression_text)
+        _benchmark(f"dice: roll {expression_text}", lambda: roll_dice_expression(expression, rng), number)
+
+    for expression_text, number in (
+            ("3d6", 1_000),
+            ("4d6kh3", 100),
+            ("300d6", 10),
+    ):
+        expression = parse_dice_expression(expression_text)
+
+        def compute_distribution() -> None:
+            clear_distribution_cache()
+            get_distribution(expression)
+
+        _benchmark(f"odds: {expression_text}", compute_distribution, number)
+    _benchmark("odds: 300d6 (cached)", lambda: get_distribution(parse_dice_expression("300d6")), 100_000)
+
+    for num_dice, number in ((5, 20_000), (12, 5_000), (50, 500), (200, 20)):
+        ratings = [rng.choice((4, 6, 8, 10, 12)) for _ in range(num_dice)]
+        results = [DiceResult(name=f"d{rating}", rating=rating, value=rng.randint(1, rating)) for rating in ratings]
+        _benchmark(f"cortex: choices for {num_dice} dice", lambda: determine_best_choices(results), number)
+        free_choices = determine_best_choices(results)
+        _benchmark(
+            f"cortex: plot point choices for {num_dice} dice",
+            lambda: determine_plot_point_choices(results, free_choices),
+            number,
+        )
+
+    for pool, number in (((10, 8, 6), 1_000), ((12, 10, 10, 8, 8, 6, 6, 4), 20)):
+        def compute_cortex_odds() -> None:
+            clear_cortex_odds_cache()
+            get_cortex_odds(list(pool))
+
+        _benchmark(f"cortex: odds for {len(pool)} dice", compute_cortex_odds, number)
+
+
+def _benchmark(name: str, func: Callable[[], object], number: int) -> None:
+    best = min(timeit.repeat(func, number=number, repeat=BENCHMARK_REPEATS))
+    print(f"{name:<40} {number / best:>12,.0f} ops/s  ({best / number * 1e6:.2f} µs/op)")
@@ -1,10 +1,13 @@
+import logging
 from datetime import datetime
-from typing import Iterable, Union
+from typing import Iterable, Union, Optional, Any
 
-from discord import Intents, Client, Message, Guild, Member, TextChannel, Reaction
+from discord import Intents, Client, Message, Guild, Member, TextChannel, Reaction, RawMessageDeleteEvent, \
+    RawBulkMessageDeleteEvent, HTTPException
 from discord.abc import Messageable, User
 
 from raconteur.commands import is_possible_command
+from raconteur.interactions import Interaction, InteractionType, INTERACTION_CREATE_EVENT, overwrite_guild_commands
 from raconteur.models.base import get_session
 from raconteur.plugin import Plugin
 from raconteur.plugins import PLUGINS
@@ -13,10 +16,33 @@ from raconteur.queries import get_or_create_game
 
 class RaconteurBot(Client):
     plugins: list[Plugin]
+    app_id: Optional[int]
 
     def __init__(self) -> None:
         super().__init__(intents=_get_bot_intents())
         self.plugins = [plugin_cls(bot=self) for plugin_cls in PLUGINS]
+        self.app_id = None
+
+    async def on_ready(self) -> None:
+        for plugin in self.plugins:
+            await plugin.on_ready()
+
+        # Ready is sent again on reconnections, but commands only need to be registered once
+        if self.app_id is None:
+            self.app_id = (await self.application_info()).id
+            for guild in self.guilds:
+                await self.sync_application_commands(guild)
+
+    async def close(self) -> None:
+        for plugin in self.plugins:
+            try:
+                await plugin.on_close()
+            except Exception as e:
+                logging.exception(e)
+        await super().close()
+
+    async def on_guild_join(self, guild: Guild) -> None:
+        await self.sync_application_commands(guild)
 
     async def on_message(self, message: Message) -> None:
         # Ignore all DMs
@@ -38,6 +64,23 @@ class RaconteurBot(Client):
             for plugin in enabled_plugins:
                 await plugin.on_message(message)
 
+    async def on_raw_message_delete(self, payload: RawMessageDeleteEvent) -> None:
+        guild = self.get_guild(payload.guild_id) if payload.guild_id else None
+        if not guild:
+            return
+
+        for plugin in self.get_enabled_plugins(guild):
+            await plugin.on_message_delete(guild, payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload: RawBulkMessageDeleteEvent) -> None:
+        guild = self.get_guild(payload.guild_id) if payload.guild_id else None
+        if not guild:
+            return
+
+        for plugin in self.get_enabled_plugins(guild):
+            for message_id in payload.message_ids:
+                await plugin.on_message_delete(guild, message_id)
+
     # noinspection PyUnusedLocal
     async def on_typing(self, channel: Messageable, user: Union[User, Member], when: datetime) -> None:
         # Ignore anything but a guild text channel
@@ -55,6 +98,39 @@ class RaconteurBot(Client):
         for plugin in self.get_enabled_plugins(reaction.message.guild):
             await plugin.on_reaction_add(reaction, user)
 
+    async def on_socket_response(self, payload: dict) -> None:
+        # This version of discord.py doesn't handle interactions, so they are picked up from the raw gateway events
+        if payload.get("t") != INTERACTION_CREATE_EVENT:
+            return
+        interaction = Interaction.from_payload(payload["d"])
+        guild = self.get_guild(interaction.guild_id) if interaction.guild_id else None
+        if not guild:
+            return
+
+        if interaction.type == InteractionType.APPLICATION_COMMAND:
+            for plugin in self.get_enabled_plugins(guild):
+                if await plugin.on_application_command(guild, interaction):
+                    break
+        else:
+            for plugin in self.get_enabled_plugins(guild):
+                await plugin.on_interaction(guild, interaction)
+
+    async def sync_application_commands(self, guild: Guild) -> None:
+        """Registers the commands of the plugins enabled in a guild as its application commands."""
+        if self.app_id is None:
+            return
+        # Like with messages, the first plugin to define a command handles it
+        commands: dict[str, dict[str, Any]] = {}
+        for plugin in self.get_enabled_plugins(guild):
+            for plugin_command in plugin.commands.values():
+                if not plugin_command.hidden:
+                    commands.setdefault(plugin_command.name, plugin_command.to_application_command())
+        try:
+            await overwrite_guild_commands(self.http, self.app_id, guild.id, list(commands.values()))
+        except HTTPException as e:
+            # Most likely the bot was invited without the applications.commands scope; prefix commands still work
+            logging.warning(f"Failed to register application commands in guild {guild.id}: {e}")
+
     def get_enabled_plugins(self, guild: Guild) -> Iterable[Plugin]:
         with get_session() as session:
             game = get_or_create_game(session, guild)
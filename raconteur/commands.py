@@ -38,6 +38,18 @@ CHANNEL_MENTION_PATTERN = re.compile(r"^<#([0-9]+)>$")
 
 CONTEXT_ARG = "ctx"
 
+# Limits and option types of Discord application commands
+MAX_APPLICATION_COMMAND_DESCRIPTION_CHARS = 100
+TEXT_CHANNEL_TYPE = 0
+APPLICATION_COMMAND_OPTION_TYPES: dict[ParamType, int] = {
+    str: 3,
+    int: 4,
+    bool: 5,
+    Member: 6,
+    TextChannel: 7,
+    Role: 8,
+}
+
 
 @dataclass(frozen=True)
 class CommandCallResponse:
@@ -112,6 +124,42 @@ class CommandParam:
 
         raise TypeError(f'Invalid type "{self.type}" for param {self.name}')
 
+    def parse_option(self, guild: Guild, option_value: Any) -> Union[ParamValueType, tuple[ParamValueType, ...]]:
+        # Options of application commands arrive already typed, with users, roles and channels resolved to their IDs
+        if self.collect:
+            return self.parse(guild, _split_param_values(str(option_value)))
+        elif self.type in (str, bool, int):
+            return self.type(option_value)
+        elif self.type == Member:
+            member = guild.get_member(int(option_value))
+            if not member:
+                raise CommandParamUserNotFoundException(self.name, option_value)
+            return member
+        elif self.type == Role:
+            role = guild.get_role(int(option_value))
+            if not role:
+                raise CommandParamRoleNotFoundException(self.name, option_value)
+            return role
+        elif self.type == TextChannel:
+            channel = guild.get_channel(int(option_value))
+            if not isinstance(channel, TextChannel):
+                raise CommandParamChannelNotFoundException(self.name, option_value)
+            return channel
+
+        raise TypeError(f'Invalid type "{self.type}" for param {self.name}')
+
+    def to_application_command_option(self) -> dict[str, Any]:
+        # Collected values are entered as a single string, split the same way as in a message
+        option: dict[str, Any] = {
+            "type": APPLICATION_COMMAND_OPTION_TYPES[str if self.collect else self.type],
+            "name": self.name,
+            "description": self.name.replace("_", " ") + ("..." if self.collect else ""),
+            "required": self.required,
+        }
+        if self.type == TextChannel:
+            option["channel_types"] = [TEXT_CHANNEL_TYPE]
+        return option
+
 
 class Command:
     callback: Callable
@@ -152,50 +200,13 @@ class Command:
     def __call__(self, *args: Any, **kwargs: Any) -> Union[AsyncIterable, Coroutine]:
         return self.callback(*args, **kwargs)
 
-    def __str__(self) -> str:
-        params = [
-            f"` `{'*' if not param.required else ''}`{param.name}`{'*' if not param.required else ''}"
-            f"{'`...`' if param.collect else ''}"
-            for param in self.params
-        ]
-        return f"**`{COMMAND_PREFIX}{self.name}`**{''.join(params).replace('``', '')}: {self.help_msg}"
-
-
-@dataclass(frozen=True)
-class CommandCallContext:
-    channel: TextChannel
-    guild: Guild
-    member: Member
-    message: Message
-
-    def get_game(self, session: Session) -> Game:
-        assert self.message.guild
-        return get_or_create_game(
-            session,
-            self.message.guild  # type: ignore
-        )
-
-
-@dataclass(frozen=True)
-class CommandCall:
-    command: Command
-    raw_param_values: str
-
-    async def invoke(self, message: Message) -> AsyncIterable[CommandCallResponse]:
+    async def invoke(
+            self, ctx: "CommandCallContext", parsed_params: dict[str, Any]
+    ) -> AsyncIterable[CommandCallResponse]:
         args = []
-        parsed_params = self.parse_params(
-            message.guild  # type: ignore
-        )
-        for callback_arg in self.command.callback_args:
+        for callback_arg in self.callback_args:
             if callback_arg == CONTEXT_ARG:
-                args.append(
-                    CommandCallContext(
-                        channel=message.channel,
-                        guild=message.guild,  # type: ignore
-                        member=message.author,
-                        message=message,
-                    )
-                )
+                args.append(ctx)
             else:
                 if callback_arg in parsed_params:
                     param_value = parsed_params[callback_arg]
@@ -203,7 +214,7 @@ class CommandCall:
                         args.extend(param_value)
                     else:
                         args.append(param_value)
-        invoked_command = self.command(*args)
+        invoked_command = self(*args)
         if inspect.iscoroutine(invoked_command):
             response = self.process_result(await invoked_command)  # type: ignore
             if response:
@@ -227,6 +238,64 @@ class CommandCall:
         else:
             raise TypeError(f"Invalid response type: {result.__class__.__name__}")
 
+    def parse_options(self, guild: Guild, options: list[dict[str, Any]]) -> dict[str, Any]:
+        values = {option["name"]: option["value"] for option in options}
+        parsed_params = {}
+        for param in self.params:
+            if param.name in values:
+                parsed_params[param.name] = param.parse_option(guild, values[param.name])
+            elif param.required:
+                raise CommandParamMissingException(param.name)
+        return parsed_params
+
+    def to_application_command(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "description": _truncate(self.help_msg, MAX_APPLICATION_COMMAND_DESCRIPTION_CHARS),
+            "options": [param.to_application_command_option() for param in self.params],
+        }
+
+    def __str__(self) -> str:
+        params = [
+            f"` `{'*' if not param.required else ''}`{param.name}`{'*' if not param.required else ''}"
+            f"{'`...`' if param.collect else ''}"
+            for param in self.params
+        ]
+        return f"**`{COMMAND_PREFIX}{self.name}`**{''.join(params).replace('``', '')}: {self.help_msg}"
+
+
+@dataclass(frozen=True)
+class CommandCallContext:
+    channel: TextChannel
+    guild: Guild
+    member: Member
+    # Only set for commands sent as a message, not for application commands
+    message: Optional[Message] = None
+
+    def get_game(self, session: Session) -> Game:
+        return get_or_create_game(session, self.guild)
+
+
+@dataclass(frozen=True)
+class CommandCall:
+    command: Command
+    raw_param_values: str
+
+    async def invoke(self, message: Message) -> AsyncIterable[CommandCallResponse]:
+        ctx = CommandCallContext(
+            channel=message.channel,
+            guild=message.guild,  # type: ignore
+            member=message.author,
+            message=message,
+        )
+        async for response in self.command.invoke(
+            ctx,
+            self.parse_params(
+                message.guild  # type: ignore
+            ),
+        ):
+            yield response
+
     def parse_params(self, guild: Guild) -> dict[str, Any]:
         parsed_params = {}
 
@@ -338,6 +407,20 @@ def parse_message_as_command_call(commands: dict[str, Command], message: Message
     return CommandCall(command=commands[name], raw_param_values=raw_param_values) if name in commands else None
 
 
+def _split_param_values(string: str) -> list[str]:
+    values = []
+    idx = _consume_whitespace(string, 0)
+    while idx < len(string):
+        value, idx = _get_param_value(string, idx)
+        values.append(value)
+        idx = _consume_whitespace(string, idx)
+    return values
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[:max_chars - 3].rstrip() + "..."
+
+
 def _get_param_value(string: str, idx: int) -> tuple[str, int]:
     idx = _consume_whitespace(string, idx)
     c = string[idx]
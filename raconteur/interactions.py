@@ -0,0 +1,207 @@
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Optional, Any
+
+from discord import TextChannel
+from discord.http import HTTPClient, Route
+
+from raconteur.messages import split_message, replace_emojis
+
+INTERACTION_CREATE_EVENT = "INTERACTION_CREATE"
+MAX_SELECT_OPTIONS = 25
+MAX_SELECT_LABEL_CHARS = 100
+MAX_SELECT_PLACEHOLDER_CHARS = 150
+EPHEMERAL_MESSAGE_FLAG = 1 << 6
+
+
+class InteractionType(IntEnum):
+    PING = 1
+    APPLICATION_COMMAND = 2
+    MESSAGE_COMPONENT = 3
+
+
+class InteractionResponseType(IntEnum):
+    CHANNEL_MESSAGE_WITH_SOURCE = 4
+    DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE = 5
+    DEFERRED_UPDATE_MESSAGE = 6
+    UPDATE_MESSAGE = 7
+
+
+class ComponentType(IntEnum):
+    ACTION_ROW = 1
+    BUTTON = 2
+    SELECT_MENU = 3
+
+
+@dataclass(frozen=True)
+class Interaction:
+    """An interaction received from the gateway, which the version of discord.py in use doesn't support itself."""
+
+    id: int
+    application_id: int
+    token: str
+    type: InteractionType
+    guild_id: Optional[int]
+    channel_id: int
+    member_id: Optional[int]
+    message_id: Optional[int]
+    data: dict[str, Any]
+
+    @classmethod
+    def from_payload(cls, payload: dict[str, Any]) -> "Interaction":
+        member = payload.get("member")
+        message = payload.get("message")
+        return cls(
+            id=int(payload["id"]),
+            application_id=int(payload["application_id"]),
+            token=payload["token"],
+            type=InteractionType(payload["type"]),
+            guild_id=int(payload["guild_id"]) if "guild_id" in payload else None,
+            channel_id=int(payload["channel_id"]),
+            member_id=int(member["user"]["id"]) if member else None,
+            message_id=int(message["id"]) if message else None,
+            data=payload.get("data", {}),
+        )
+
+    @property
+    def custom_id(self) -> Optional[str]:
+        return self.data.get("custom_id")
+
+    @property
+    def values(self) -> list[str]:
+        return self.data.get("values", [])
+
+    @property
+    def command_name(self) -> Optional[str]:
+        return self.data.get("name") if self.type == InteractionType.APPLICATION_COMMAND else None
+
+    @property
+    def options(self) -> list[dict[str, Any]]:
+        return self.data.get("options", [])
+
+
+@dataclass(frozen=True)
+class SelectOption:
+    label: str
+    value: str
+    description: Optional[str] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        option = {"label": self.label[:MAX_SELECT_LABEL_CHARS], "value": self.value}
+        if self.description:
+            option["description"] = self.description[:MAX_SELECT_LABEL_CHARS]
+        return option
+
+
+def build_select_menu(custom_id: str, placeholder: str, options: list[SelectOption]) -> list[dict[str, Any]]:
+    if len(options) > MAX_SELECT_OPTIONS:
+        raise ValueError(f"A select menu can have at most {MAX_SELECT_OPTIONS} options")
+    return [{
+        "type": ComponentType.ACTION_ROW,
+        "components": [{
+            "type": ComponentType.SELECT_MENU,
+            "custom_id": custom_id,
+            "placeholder": placeholder[:MAX_SELECT_PLACEHOLDER_CHARS],
+            "options": [option.to_dict() for option in options],
+        }],
+    }]
+
+
+async def send_message_with_components(
+        http: HTTPClient, channel: TextChannel, text: str, components: list[dict[str, Any]]
+) -> int:
+    """Sends a message like `send_message`, with the components attached to its last part, and returns its ID."""
+    messages = split_message(replace_emojis(channel, text))
+    for message in messages[:-1]:
+        await channel.send(message)
+    data = await http.request(
+        Route("POST", "/channels/{channel_id}/messages", channel_id=channel.id),
+        json={"content": messages[-1], "components": components},
+    )
+    return int(data["id"])
+
+
+async def edit_message_components(
+        http: HTTPClient, channel_id: int, message_id: int, components: list[dict[str, Any]]
+) -> None:
+    await http.request(
+        Route("PATCH", "/channels/{channel_id}/messages/{message_id}", channel_id=channel_id, message_id=message_id),
+        json={"components": components},
+    )
+
+
+async def respond_to_interaction(
+        http: HTTPClient,
+        interaction: Interaction,
+        response_type: InteractionResponseType,
+        data: Optional[dict[str, Any]] = None,
+) -> None:
+    await http.request(
+        Route(
+            "POST",
+            "/interactions/{interaction_id}/{interaction_token}/callback",
+            interaction_id=interaction.id,
+            interaction_token=interaction.token,
+        ),
+        json={"type": response_type, "data": data} if data is not None else {"type": response_type},
+    )
+
+
+async def reply_ephemeral(http: HTTPClient, interaction: Interaction, text: str) -> None:
+    await respond_to_interaction(
+        http,
+        interaction,
+        InteractionResponseType.CHANNEL_MESSAGE_WITH_SOURCE,
+        {"content": text, "flags": EPHEMERAL_MESSAGE_FLAG},
+    )
+
+
+class DeferredResponse:
+    """Messages answering an interaction which was acknowledged first, to be answered once the work is done.
+
+    The first message replaces the placeholder shown while the bot is thinking, and later ones are sent as follow-ups.
+    If nothing was sent by the end, the placeholder is deleted.
+    """
+
+    http: HTTPClient
+    interaction: Interaction
+    replaced_original: bool
+
+    def __init__(self, http: HTTPClient, interaction: Interaction):
+        self.http = http
+        self.interaction = interaction
+        self.replaced_original = False
+
+    async def send(self, channel: TextChannel, text: str) -> None:
+        for message in split_message(replace_emojis(channel, text)):
+            if not self.replaced_original:
+                await self.http.request(self._get_route("PATCH", "/messages/@original"), json={"content": message})
+                self.replaced_original = True
+            else:
+                await self.http.request(self._get_route("POST", ""), json={"content": message})
+
+    async def close(self) -> None:
+        if not self.replaced_original:
+            await self.http.request(self._get_route("DELETE", "/messages/@original"))
+
+    def _get_route(self, method: str, path: str) -> Route:
+        return Route(
+            method,
+            "/webhooks/{webhook_id}/{webhook_token}" + path,
+            webhook_id=self.interaction.application_id,
+            webhook_token=self.interaction.token,
+        )
+
+
+async def overwrite_guild_commands(
+        http: HTTPClient, application_id: int, guild_id: int, commands: list[dict[str, Any]]
+) -> None:
+    await http.request(
+        Route(
+            "PUT",
+            "/applications/{application_id}/guilds/{guild_id}/commands",
+            application_id=application_id,
+            guild_id=guild_id,
+        ),
+        json=commands,
+    )
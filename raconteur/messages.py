@@ -6,7 +6,16 @@ MESSAGE_CHARS_LIMIT = 2000
 
 
 async def send_message(channel: TextChannel, text: str, files: Optional[list[File]] = None) -> Message:
-    text = replace_emojis(channel, text)
+    messages = split_message(replace_emojis(channel, text))
+    last_idx = len(messages) - 1
+    last_message = None
+    for i, message in enumerate(messages):
+        last_message = await channel.send(message, files=(files if i == last_idx else None))
+    assert last_message
+    return last_message
+
+
+def split_message(text: str) -> list[str]:
     lines = text.split("\n")
     messages = [""]
     for line in lines:
@@ -17,12 +26,7 @@ async def send_message(channel: TextChannel, text: str, files: Optional[list[Fil
                 messages.append("")
                 line = line[MESSAGE_CHARS_LIMIT:]
         messages[-1] += line + "\n"
-    last_idx = len(messages) - 1
-    last_message = None
-    for i, message in enumerate(messages):
-        last_message = await channel.send(message.strip(), files=(files if i == last_idx else None))
-    assert last_message
-    return last_message
+    return [message.strip() for message in messages]
 
 
 def replace_emojis(channel: TextChannel, text: str) -> str:
@@ -4,16 +4,18 @@ import inspect
 import logging
 from dataclasses import dataclass
 from functools import partial
-from typing import Optional, ClassVar, TYPE_CHECKING, Union, Any
+from typing import Optional, ClassVar, TYPE_CHECKING, Union, Any, Type
 
 from discord import Message, Member, TextChannel, Reaction, Guild
 from fastapi import APIRouter
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from sqlalchemy import Column, ForeignKey
 from sqlalchemy.orm import declared_attr, declarative_mixin, relationship, RelationshipProperty, Session
 
 from raconteur.commands import Command, parse_message_as_command_call, COMMAND_PREFIX, CommandCallContext
 from raconteur.exceptions import CommandException
+from raconteur.interactions import Interaction, InteractionResponseType, DeferredResponse, respond_to_interaction, \
+    reply_ephemeral
 from raconteur.messages import send_message
 from raconteur.models.base import get_session
 from raconteur.models.game import Game
@@ -51,12 +53,18 @@ class PluginModelMixin:
 
 
 class PluginSettings(BaseModel):
-    pass
+    class Config:
+        validate_assignment = True
+
+
+# Settings of every plugin for each guild, keyed by plugin name and guild ID
+_settings_cache: dict[tuple[str, int], PluginSettings] = {}
 
 
 class Plugin:
     bot: RaconteurBot
     commands: dict[str, Command]
+    settings_model: ClassVar[Type[PluginSettings]] = PluginSettings
 
     def __init__(self, bot: RaconteurBot):
         self.bot = bot
@@ -67,7 +75,7 @@ class Plugin:
         if command_call:
             full_command_name = COMMAND_PREFIX + command_call.command.name
             try:
-                if not has_permission_for_command(command_call.command, message):
+                if not has_permission_for_command(command_call.command, message.author):
                     raise CommandException(f"Insufficient permissions to use command `{full_command_name}`")
                 async for result in command_call.invoke(message):
                     if result.text:
@@ -88,28 +96,102 @@ class Plugin:
             return True
         return False
 
+    async def on_application_command(self, guild: Guild, interaction: Interaction) -> bool:
+        plugin_command = self.commands.get(interaction.command_name) if interaction.command_name else None
+        if not plugin_command:
+            return False
+        full_command_name = COMMAND_PREFIX + plugin_command.name
+        channel = guild.get_channel(interaction.channel_id)
+        member = guild.get_member(interaction.member_id) if interaction.member_id else None
+        if not isinstance(channel, TextChannel) or not member:
+            await reply_ephemeral(self.bot.http, interaction, f"Command `{full_command_name}` can't be used here")
+            return True
+        if not has_permission_for_command(plugin_command, member):
+            await reply_ephemeral(
+                self.bot.http, interaction, f"Insufficient permissions to use command `{full_command_name}`"
+            )
+            return True
+
+        # Commands may take longer to run than Discord waits for an answer, so the interaction is acknowledged first
+        await respond_to_interaction(
+            self.bot.http, interaction, InteractionResponseType.DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE
+        )
+        response = DeferredResponse(self.bot.http, interaction)
+        try:
+            ctx = CommandCallContext(channel=channel, guild=guild, member=member)
+            async for result in plugin_command.invoke(ctx, plugin_command.parse_options(guild, interaction.options)):
+                if result.text:
+                    await response.send(channel, result.text)
+        except CommandException as e:
+            await response.send(channel, str(e))
+        except Exception as e:
+            await response.send(channel, f"Failed to process command: Unknown error")
+            logging.exception(e)
+        else:
+            logging.info(f"Successfully processed application command {full_command_name} from {member}")
+        finally:
+            await response.close()
+        return True
+
+    async def on_ready(self) -> None:
+        pass
+
+    async def on_close(self) -> None:
+        pass
+
     async def on_message(self, message: Message) -> None:
         pass
 
+    async def on_message_delete(self, guild: Guild, message_id: int) -> None:
+        pass
+
     async def on_typing(self, channel: TextChannel, member: Member) -> None:
         pass
 
     async def on_reaction_add(self, reaction: Reaction, user: Member) -> None:
         pass
 
-    def get_setting(self, session: Session, guild: Guild, name: str) -> Optional[Any]:
-        return get_setting(self.__class__.__name__, session, guild, name)
+    async def on_interaction(self, guild: Guild, interaction: Interaction) -> None:
+        pass
+
+    @classmethod
+    def get_settings(cls, guild: Guild) -> PluginSettings:
+        key = (cls.__name__, guild.id)
+        if key not in _settings_cache:
+            with get_session() as session:
+                game = session.get(Game, guild.id)
+                game_plugin = game.get_plugin(cls) if game else None
+                try:
+                    settings = cls.settings_model.parse_obj(game_plugin.settings if game_plugin else {})
+                except ValidationError as e:
+                    logging.warning(f"Invalid stored settings for {cls.__name__} in guild {guild.id}: {e}")
+                    settings = cls.settings_model()
+            _settings_cache[key] = settings
+        return _settings_cache[key]
 
-    def set_setting(self, guild: Guild, session: Session, name: str, value: Any, plugin: Optional[str] = None) -> None:
-        plugin = plugin or self.__class__.__name__
+    @classmethod
+    def set_setting(cls, guild: Guild, session: Session, name: str, value: Any) -> Any:
+        if name not in cls.settings_model.__fields__:
+            raise CommandException(f"Unknown setting `{name}` for plugin {cls.__name__}")
         game = session.get(Game, guild.id)
         if not game:
             raise CommandException("Game is not initialized")
-        game_plugin = game.get_plugin(plugin)
+        game_plugin = game.get_plugin(cls)
         if not game_plugin:
-            raise CommandException(f"Plugin {plugin} is not enabled")
-        game_plugin.settings[name] = value
+            raise CommandException(f"Plugin {cls.__name__} is not enabled")
+        settings = cls.get_settings(guild).copy()
+        try:
+            setattr(settings, name, value)
+        except ValidationError as e:
+            raise CommandException(f"Invalid value `{value}` for setting `{name}`: {e.errors()[0]['msg']}")
+        game_plugin.settings[name] = getattr(settings, name)
         session.commit()
+        _settings_cache[(cls.__name__, guild.id)] = settings
+        return getattr(settings, name)
+
+    @classmethod
+    def invalidate_settings(cls, guild: Guild) -> None:
+        _settings_cache.pop((cls.__name__, guild.id), None)
 
     def get_commands(self) -> dict[str, Command]:
         commands: dict[str, Command] = {}
@@ -143,20 +225,9 @@ class Plugin:
         return {}
 
 
-def get_setting(plugin: str, session: Session, guild: Guild, name: str) -> Optional[Any]:
-    plugin = plugin
-    game = session.get(Game, guild.id)
-    if not game:
-        raise CommandException("Game is not initialized")
-    game_plugin = game.get_plugin(plugin)
-    if not game_plugin:
-        raise CommandException(f"Plugin {plugin} is not enabled")
-    return game_plugin.settings.get(name)
-
-
-def has_permission_for_command(command: Command, message: Message) -> bool:
+def has_permission_for_command(command: Command, member: Member) -> bool:
     if command.requires_player or command.requires_gm:
-        permissions = get_permissions_for_member(message.author)
+        permissions = get_permissions_for_member(member)
         if command.requires_gm and not permissions.is_gm:
             return False
         if command.requires_player and not permissions.is_player:
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, or_, and_
+
+from raconteur.models.base import get_session
+from raconteur.plugins.character.models import ActivityRollup, ActivityKind
+
+ACTIVITY_FLUSH_INTERVAL = 60
+ACTIVITY_FLUSH_THRESHOLD = 500
+# Rows touched by a flush are fetched in chunks, each condition taking four parameters out of SQLite's limit of 999
+ACTIVITY_FLUSH_QUERY_CHUNK_SIZE = 200
+
+ActivityKey = tuple[int, ActivityKind, int, datetime]
+
+
+def get_hour(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+class ActivityTracker:
+    """Counts game activity per guild, kind, subject and hour.
+
+    Events are only counted in memory; the counts are merged into the hourly rollup rows in batches, either on an
+    interval or once enough events have piled up, so that busy scenes don't cost a database write per message.
+    Recording never touches the database itself, it only wakes up the background flush.
+    """
+
+    counts: Counter[ActivityKey]
+    task: Optional[asyncio.Task]
+    flush_requested: Optional[asyncio.Event]
+
+    def __init__(self) -> None:
+        self.counts = Counter()
+        self.task = None
+        self.flush_requested = None
+
+    def start(self) -> None:
+        if not self.task:
+            self.flush_requested = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    def record(self, guild_id: int, kind: ActivityKind, subject_id: int, timestamp: Optional[datetime] = None) -> None:
+        self.counts[(guild_id, kind, subject_id, get_hour(timestamp or datetime.utcnow()))] += 1
+        if len(self.counts) >= ACTIVITY_FLUSH_THRESHOLD and self.flush_requested:
+            self.flush_requested.set()
+
+    def flush(self) -> bool:
+        """Writes the pending counts, and returns whether it succeeded.
+
+        Counts which couldn't be written are merged back, to be written by the next flush.
+        """
+        if not self.counts:
+            return True
+        counts, self.counts = self.counts, Counter()
+        try:
+            self._write(counts)
+        except Exception as e:
+            self.counts.update(counts)
+            logging.exception(e)
+            return False
+        return True
+
+    @staticmethod
+    def _write(counts: Counter[ActivityKey]) -> None:
+        keys = list(counts)
+        with get_session() as session:
+            # Fetch every row touched by this batch, then update or create them in a single transaction
+            existing: dict[ActivityKey, ActivityRollup] = {}
+            for start in range(0, len(keys), ACTIVITY_FLUSH_QUERY_CHUNK_SIZE):
+                existing.update({
+                    (rollup.game_guild_id, rollup.kind, rollup.subject_id, rollup.hour): rollup
+                    for rollup, in session.execute(select(ActivityRollup).where(or_(*[
+                        and_(
+                            ActivityRollup.game_guild_id == guild_id,
+                            ActivityRollup.kind == kind,
+                            ActivityRollup.subject_id == subject_id,
+                            ActivityRollup.hour == hour,
+                        )
+                        for guild_id, kind, subject_id, hour in keys[start:start + ACTIVITY_FLUSH_QUERY_CHUNK_SIZE]
+                    ])))
+                })
+            for key, count in counts.items():
+                if key in existing:
+                    existing[key].count += count
+                else:
+                    guild_id, kind, subject_id, hour = key
+                    session.add(ActivityRollup(
+                        game_guild_id=guild_id, kind=kind, subject_id=subject_id, hour=hour, count=count,
+                    ))
+            session.commit()
+
+    async def _run(self) -> None:
+        assert self.flush_requested
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_requested.wait(), ACTIVITY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_requested.clear()
+            if not self.flush():
+                # Wait for a whole interval before trying again, rather than on every new event
+                await asyncio.sleep(ACTIVITY_FLUSH_INTERVAL)
+
+
+activity_tracker = ActivityTracker()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Optional
+
+from discord import TextChannel, Message, HTTPException, Forbidden, NotFound
+
+from raconteur.messages import send_message
+
+ANNOUNCE_CONCURRENCY = 4
+ANNOUNCE_SEND_INTERVAL = 0.5
+ANNOUNCE_MAX_ATTEMPTS = 3
+ANNOUNCE_RETRY_DELAY = 2
+ANNOUNCE_PROGRESS_INTERVAL = 3
+
+
+class Announcement:
+    """Sends the same text to many channels without flooding the API.
+
+    A small pool of workers pulls channels from a shared queue, waiting between sends; transient failures are retried
+    with an increasing delay, while permanent ones (missing channel or permissions) are recorded right away. Cancelling
+    stops the workers from picking up new channels, but lets in-flight sends finish.
+    """
+
+    channels: list[TextChannel]
+    text: str
+    num_sent: int
+    failures: dict[int, str]
+    cancelled: bool
+
+    def __init__(self, channels: list[TextChannel], text: str, failures: Optional[dict[int, str]] = None):
+        self.channels = channels
+        self.text = text
+        self.num_sent = 0
+        self.failures = failures or {}
+        self.cancelled = False
+
+    @property
+    def total(self) -> int:
+        return len(self.channels) + len(self.failures)
+
+    @property
+    def num_done(self) -> int:
+        return self.num_sent + len(self.failures)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    async def run(self, progress_message: Optional[Message] = None) -> None:
+        queue: asyncio.Queue[TextChannel] = asyncio.Queue()
+        for channel in self.channels:
+            queue.put_nowait(channel)
+        workers = asyncio.gather(*[self._work(queue) for _ in range(min(ANNOUNCE_CONCURRENCY, len(self.channels)))])
+        while not workers.done():
+            if progress_message:
+                await self._update_progress(progress_message)
+            await asyncio.wait([workers], timeout=ANNOUNCE_PROGRESS_INTERVAL)
+        await workers
+        if progress_message:
+            await self._update_progress(progress_message)
+
+    def format_progress(self) -> str:
+        status = "Cancelled" if self.cancelled else ("Done" if self.num_done == self.total else "Announcing")
+        return f"{status}: sent to {self.num_sent} of {self.total} channel(s), {len(self.failures)} failed."
+
+    def format_report(self) -> str:
+        report = self.format_progress()
+        if self.failures:
+            report += "\nFailed channels:" + "".join(
+                f"\n- <#{channel_id}>: {error}" for channel_id, error in self.failures.items()
+            )
+        return report
+
+    async def _work(self, queue: asyncio.Queue[TextChannel]) -> None:
+        while not self.cancelled and not queue.empty():
+            channel = queue.get_nowait()
+            if error := await self._send(channel):
+                self.failures[channel.id] = error
+            else:
+                self.num_sent += 1
+            await asyncio.sleep(ANNOUNCE_SEND_INTERVAL)
+
+    async def _send(self, channel: TextChannel) -> Optional[str]:
+        for attempt in range(1, ANNOUNCE_MAX_ATTEMPTS + 1):
+            try:
+                await send_message(channel, self.text)
+                return None
+            except (Forbidden, NotFound) as e:
+                # Retrying won't help with these
+                return e.text or str(e)
+            except HTTPException as e:
+                if attempt == ANNOUNCE_MAX_ATTEMPTS:
+                    return e.text or str(e)
+                await asyncio.sleep(ANNOUNCE_RETRY_DELAY * attempt)
+        return None
+
+    async def _update_progress(self, progress_message: Message) -> None:
+        try:
+            await progress_message.edit(content=self.format_progress())
+        except HTTPException as e:
+            logging.exception(e)
@@ -7,7 +7,10 @@ from discord import Guild, Embed, TextChannel, Message, File, Attachment
 from jinja2 import Environment, Template
 
 from raconteur.messages import send_message
-from raconteur.plugins.character.models import Location, Character, CharacterTraitType
+from raconteur.plugins.character.activity import activity_tracker
+from raconteur.plugins.character.models import Location, Character, CharacterTraitType, ActivityKind
+
+STATUS_ACTIVITY_SAMPLE = 50
 
 
 async def send_message_copies(
@@ -37,6 +40,7 @@ async def send_broadcast(guild: Guild, location: Location, text: str) -> list[Me
             channels.append(channel)
     if channel := guild.get_channel(location.channel_id):
         channels.append(channel)
+    activity_tracker.record(guild.id, ActivityKind.BROADCAST, location.id)
     return list(await asyncio.gather(*[send_message(channel, text) for channel in channels]))
 
 
@@ -44,11 +48,16 @@ async def send_status(guild: Guild, character: Character) -> None:
     channel: TextChannel = guild.get_channel(character.channel_id)
     if not channel:
         return
-    now = datetime.utcnow()
+    activity = [message.created_at async for message in channel.history(limit=STATUS_ACTIVITY_SAMPLE)]
+    await channel.send(embed=build_status_embed(character, activity))
+
+
+def build_status_embed(character: Character, activity: list[datetime]) -> Embed:
     if character.location:
+        now = datetime.utcnow()
         last_week = last_day = last_hour = 0
-        async for message in channel.history(limit=50):
-            seconds = (now - message.created_at).total_seconds()
+        for timestamp in activity:
+            seconds = (now - timestamp).total_seconds()
             if seconds <= 3600:
                 last_hour += 1
             if seconds <= 3600 * 24:
@@ -56,11 +65,11 @@ async def send_status(guild: Guild, character: Character) -> None:
             if seconds <= 3600 * 24 * 7:
                 last_week += 1
         if last_hour > 1:
-            business = f"Looks like it's been {_get_business_qualifier(last_hour, 50)} here very recently."
+            business = f"Looks like it's been {_get_business_qualifier(last_hour)} here very recently."
         elif last_day:
-            business = f"Looks like it's been {_get_business_qualifier(last_day, 50)} here over the past day."
+            business = f"Looks like it's been {_get_business_qualifier(last_day)} here over the past day."
         elif last_week:
-            business = f"Looks like it's been {_get_business_qualifier(last_week, 50)} here over the past week."
+            business = f"Looks like it's been {_get_business_qualifier(last_week)} here over the past week."
         else:
             business = f"Looks it's been very quiet here recently."
 
@@ -68,18 +77,18 @@ async def send_status(guild: Guild, character: Character) -> None:
         template: Template = environment.from_string(character.location.description)
         description = template.render(
             character_name=character.name,
-            flag={trait.name: trait.value for trait in character.traits if trait.type == CharacterTraitType.FLAG},
+            flag={name: trait.value for name, trait in character.traits.of_type(CharacterTraitType.FLAG).items()},
         )
         embed = Embed(title=character.location.name, description=description)
-        for character in character.location.characters:
-            embed.add_field(name=character.name, value=character.status or "(Unknown status)", inline=True)
+        for occupant in character.location.characters:
+            embed.add_field(name=occupant.name, value=occupant.status or "(Unknown status)", inline=True)
         embed.set_footer(text=business)
     else:
         embed = Embed(title=f"???", description="(Unknown location)")
-    await channel.send(embed=embed)
+    return embed
 
 
-def _get_business_qualifier(quantity: int, max_quantity: int) -> str:
+def _get_business_qualifier(quantity: int, max_quantity: int = STATUS_ACTIVITY_SAMPLE) -> str:
     if quantity / max_quantity < 0.1:
         return "somewhat active"
     elif quantity / max_quantity < 0.5:
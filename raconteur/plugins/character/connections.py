@@ -1,6 +1,7 @@
 import asyncio
 from typing import Optional
 
+from discord import Guild
 from sqlalchemy.orm import Session
 
 from raconteur.commands import CommandCallContext
@@ -8,7 +9,7 @@ from raconteur.exceptions import CommandException
 from raconteur.models.base import get_session
 from raconteur.plugin import get_permissions_for_member
 from raconteur.plugins.character.communication import send_broadcast
-from raconteur.plugins.character.models import Connection, Location, Character
+from raconteur.plugins.character.models import Connection, Location, Character, CharacterKey
 
 
 async def toggle_lock(ctx: CommandCallContext, location_name: str, lock: bool) -> None:
@@ -29,26 +30,13 @@ async def toggle_lock(ctx: CommandCallContext, location_name: str, lock: bool) -
             raise CommandException(
                 f"Cannot {change} `{location_name}`: no connection to `{location_name}` from here."
             )
-        if permissions.is_gm or permissions.is_player and character.has_key(connection):
+        if permissions.is_gm or permissions.is_player and CharacterKey.exists(session, character.id, connection.id):
             if connection.locked is lock:
                 raise CommandException(
                     f"Cannot {change} `{location_name}`: connection is already {change}ed."
                 )
             else:
-                connection.locked = lock
-                session.commit()
-                await asyncio.gather(
-                    send_broadcast(
-                        ctx.guild,
-                        connection.location_1,
-                        f"The connection to `{connection.location_2.name}` has been {change}ed."
-                    ),
-                    send_broadcast(
-                        ctx.guild,
-                        connection.location_2,
-                        f"The connection to `{connection.location_1.name}` has been {change}ed."
-                    ),
-                )
+                await set_connection_locked(session, ctx.guild, connection, lock)
                 return None
         else:
             raise CommandException(
@@ -75,23 +63,37 @@ async def toggle_hidden(ctx: CommandCallContext, location_name: str, hide: bool)
                 f"Cannot {change} `{location_name}`: connection is already {change_result}."
             )
         else:
-            connection.hidden = hide
-            session.commit()
-            await asyncio.gather(
-                send_broadcast(
-                    ctx.guild,
-                    connection.location_1,
-                    f"The connection to `{connection.location_2.name}` has been {change_result}."
-                ),
-                send_broadcast(
-                    ctx.guild,
-                    connection.location_2,
-                    f"The connection to `{connection.location_1.name}` has been {change_result}."
-                ),
-            )
+            await set_connection_hidden(session, ctx.guild, connection, hide)
             return None
 
 
+async def set_connection_locked(session: Session, guild: Guild, connection: Connection, lock: bool) -> None:
+    connection.locked = lock
+    session.commit()
+    await _broadcast_connection_change(guild, connection, "locked" if lock else "unlocked")
+
+
+async def set_connection_hidden(session: Session, guild: Guild, connection: Connection, hide: bool) -> None:
+    connection.hidden = hide
+    session.commit()
+    await _broadcast_connection_change(guild, connection, "hidden" if hide else "revealed")
+
+
+async def _broadcast_connection_change(guild: Guild, connection: Connection, change_result: str) -> None:
+    await asyncio.gather(
+        send_broadcast(
+            guild,
+            connection.location_1,
+            f"The connection to `{connection.location_2.name}` has been {change_result}."
+        ),
+        send_broadcast(
+            guild,
+            connection.location_2,
+            f"The connection to `{connection.location_1.name}` has been {change_result}."
+        ),
+    )
+
+
 def get_connection(
         session: Session, location: Location, new_location_name: str, include_hidden: bool
 ) -> tuple[Optional[Connection], Optional[Location]]:
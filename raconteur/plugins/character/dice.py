@@ -0,0 +1,230 @@
+import random
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Union
+
+from raconteur.exceptions import CommandException
+
+MAX_REPEATS = 20
+MAX_TERMS = 20
+MAX_DICE = 1000
+MAX_SIDES = 1000
+MAX_EXPLODED_DICE = 1000
+MAX_LISTED_DICE = 30
+PERCENTILE_SIDES = 100
+
+REPEAT_PATTERN = re.compile(r"^(\d+)\s*x\s*(.*)$")
+TOKEN_PATTERN = re.compile(
+    r"\s*(?:"
+    r"(?P<dice>(?P<count>\d*)d(?P<sides>\d+|%)(?P<modifiers>(?:(?:kh|kl|dh|dl|k)\d*|!)*))"
+    r"|(?P<number>\d+)"
+    r"|(?P<operator>[+-])"
+    r")"
+)
+MODIFIER_PATTERN = re.compile(r"(kh|kl|dh|dl|k)(\d*)|!")
+
+_rng = random.Random()
+
+
+@dataclass(frozen=True)
+class DiceTerm:
+    count: int
+    sides: int
+    keep_highest: Optional[int] = None
+    keep_lowest: Optional[int] = None
+    explode: bool = False
+
+    @property
+    def faces(self) -> range:
+        # Percentile dice go from 00 to 99, like a pair of d10s
+        return range(0, self.sides) if self.sides == PERCENTILE_SIDES else range(1, self.sides + 1)
+
+    def __str__(self) -> str:
+        modifiers = ""
+        if self.keep_highest is not None:
+            modifiers += f"kh{self.keep_highest}"
+        if self.keep_lowest is not None:
+            modifiers += f"kl{self.keep_lowest}"
+        if self.explode:
+            modifiers += "!"
+        return f"{self.count if self.count > 1 else ''}d{self.sides}{modifiers}"
+
+
+@dataclass(frozen=True)
+class DiceExpression:
+    """A compiled dice expression: a sum of signed dice terms and constants, optionally repeated."""
+
+    terms: tuple[tuple[int, Union[DiceTerm, int]], ...]
+    repeat: int = 1
+
+    @property
+    def num_dice(self) -> int:
+        return sum(term.count for sign, term in self.terms if isinstance(term, DiceTerm))
+
+    def __str__(self) -> str:
+        text = ""
+        for sign, term in self.terms:
+            text += (" - " if sign < 0 else " + ") if text else ("-" if sign < 0 else "")
+            text += str(term)
+        return f"{self.repeat}x {text}" if self.repeat > 1 else text
+
+
+@dataclass(frozen=True)
+class DiceTermResult:
+    term: DiceTerm
+    rolls: list[int]
+    kept: list[bool]
+
+    @property
+    def total(self) -> int:
+        return sum(roll for roll, kept in zip(self.rolls, self.kept) if kept)
+
+
+@dataclass(frozen=True)
+class DiceRollResult:
+    parts: list[tuple[int, Union[DiceTermResult, int]]]
+
+    @property
+    def total(self) -> int:
+        return sum(sign * (part.total if isinstance(part, DiceTermResult) else part) for sign, part in self.parts)
+
+    @property
+    def num_rolls(self) -> int:
+        return sum(len(part.rolls) for sign, part in self.parts if isinstance(part, DiceTermResult))
+
+
+def parse_dice_expression(text: str) -> DiceExpression:
+    # Expressions are normalized first so that trivially different spellings share the same cache entry
+    return _parse_normalized(" ".join(text.lower().split()))
+
+
+@lru_cache(maxsize=512)
+def _parse_normalized(text: str) -> DiceExpression:
+    repeat = 1
+    if match := REPEAT_PATTERN.match(text):
+        repeat = int(match.group(1))
+        text = match.group(2)
+        if not 1 <= repeat <= MAX_REPEATS:
+            raise CommandException(f"Invalid roll: can only repeat a roll up to {MAX_REPEATS} times.")
+
+    terms: list[tuple[int, Union[DiceTerm, int]]] = []
+    sign = 1
+    expects_term = True
+    idx = 0
+    while idx < len(text):
+        match = TOKEN_PATTERN.match(text, idx)
+        if not match or match.end() == idx:
+            raise CommandException(f"Invalid roll: could not understand `{text[idx:].strip()}`.")
+        idx = match.end()
+        if operator := match.group("operator"):
+            if expects_term:
+                # Unary sign, as in `-1 + 1d6`
+                sign = -sign if operator == "-" else sign
+            else:
+                sign = 1 if operator == "+" else -1
+                expects_term = True
+            continue
+        # Terms separated only by whitespace are added together, as in `1d6 3d8`
+        terms.append((sign, _parse_dice_term(match) if match.group("dice") else int(match.group("number"))))
+        sign = 1
+        expects_term = False
+    if expects_term:
+        raise CommandException("Invalid roll: the expression is incomplete.")
+
+    expression = DiceExpression(terms=tuple(terms), repeat=repeat)
+    if len(expression.terms) > MAX_TERMS:
+        raise CommandException(f"Invalid roll: an expression can have at most {MAX_TERMS} terms.")
+    if expression.num_dice * expression.repeat > MAX_DICE:
+        raise CommandException(f"Invalid roll: at most {MAX_DICE} dice can be rolled at once.")
+    return expression
+
+
+def _parse_dice_term(match: re.Match) -> DiceTerm:
+    count = int(match.group("count") or 1)
+    sides = PERCENTILE_SIDES if match.group("sides") == "%" else int(match.group("sides"))
+    if not 1 <= count <= MAX_DICE:
+        raise CommandException(f"Invalid roll: the number of dice must be between 1 and {MAX_DICE}.")
+    if not 2 <= sides <= MAX_SIDES:
+        raise CommandException(f"Invalid roll: dice must have between 2 and {MAX_SIDES} sides.")
+
+    keep_highest = keep_lowest = None
+    explode = False
+    for modifier in MODIFIER_PATTERN.finditer(match.group("modifiers")):
+        if modifier.group(0) == "!":
+            explode = True
+            continue
+        kind, amount = modifier.group(1), int(modifier.group(2) or 1)
+        if kind in ("k", "kh"):
+            keep_highest = amount
+        elif kind == "kl":
+            keep_lowest = amount
+        elif kind == "dh":
+            keep_lowest = max(count - amount, 0)
+        elif kind == "dl":
+            keep_highest = max(count - amount, 0)
+    if keep_highest is not None and keep_lowest is not None:
+        raise CommandException("Invalid roll: cannot keep both the highest and the lowest dice.")
+    return DiceTerm(count=count, sides=sides, keep_highest=keep_highest, keep_lowest=keep_lowest, explode=explode)
+
+
+def roll_dice_expression(expression: DiceExpression, rng: Optional[random.Random] = None) -> list[DiceRollResult]:
+    rng = rng or _rng
+    return [
+        DiceRollResult(parts=[
+            (sign, _roll_term(term, rng) if isinstance(term, DiceTerm) else term) for sign, term in expression.terms
+        ])
+        for _ in range(expression.repeat)
+    ]
+
+
+def _roll_term(term: DiceTerm, rng: random.Random) -> DiceTermResult:
+    # The whole pool is drawn in a single call instead of one die at a time
+    faces = term.faces
+    rolls = rng.choices(faces, k=term.count)
+    if term.explode:
+        # Every die showing its highest face adds another die, which can itself explode
+        highest = faces[-1]
+        num_exploding = rolls.count(highest)
+        num_exploded = 0
+        while num_exploding and num_exploded < MAX_EXPLODED_DICE:
+            num_exploding = min(num_exploding, MAX_EXPLODED_DICE - num_exploded)
+            extra_rolls = rng.choices(faces, k=num_exploding)
+            rolls.extend(extra_rolls)
+            num_exploded += num_exploding
+            num_exploding = extra_rolls.count(highest)
+
+    kept = [True] * len(rolls)
+    if term.keep_highest is not None or term.keep_lowest is not None:
+        order = sorted(range(len(rolls)), key=rolls.__getitem__)
+        if term.keep_highest is not None:
+            dropped = order[:max(len(rolls) - term.keep_highest, 0)]
+        else:
+            dropped = order[term.keep_lowest:]
+        for idx in dropped:
+            kept[idx] = False
+    return DiceTermResult(term=term, rolls=rolls, kept=kept)
+
+
+def format_dice_roll_result(result: DiceRollResult) -> str:
+    parts: list[str] = []
+    for sign, part in result.parts:
+        prefix = ("- " if parts else "-") if sign < 0 else ("+ " if parts else "")
+        parts.append(prefix + (_format_term_result(part) if isinstance(part, DiceTermResult) else str(part)))
+    breakdown = " ".join(parts)
+    if len(result.parts) == 1 and isinstance(result.parts[0][1], DiceTermResult) and result.num_rolls == 1:
+        return breakdown
+    return f"**{result.total}** = {breakdown}"
+
+
+def _format_term_result(result: DiceTermResult) -> str:
+    if len(result.rolls) > MAX_LISTED_DICE:
+        # Listing hundreds of dice would only flood the channel, just give the total
+        return f"{result.total} [{result.term}]"
+    rolls = []
+    for roll, kept in zip(result.rolls, result.kept):
+        text = str(roll).zfill(2) if result.term.sides == PERCENTILE_SIDES else str(roll)
+        rolls.append(text if kept else f"~~{text}~~")
+    if len(rolls) == 1:
+        return f"{rolls[0]} [{result.term}]"
+    return f"({' + '.join(rolls)}) [{result.term}]"
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+from discord import Guild, PermissionOverwrite, TextChannel
+
+from raconteur.messages import send_message
+from raconteur.models.base import get_session
+from raconteur.plugins.character.models import Location
+from raconteur.queries import get_or_create_game
+from raconteur.utils import get_or_create_channel_by_name
+
+DIGEST_CATEGORY = "GM"
+DIGEST_CHANNEL = "spectator-digest"
+DIGEST_INTERVAL = 30
+DIGEST_ENTRY_MAX_LENGTH = 300
+
+
+class SpectatorDigest:
+    """Collects the messages relayed in every location and posts them periodically to a single digest channel.
+
+    Entries are buffered per guild and grouped by location; the first entry after a quiet period starts the timer, so an
+    idle game costs nothing and a busy one only results in a digest post every interval.
+    """
+
+    pending: dict[int, dict[int, list[str]]]
+    tasks: dict[int, asyncio.Task]
+
+    def __init__(self) -> None:
+        self.pending = defaultdict(lambda: defaultdict(list))
+        self.tasks = {}
+
+    def add(self, guild: Guild, location_id: int, text: str) -> None:
+        if len(text) > DIGEST_ENTRY_MAX_LENGTH:
+            text = text[:DIGEST_ENTRY_MAX_LENGTH - 1] + "…"
+        self.pending[guild.id][location_id].append(text)
+        if guild.id not in self.tasks:
+            self.tasks[guild.id] = asyncio.create_task(self._flush_later(guild))
+
+    async def flush(self, guild: Guild) -> None:
+        entries = self.pending.pop(guild.id, None)
+        if not entries:
+            return
+        with get_session() as session:
+            game = get_or_create_game(session, guild)
+            location_names = {location.id: location.name for location in Location.get_all(session, guild.id)}
+            channel = await _get_or_create_digest_channel(guild, game.gm_role_id, game.spectator_role_id)
+        sections = [
+            f"__**#{location_names.get(location_id, 'unknown')}**__\n" + "\n".join(location_entries)
+            for location_id, location_entries in entries.items()
+        ]
+        await send_message(channel, "\n\n".join(sections))
+
+    async def _flush_later(self, guild: Guild) -> None:
+        await asyncio.sleep(DIGEST_INTERVAL)
+        del self.tasks[guild.id]
+        try:
+            await self.flush(guild)
+        except Exception as e:
+            logging.exception(e)
+
+
+async def _get_or_create_digest_channel(guild: Guild, gm_role_id: int, spectator_role_id: int) -> TextChannel:
+    overwrites = {
+        guild.default_role: PermissionOverwrite(read_messages=False),
+        guild.me: PermissionOverwrite(read_messages=True, send_messages=True),
+        guild.get_role(gm_role_id): PermissionOverwrite(read_messages=True, send_messages=True),
+        guild.get_role(spectator_role_id): PermissionOverwrite(read_messages=True, send_messages=False),
+    } if gm_role_id and spectator_role_id else None
+    return await get_or_create_channel_by_name(
+        guild,
+        DIGEST_CHANNEL,
+        DIGEST_CATEGORY,
+        create_channel_permissions=overwrites,
+        create_category_permissions=overwrites,
+    )
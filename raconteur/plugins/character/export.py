@@ -0,0 +1,152 @@
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from html import escape
+from typing import Optional, AsyncIterator, Any
+
+from discord import TextChannel, Client, Object
+
+EXPORTS_PATH = "plugin_characters_exports"
+EXPORT_CHECKPOINT_INTERVAL = 500
+EXPORT_PAGE_SIZE = 100
+
+
+class ExportFormat(Enum):
+    MARKDOWN = "md"
+    HTML = "html"
+    JSONL = "jsonl"
+
+
+@dataclass
+class ExportedMessage:
+    id: int
+    author: str
+    timestamp: datetime
+    content: str
+    attachments: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ExportResult:
+    path: str
+    num_messages: int
+    resumed: bool
+
+
+def format_header(export_format: ExportFormat, title: str) -> str:
+    if export_format == ExportFormat.MARKDOWN:
+        return f"# {title}\n\n"
+    elif export_format == ExportFormat.HTML:
+        return (
+            f'<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>{escape(title)}</title></head>\n<body>\n'
+            f"<h1>{escape(title)}</h1>\n"
+        )
+    return ""
+
+
+def format_message(export_format: ExportFormat, message: ExportedMessage) -> str:
+    timestamp = f"{message.timestamp:%Y-%m-%d %H:%M:%S} UTC"
+    if export_format == ExportFormat.MARKDOWN:
+        attachments = "".join(f"\n- {attachment}" for attachment in message.attachments)
+        return f"**{message.author}** ({timestamp}):\n\n{message.content}{attachments}\n\n---\n\n"
+    elif export_format == ExportFormat.HTML:
+        content = escape(message.content).replace("\n", "<br>\n")
+        attachments = "".join(
+            f'<li><a href="{escape(attachment)}">{escape(attachment)}</a></li>' for attachment in message.attachments
+        )
+        return (
+            f"<article>\n<header><strong>{escape(message.author)}</strong> <time>{timestamp}</time></header>\n"
+            f"<p>{content}</p>\n" + (f"<ul>{attachments}</ul>\n" if attachments else "") + "</article>\n"
+        )
+    return json.dumps({
+        "id": message.id,
+        "author": message.author,
+        "timestamp": message.timestamp.isoformat(),
+        "content": message.content,
+        "attachments": message.attachments,
+    }) + "\n"
+
+
+def format_footer(export_format: ExportFormat) -> str:
+    if export_format == ExportFormat.HTML:
+        return "</body>\n</html>\n"
+    return ""
+
+
+async def iter_channel_history(channel: TextChannel, after_id: Optional[int] = None) -> AsyncIterator[ExportedMessage]:
+    # The history iterator fetches messages page by page, so only one page is ever held in memory
+    after = Object(id=after_id) if after_id else None
+    async for message in channel.history(limit=None, after=after, oldest_first=True):
+        yield ExportedMessage(
+            id=message.id,
+            author=message.author.display_name,
+            timestamp=message.created_at,
+            content=message.content,
+            attachments=[attachment.url for attachment in message.attachments],
+        )
+
+
+async def iter_raw_channel_history(
+        client: Client, channel_id: int, after_id: Optional[int] = None
+) -> AsyncIterator[ExportedMessage]:
+    # Used by the website, whose client only has access to the REST API
+    after_id = after_id or 0
+    while True:
+        page: list[dict[str, Any]] = await client.http.logs_from(channel_id, EXPORT_PAGE_SIZE, after=after_id)
+        if not page:
+            return
+        for data in sorted(page, key=lambda d: int(d["id"])):
+            yield ExportedMessage(
+                id=int(data["id"]),
+                author=data["author"]["username"],
+                timestamp=datetime.fromisoformat(data["timestamp"]).replace(tzinfo=None),
+                content=data["content"],
+                attachments=[attachment["url"] for attachment in data.get("attachments", [])],
+            )
+            after_id = int(data["id"])
+        if len(page) < EXPORT_PAGE_SIZE:
+            return
+
+
+async def export_channel(channel: TextChannel, export_format: ExportFormat) -> ExportResult:
+    """Exports the full history of a channel to a file, writing it as it is fetched.
+
+    Progress is checkpointed regularly; if an export of the same channel in the same format was interrupted, it resumes
+    from the last checkpoint instead of starting over.
+    """
+    os.makedirs(EXPORTS_PATH, exist_ok=True)
+    path = os.path.join(EXPORTS_PATH, f"{channel.guild.id}-{channel.id}.{export_format.value}")
+    checkpoint_path = f"{path}.checkpoint"
+
+    checkpoint: dict[str, Any] = {}
+    if os.path.exists(checkpoint_path) and os.path.exists(path):
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+
+    with open(path, "r+" if checkpoint else "w", encoding="utf-8") as f:
+        if checkpoint:
+            # Drop anything written after the last checkpoint, it will be fetched again
+            f.seek(checkpoint["offset"])
+            f.truncate()
+        else:
+            f.write(format_header(export_format, f"#{channel.name}"))
+        num_messages = checkpoint.get("num_messages", 0)
+        last_message_id = checkpoint.get("last_message_id")
+        async for message in iter_channel_history(channel, last_message_id):
+            f.write(format_message(export_format, message))
+            num_messages += 1
+            last_message_id = message.id
+            if num_messages % EXPORT_CHECKPOINT_INTERVAL == 0:
+                f.flush()
+                with open(checkpoint_path, "w", encoding="utf-8") as checkpoint_file:
+                    json.dump(
+                        {"offset": f.tell(), "num_messages": num_messages, "last_message_id": last_message_id},
+                        checkpoint_file,
+                    )
+        f.write(format_footer(export_format))
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return ExportResult(path=path, num_messages=num_messages, resumed=bool(checkpoint))
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import itertools
+import logging
+from datetime import datetime
 from enum import Enum
-from typing import Optional, Iterable
+from typing import Optional, Iterable, Iterator
 
-from sqlalchemy import String, Column, Integer, ForeignKey, DateTime, Boolean, select, Enum as EnumType
-from sqlalchemy.orm import relationship, Session
+from sqlalchemy import String, Column, Integer, ForeignKey, DateTime, Boolean, select, Enum as EnumType, \
+    UniqueConstraint, or_, update, insert, delete, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship, backref, Session
+from sqlalchemy.orm.collections import collection, attribute_mapped_collection
 
 from raconteur.models.base import Base
 from raconteur.plugin import PluginModelMixin
@@ -15,6 +21,7 @@ CHARACTER_APPEARANCE_MAX_LENGTH = 1000
 LOCATION_NAME_MAX_LENGTH = 60
 LOCATION_CATEGORY_MAX_LENGTH = 60
 LOCATION_DESCRIPTION_MAX_LENGTH = 5000
+MAX_COALESCE_WINDOW = 30
 
 
 class CharacterTraitType(Enum):
@@ -23,6 +30,22 @@ class CharacterTraitType(Enum):
     ITEM = "item"
 
 
+class ScheduledActionType(Enum):
+    MOVE = "move"
+    LOCK = "lock"
+    UNLOCK = "unlock"
+    HIDE = "hide"
+    REVEAL = "reveal"
+    BROADCAST = "broadcast"
+
+
+class ActivityKind(Enum):
+    LOCATION_MESSAGE = "location_message"
+    CHARACTER_MESSAGE = "character_message"
+    MOVE = "move"
+    BROADCAST = "broadcast"
+
+
 class Location(PluginModelMixin, Base):
     __plugin__ = "character"
     __plugin_table_name__ = "locations"
@@ -33,6 +56,9 @@ class Location(PluginModelMixin, Base):
     description = Column(String(LOCATION_DESCRIPTION_MAX_LENGTH), nullable=False)
     channel_id = Column(Integer, unique=True)
     characters = relationship("Character", back_populates="location")
+    relay_settings = relationship(
+        "LocationRelaySettings", uselist=False, lazy="selectin", cascade="all, delete-orphan"
+    )
     connections_1 = relationship(
         "Connection", back_populates="location_1", foreign_keys="Connection.location_1_id", cascade="all, delete-orphan"
     )
@@ -44,6 +70,16 @@ class Location(PluginModelMixin, Base):
     def connections(self) -> list[Connection]:
         return list(self.connections_1 + self.connections_2)
 
+    @property
+    def coalesce_window(self) -> int:
+        return self.relay_settings.coalesce_window if self.relay_settings else 0
+
+    @coalesce_window.setter
+    def coalesce_window(self, seconds: int) -> None:
+        if not self.relay_settings:
+            self.relay_settings = LocationRelaySettings(game_guild_id=self.game_guild_id)
+        self.relay_settings.coalesce_window = seconds
+
     @classmethod
     def get(cls, session: Session, guild_id: int, location_id: int) -> Optional[Location]:
         row = session.execute(select(Location).where(
@@ -72,6 +108,16 @@ class Location(PluginModelMixin, Base):
         ]
 
 
+class LocationRelaySettings(PluginModelMixin, Base):
+    """How messages are relayed in a location, kept apart from the locations table which predates it."""
+
+    __plugin__ = "character"
+    __plugin_table_name__ = "location_relay_settings"
+
+    location_id = Column(Integer, ForeignKey(Location.id), primary_key=True)
+    coalesce_window = Column(Integer, nullable=False, default=0)
+
+
 class Connection(PluginModelMixin, Base):
     __plugin__ = "character"
     __plugin_table_name__ = "connections"
@@ -84,6 +130,34 @@ class Connection(PluginModelMixin, Base):
     location_1 = relationship(Location, lazy="selectin", foreign_keys=location_1_id)
     location_2_id = Column(Integer, ForeignKey(Location.id), nullable=False)
     location_2 = relationship(Location, lazy="selectin", foreign_keys=location_2_id)
+    keys = relationship("CharacterKey", back_populates="connection", cascade="all, delete-orphan")
+
+
+class CharacterTraits:
+    """Collection of a character's traits, grouped by type and indexed by name."""
+
+    by_type: dict[CharacterTraitType, dict[str, CharacterTrait]]
+
+    def __init__(self) -> None:
+        self.by_type = {trait_type: {} for trait_type in CharacterTraitType}
+
+    @collection.appender
+    def add(self, trait: CharacterTrait) -> None:
+        self.by_type.setdefault(trait.type, {})[trait.name] = trait
+
+    @collection.remover
+    def remove(self, trait: CharacterTrait) -> None:
+        self.by_type.get(trait.type, {}).pop(trait.name, None)
+
+    @collection.iterator
+    def __iter__(self) -> Iterator[CharacterTrait]:
+        return itertools.chain.from_iterable(traits.values() for traits in self.by_type.values())
+
+    def get(self, trait_type: CharacterTraitType, name: str) -> Optional[CharacterTrait]:
+        return self.by_type.get(trait_type, {}).get(name)
+
+    def of_type(self, trait_type: CharacterTraitType) -> dict[str, CharacterTrait]:
+        return self.by_type.get(trait_type, {})
 
 
 class Character(PluginModelMixin, Base):
@@ -101,19 +175,43 @@ class Character(PluginModelMixin, Base):
     intercept = Column(Boolean, default=False, nullable=False)
     location_id = Column(Integer, ForeignKey(Location.id), nullable=True)
     location = relationship(Location, back_populates="characters", uselist=False)
-    traits = relationship("CharacterTrait", back_populates="character", cascade="all, delete-orphan")
+    # Traits are loaded along with the characters in a single extra query, grouped by type as they come in
+    traits: CharacterTraits = relationship(
+        "CharacterTrait",
+        back_populates="character",
+        cascade="all, delete-orphan",
+        collection_class=CharacterTraits,
+        lazy="selectin",
+    )
+    keys: dict[int, CharacterKey] = relationship(
+        "CharacterKey",
+        back_populates="character",
+        cascade="all, delete-orphan",
+        collection_class=attribute_mapped_collection("connection_id"),
+    )
+    status_message = relationship("CharacterStatusMessage", uselist=False, cascade="all, delete-orphan")
+
+    @property
+    def status_message_id(self) -> Optional[int]:
+        return self.status_message.message_id if self.status_message else None
+
+    @status_message_id.setter
+    def status_message_id(self, message_id: Optional[int]) -> None:
+        if message_id is None:
+            self.status_message = None
+        elif self.status_message:
+            self.status_message.message_id = message_id
+        else:
+            self.status_message = CharacterStatusMessage(game_guild_id=self.game_guild_id, message_id=message_id)
 
     def has_key(self, connection: Connection) -> bool:
-        connection_id = str(connection.id)
-        for trait in self.traits:
-            if trait.type == CharacterTraitType.KEY and trait.value == connection_id:
-                return True
-        return False
+        return connection.id in self.keys
+
+    def get_key_by_name(self, name: str) -> Optional[CharacterKey]:
+        return next((key for key in self.keys.values() if key.name == name), None)
 
     def get_inventory(self) -> Iterable[CharacterTrait]:
-        for trait in self.traits:
-            if trait.type == CharacterTraitType.ITEM:
-                yield trait
+        return self.traits.of_type(CharacterTraitType.ITEM).values()
 
     @classmethod
     def get(cls, session: Session, guild_id: int, member_id: int, character_id: int) -> Optional[Character]:
@@ -164,14 +262,319 @@ class Character(PluginModelMixin, Base):
         )).one_or_none()
         return row[0] if row else None
 
+    @classmethod
+    def get_all_targeted(
+            cls,
+            session: Session,
+            guild_id: int,
+            location_ids: Iterable[int] = (),
+            member_ids: Iterable[int] = (),
+            names: Iterable[str] = (),
+    ) -> list[Character]:
+        # Characters matching any of the targets, in a single query
+        return [
+            character for character, in session.execute(select(Character).where(
+                Character.game_guild_id == guild_id,
+                or_(
+                    Character.location_id.in_(list(location_ids)),
+                    Character.member_id.in_(list(member_ids)),
+                    Character.name.in_(list(names)),
+                ),
+            ).order_by(Character.name))
+        ]
+
+
+class CharacterStatusMessage(PluginModelMixin, Base):
+    """The status board message pinned in a character's channel, kept apart from the characters table."""
+
+    __plugin__ = "character"
+    __plugin_table_name__ = "status_messages"
+
+    character_id = Column(Integer, ForeignKey(Character.id), primary_key=True)
+    message_id = Column(Integer, nullable=False)
+
 
 class CharacterTrait(PluginModelMixin, Base):
     __plugin__ = "character"
     __plugin_table_name__ = "characters_traits"
 
     id = Column(Integer, primary_key=True)
-    character_id = Column(Integer, ForeignKey(Character.id), nullable=True)
+    character_id = Column(Integer, ForeignKey(Character.id), nullable=True, index=True)
     character = relationship(Character, back_populates="traits")
     name = Column(String, nullable=False)
     type = Column(EnumType(CharacterTraitType, create_constraint=False, native_enum=False), nullable=False)
     value = Column(String)
+
+    @classmethod
+    def set_flag_bulk(
+            cls, session: Session, guild_id: int, character_ids: list[int], name: str, value: Optional[str]
+    ) -> tuple[int, int]:
+        """Sets a flag on many characters at once, returning the number of flags updated and created."""
+        flag_filter = (
+            CharacterTrait.character_id.in_(character_ids),
+            CharacterTrait.type == CharacterTraitType.FLAG,
+            CharacterTrait.name == name,
+        )
+        existing = set(session.execute(select(CharacterTrait.character_id).where(*flag_filter)).scalars())
+        if existing:
+            session.execute(update(CharacterTrait).where(*flag_filter).values(value=value))
+        created = [
+            {"game_guild_id": guild_id, "character_id": character_id, "name": name,
+             "type": CharacterTraitType.FLAG, "value": value}
+            for character_id in character_ids if character_id not in existing
+        ]
+        if created:
+            session.execute(insert(CharacterTrait), created)
+        return len(existing), len(created)
+
+
+class CharacterKey(PluginModelMixin, Base):
+    __plugin__ = "character"
+    __plugin_table_name__ = "characters_keys"
+    __table_args__ = (
+        UniqueConstraint("character_id", "connection_id"),
+        UniqueConstraint("character_id", "name"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    character_id = Column(Integer, ForeignKey(Character.id), nullable=False, index=True)
+    character = relationship(Character, back_populates="keys")
+    connection_id = Column(Integer, ForeignKey(Connection.id), nullable=False, index=True)
+    connection = relationship(Connection, back_populates="keys")
+
+    @classmethod
+    def exists(cls, session: Session, character_id: int, connection_id: int) -> bool:
+        return session.execute(select(CharacterKey.id).where(
+            CharacterKey.character_id == character_id, CharacterKey.connection_id == connection_id,
+        )).first() is not None
+
+    @classmethod
+    def give_bulk(
+            cls, session: Session, guild_id: int, character_ids: list[int], connection_id: int, name: str
+    ) -> set[int]:
+        """Gives a key to many characters at once, returning the IDs of the characters who received it.
+
+        Characters who already hold a key for the connection, or a key with the same name, are skipped.
+        """
+        skipped = set(session.execute(select(CharacterKey.character_id).where(
+            CharacterKey.character_id.in_(character_ids),
+            or_(CharacterKey.connection_id == connection_id, CharacterKey.name == name),
+        )).scalars())
+        given = set(character_ids) - skipped
+        if given:
+            session.execute(insert(CharacterKey), [
+                {"game_guild_id": guild_id, "character_id": character_id, "connection_id": connection_id, "name": name}
+                for character_id in given
+            ])
+        return given
+
+    @classmethod
+    def remove_bulk(cls, session: Session, character_ids: list[int], name: str) -> int:
+        return session.execute(delete(CharacterKey).where(
+            CharacterKey.character_id.in_(character_ids), CharacterKey.name == name,
+        )).rowcount
+
+
+class CharacterSheetVersion(PluginModelMixin, Base):
+    """Version of the game system sheet of a character, bumped on every change so that concurrent edits are detected."""
+
+    __plugin__ = "character"
+    __plugin_table_name__ = "sheet_versions"
+    __table_args__ = (
+        UniqueConstraint("character_id", "sheet_type"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    character_id = Column(Integer, ForeignKey(Character.id), nullable=False)
+    character = relationship(Character, backref=backref("sheet_versions", cascade="all,delete,delete-orphan"))
+    sheet_type = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+
+    @classmethod
+    def get_all(cls, session: Session, sheet_type: str, character_ids: Iterable[int]) -> dict[int, int]:
+        """Returns the current versions of the sheets, where sheets which were never versioned are at version 0."""
+        versions = dict(session.execute(
+            select(CharacterSheetVersion.character_id, CharacterSheetVersion.version).where(
+                CharacterSheetVersion.sheet_type == sheet_type,
+                CharacterSheetVersion.character_id.in_(list(character_ids)),
+            )
+        ).all())
+        return {character_id: versions.get(character_id, 0) for character_id in character_ids}
+
+    @classmethod
+    def bump(cls, session: Session, guild_id: int, sheet_type: str, character_id: int) -> None:
+        if cls._increment(session, sheet_type, character_id):
+            return
+        try:
+            # The first save of a sheet can race with another one, in which case the row it created is bumped
+            with session.begin_nested():
+                session.add(CharacterSheetVersion(
+                    game_guild_id=guild_id, sheet_type=sheet_type, character_id=character_id, version=1
+                ))
+        except IntegrityError:
+            cls._increment(session, sheet_type, character_id)
+
+    @classmethod
+    def _increment(cls, session: Session, sheet_type: str, character_id: int) -> bool:
+        result = session.execute(
+            update(CharacterSheetVersion)
+            .where(CharacterSheetVersion.sheet_type == sheet_type, CharacterSheetVersion.character_id == character_id)
+            .values(version=CharacterSheetVersion.version + 1)
+        )
+        return bool(result.rowcount)
+
+    @classmethod
+    def bump_expected(cls, session: Session, guild_id: int, sheet_type: str, expected: dict[int, int]) -> bool:
+        """Bumps the versions of many sheets at once, as long as they are all still at their expected version.
+
+        The check and the bump happen in the same statement, so a concurrent change can't slip in between them. Returns
+        whether every sheet was bumped; if not, the caller needs to roll back.
+        """
+        versioned = {character_id: version for character_id, version in expected.items() if version}
+        if versioned:
+            result = session.execute(
+                update(CharacterSheetVersion)
+                .where(
+                    CharacterSheetVersion.sheet_type == sheet_type,
+                    tuple_(CharacterSheetVersion.character_id, CharacterSheetVersion.version).in_(
+                        list(versioned.items())
+                    ),
+                )
+                .values(version=CharacterSheetVersion.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(versioned):
+                return False
+        # Sheets at version 0 have no row yet, and the unique constraint rejects concurrent creations
+        unversioned = [character_id for character_id, version in expected.items() if not version]
+        if unversioned:
+            session.execute(insert(CharacterSheetVersion), [
+                {"game_guild_id": guild_id, "sheet_type": sheet_type, "character_id": character_id, "version": 1}
+                for character_id in unversioned
+            ])
+        return True
+
+
+class ScheduledAction(PluginModelMixin, Base):
+    __plugin__ = "character"
+    __plugin_table_name__ = "scheduled_actions"
+
+    id = Column(Integer, primary_key=True)
+    run_at = Column(DateTime, nullable=False, index=True)
+    type = Column(EnumType(ScheduledActionType, create_constraint=False, native_enum=False), nullable=False)
+    member_id = Column(Integer, nullable=False)
+    character_id = Column(Integer, ForeignKey(Character.id, ondelete="CASCADE"), nullable=True, index=True)
+    character = relationship(Character, backref=backref("scheduled_actions", cascade="all,delete,delete-orphan"))
+    connection_id = Column(Integer, ForeignKey(Connection.id, ondelete="CASCADE"), nullable=True)
+    connection = relationship(Connection, backref=backref("scheduled_actions", cascade="all,delete,delete-orphan"))
+    location_id = Column(Integer, ForeignKey(Location.id, ondelete="CASCADE"), nullable=True)
+    location = relationship(Location, backref=backref("scheduled_actions", cascade="all,delete,delete-orphan"))
+    text = Column(String, nullable=True)
+
+    @classmethod
+    def get(cls, session: Session, guild_id: int, action_id: int) -> Optional[ScheduledAction]:
+        row = session.execute(select(ScheduledAction).where(
+            ScheduledAction.game_guild_id == guild_id, ScheduledAction.id == action_id,
+        )).one_or_none()
+        return row[0] if row else None
+
+    @classmethod
+    def get_all(cls, session: Session) -> list[ScheduledAction]:
+        return [action for action, in session.execute(select(ScheduledAction))]
+
+    @classmethod
+    def get_all_of_guild(cls, session: Session, guild_id: int) -> list[ScheduledAction]:
+        return [
+            action for action, in session.execute(
+                select(ScheduledAction)
+                .where(ScheduledAction.game_guild_id == guild_id)
+                .order_by(ScheduledAction.run_at)
+            )
+        ]
+
+    @classmethod
+    def get_move_for_character(cls, session: Session, character_id: int) -> Optional[ScheduledAction]:
+        row = session.execute(select(ScheduledAction).where(
+            ScheduledAction.character_id == character_id, ScheduledAction.type == ScheduledActionType.MOVE,
+        )).first()
+        return row[0] if row else None
+
+
+class ActivityRollup(PluginModelMixin, Base):
+    __plugin__ = "character"
+    __plugin_table_name__ = "activity_rollups"
+    __table_args__ = (
+        UniqueConstraint("game_guild_id", "hour", "kind", "subject_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, nullable=False)
+    kind = Column(EnumType(ActivityKind, create_constraint=False, native_enum=False), nullable=False)
+    # Location ID for location messages, moves and broadcasts, character ID for character messages
+    subject_id = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    @classmethod
+    def get_all_since(cls, session: Session, guild_id: int, since: datetime) -> list[ActivityRollup]:
+        return [
+            rollup for rollup, in session.execute(select(ActivityRollup).where(
+                ActivityRollup.game_guild_id == guild_id, ActivityRollup.hour >= since,
+            ))
+        ]
+
+
+class RelayCopy(PluginModelMixin, Base):
+    __plugin__ = "character"
+    __plugin_table_name__ = "relay_copies"
+
+    id = Column(Integer, primary_key=True)
+    original_message_id = Column(Integer, nullable=False, index=True)
+    channel_id = Column(Integer, nullable=False)
+    message_id = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+    @classmethod
+    def get_all_related(cls, session: Session, message_id: int) -> list[RelayCopy]:
+        """Returns every copy relayed from the same original messages as the given original or copy."""
+        original_ids = select(RelayCopy.original_message_id).where(
+            or_(RelayCopy.message_id == message_id, RelayCopy.original_message_id == message_id),
+        )
+        related_copy_ids = select(RelayCopy.message_id).where(RelayCopy.original_message_id.in_(original_ids))
+        return [
+            copy for copy, in session.execute(select(RelayCopy).where(RelayCopy.message_id.in_(related_copy_ids)))
+        ]
+
+    @classmethod
+    def delete_expired(cls, session: Session, before: datetime) -> int:
+        return session.execute(delete(RelayCopy).where(RelayCopy.created_at < before)).rowcount
+
+
+def get_game_channel_ids(session: Session, guild_id: int) -> list[int]:
+    """Returns the channel IDs of every location and character of a game."""
+    return list(session.execute(
+        select(Location.channel_id).where(Location.game_guild_id == guild_id, Location.channel_id.isnot(None))
+        .union(
+            select(Character.channel_id).where(Character.game_guild_id == guild_id, Character.channel_id.isnot(None))
+        )
+    ).scalars())
+
+
+def migrate_legacy_keys(session: Session) -> None:
+    # Keys used to be stored as traits holding the connection ID as their value
+    legacy_keys = [
+        trait for trait, in session.execute(select(CharacterTrait).where(CharacterTrait.type == CharacterTraitType.KEY))
+    ]
+    for trait in legacy_keys:
+        try:
+            connection_id = int(trait.value)
+        except (TypeError, ValueError):
+            logging.warning(f"Skipping legacy key trait {trait.id} with invalid connection ID {trait.value!r}")
+            continue
+        if trait.character_id is not None and (connection := session.get(Connection, connection_id)):
+            key = CharacterKey(name=trait.name, character_id=trait.character_id, connection=connection)
+            key.game_guild_id = trait.game_guild_id
+            session.add(key)
+        session.delete(trait)
+    if legacy_keys:
+        session.commit()
@@ -0,0 +1,180 @@
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from math import comb
+from typing import Optional
+
+from raconteur.exceptions import CommandException
+from raconteur.plugins.character.dice import DiceExpression, DiceTerm, parse_dice_expression
+
+# Rough bound on the size of the integers used for convolutions, in bits
+MAX_ODDS_COMPLEXITY = 5_000_000
+MAX_ODDS_KEEP_DICE = 10
+MAX_ODDS_KEEP_SIDES = 100
+ODDS_PERCENTILES = (5, 25, 50, 75, 95)
+ODDS_TARGET_PATTERN = re.compile(r"^(.*?)\s*>=\s*(-?\d+)\s*$")
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """Exact distribution of a roll, as the number of equally likely outcomes leading to each total."""
+
+    offset: int
+    counts: tuple[int, ...]
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def minimum(self) -> int:
+        return self.offset
+
+    @property
+    def maximum(self) -> int:
+        return self.offset + len(self.counts) - 1
+
+    @property
+    def mean(self) -> float:
+        return sum((self.offset + i) * count for i, count in enumerate(self.counts)) / self.total
+
+    def percentile(self, percent: int) -> int:
+        # Counts can be far too large for floats, so the comparison is kept in integers
+        threshold = self.total * percent
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative * 100 >= threshold:
+                return self.offset + i
+        return self.maximum
+
+    def probability_at_least(self, target: int) -> float:
+        start = min(max(target - self.offset, 0), len(self.counts))
+        return sum(self.counts[start:]) / self.total
+
+
+def parse_odds_query(text: str) -> tuple[DiceExpression, Optional[int]]:
+    target = None
+    if match := ODDS_TARGET_PATTERN.match(text):
+        text, target = match.group(1), int(match.group(2))
+    return parse_dice_expression(text), target
+
+
+def get_distribution(expression: DiceExpression) -> Distribution:
+    if expression.repeat > 1:
+        raise CommandException("Cannot compute odds: repeated rolls are independent, ask about a single roll instead.")
+    return _get_distribution(expression)
+
+
+def clear_distribution_cache() -> None:
+    _get_distribution.cache_clear()
+    _get_term_distribution.cache_clear()
+
+
+@lru_cache(maxsize=256)
+def _get_distribution(expression: DiceExpression) -> Distribution:
+    # Expressions are hashable and normalized when parsed, so every spelling of the same roll shares an entry
+    distribution = Distribution(offset=0, counts=(1,))
+    for sign, term in expression.terms:
+        if isinstance(term, DiceTerm):
+            term_distribution = _get_term_distribution(term)
+        else:
+            term_distribution = Distribution(offset=term, counts=(1,))
+        if sign < 0:
+            term_distribution = Distribution(
+                offset=-term_distribution.maximum, counts=tuple(reversed(term_distribution.counts))
+            )
+        distribution = _convolve(distribution, term_distribution)
+    return distribution
+
+
+@lru_cache(maxsize=256)
+def _get_term_distribution(term: DiceTerm) -> Distribution:
+    if term.explode:
+        raise CommandException("Cannot compute odds: exploding dice have no upper bound.")
+    if term.keep_highest is not None or term.keep_lowest is not None:
+        return _get_keep_distribution(term)
+
+    faces = term.faces
+    num_slots = term.count * (len(faces) - 1) + 1
+    slot_bits = _get_slot_bits(len(faces) ** term.count)
+    if num_slots * slot_bits > MAX_ODDS_COMPLEXITY:
+        raise CommandException(f"Cannot compute odds: `{term}` has too many outcomes.")
+    # The sum of N dice is the Nth power of the polynomial with one term per face, which is computed exactly by packing
+    # its coefficients into a single integer and letting Python's big integer arithmetic do the multiplications
+    single_die = sum(1 << (slot_bits * i) for i in range(len(faces)))
+    return Distribution(offset=faces[0] * term.count, counts=_unpack(single_die ** term.count, num_slots, slot_bits))
+
+
+def _get_keep_distribution(term: DiceTerm) -> Distribution:
+    if term.count > MAX_ODDS_KEEP_DICE or term.sides > MAX_ODDS_KEEP_SIDES:
+        raise CommandException(
+            f"Cannot compute odds: keeping dice is only supported for up to {MAX_ODDS_KEEP_DICE} dice with up to "
+            f"{MAX_ODDS_KEEP_SIDES} sides."
+        )
+    keep = term.keep_highest if term.keep_highest is not None else term.keep_lowest
+    assert keep is not None
+    keep = min(keep, term.count)
+    faces = list(reversed(term.faces)) if term.keep_highest is not None else list(term.faces)
+
+    # Go through the faces from the first kept to the last, choosing how many dice show each face; the first dice to be
+    # assigned are the ones that are kept, and the number of ways to pick them is a binomial coefficient
+    sums: dict[int, int] = defaultdict(int)
+    states: dict[tuple[int, int], int] = {(0, 0): 1}
+    for idx, face in enumerate(faces):
+        next_states: dict[tuple[int, int], int] = defaultdict(int)
+        for (num_assigned, kept_sum), ways in states.items():
+            remaining = term.count - num_assigned
+            for num_dice in range(remaining + 1):
+                next_key = (num_assigned + num_dice, kept_sum + face * min(num_dice, keep - num_assigned))
+                next_states[next_key] += ways * comb(remaining, num_dice)
+        states = {}
+        for (num_assigned, kept_sum), ways in next_states.items():
+            if num_assigned >= keep:
+                # Once every kept die is assigned, the others can show any of the faces left
+                sums[kept_sum] += ways * (len(faces) - idx - 1) ** (term.count - num_assigned)
+            else:
+                states[(num_assigned, kept_sum)] = ways
+
+    offset = min(sums)
+    return Distribution(offset=offset, counts=tuple(sums.get(offset + i, 0) for i in range(max(sums) - offset + 1)))
+
+
+def _convolve(a: Distribution, b: Distribution) -> Distribution:
+    num_slots = len(a.counts) + len(b.counts) - 1
+    slot_bits = _get_slot_bits(a.total * b.total)
+    if num_slots * slot_bits > MAX_ODDS_COMPLEXITY:
+        raise CommandException("Cannot compute odds: the roll has too many outcomes.")
+    product = _pack(a.counts, slot_bits) * _pack(b.counts, slot_bits)
+    return Distribution(offset=a.offset + b.offset, counts=_unpack(product, num_slots, slot_bits))
+
+
+def _get_slot_bits(max_coefficient: int) -> int:
+    # Slots are byte-aligned, so that unpacking can slice the integer's bytes instead of shifting it repeatedly
+    return (max_coefficient.bit_length() + 8) // 8 * 8
+
+
+def _pack(counts: tuple[int, ...], slot_bits: int) -> int:
+    slot_bytes = slot_bits // 8
+    return int.from_bytes(b"".join(count.to_bytes(slot_bytes, "little") for count in counts), "little")
+
+
+def _unpack(packed: int, num_slots: int, slot_bits: int) -> tuple[int, ...]:
+    slot_bytes = slot_bits // 8
+    data = packed.to_bytes(num_slots * slot_bytes, "little")
+    return tuple(int.from_bytes(data[i * slot_bytes:(i + 1) * slot_bytes], "little") for i in range(num_slots))
+
+
+def format_distribution(expression: DiceExpression, distribution: Distribution, target: Optional[int] = None) -> str:
+    lines = [
+        f"Odds for `{expression}`:",
+        f"- **Range:** {distribution.minimum} to {distribution.maximum}",
+        f"- **Mean:** {distribution.mean:.2f}",
+        "- **Percentiles:** " + ", ".join(
+            f"{percent}%: {distribution.percentile(percent)}" for percent in ODDS_PERCENTILES
+        ),
+    ]
+    if target is not None:
+        lines.append(f"- **Chance of rolling {target} or more:** {distribution.probability_at_least(target):.2%}")
+    return "\n".join(lines)
@@ -1,30 +1,43 @@
 import asyncio
+import logging
 import os.path
 import pickle
-import random
 import re
-from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Optional, Union, AsyncIterable, TYPE_CHECKING, Iterable, Sequence
+from typing import Optional, Union, AsyncIterable, TYPE_CHECKING, Iterable, cast
 
-from discord import Member, CategoryChannel, PermissionOverwrite, Guild, Message, TextChannel, Reaction
+from discord import Member, CategoryChannel, PermissionOverwrite, Guild, Message, TextChannel, Reaction, \
+    Attachment, File, Role
 from fastapi import APIRouter
 from humanize import naturaldelta
 from sqlalchemy.orm import Session
 
-from raconteur.commands import command, CommandCallContext
+from raconteur.commands import command, CommandCallContext, CommandParam
 from raconteur.exceptions import CommandException
-from raconteur.messages import send_message
+from raconteur.messages import send_message, MESSAGE_CHARS_LIMIT
 from raconteur.models.base import get_session
 from raconteur.models.game import Game
-from raconteur.plugin import Plugin, get_setting
+from raconteur.plugin import Plugin, PluginSettings
+from raconteur.plugins.character.activity import activity_tracker
+from raconteur.plugins.character.announcements import Announcement
 from raconteur.plugins.character.communication import send_broadcast, send_status, send_message_copies
-from raconteur.plugins.character.connections import toggle_lock, get_connection, toggle_hidden
+from raconteur.plugins.character.connections import toggle_lock, get_connection, toggle_hidden, \
+    set_connection_locked, set_connection_hidden
+from raconteur.plugins.character.dice import parse_dice_expression, roll_dice_expression, format_dice_roll_result
+from raconteur.plugins.character.odds import parse_odds_query, get_distribution, format_distribution
+from raconteur.plugins.character.digest import SpectatorDigest
+from raconteur.plugins.character.export import ExportFormat, export_channel
 from raconteur.plugins.character.models import Character, Connection, Location, CHARACTER_STATUS_MAX_LENGTH, \
-    CharacterTrait, CharacterTraitType
+    CharacterTrait, CharacterTraitType, CharacterKey, migrate_legacy_keys, MAX_COALESCE_WINDOW, ScheduledAction, \
+    ScheduledActionType, ActivityRollup, ActivityKind, RelayCopy, get_game_channel_ids, CharacterSheetVersion, \
+    LocationRelaySettings, CharacterStatusMessage
+from raconteur.plugins.character.relay_index import RelayIndex
+from raconteur.plugins.character.scheduler import ActionScheduler
+from raconteur.plugins.character.status_board import StatusBoard
+from raconteur.plugins.character.transcripts import TranscriptStore, TranscriptEntry
 from raconteur.plugins.character.web import character_plugin_router, characters_all, characters_yours, \
-    characters_locations
+    characters_locations, characters_activity, characters_world
 from raconteur.utils import get_or_create_channel_by_name, fuzzy_search
 
 if TYPE_CHECKING:
@@ -34,8 +47,15 @@ INTERCEPTION_CATEGORY = "GM"
 INTERCEPTION_CHANNEL = "interception"
 
 CACHED_MESSAGES_PATH = "plugin_characters_cached_messages.pkl"
-MAX_LAST_LOCATION_MESSAGES = 3
+MAX_EXPORT_UPLOAD_SIZE = 8 * 1024 * 1024
+DEFAULT_ARRIVAL_REPLAY_MESSAGES = 3
 MAX_AGE_LAST_LOCATION_MESSAGES = timedelta(days=7)
+TARGET_LOCATION_PREFIX = "location:"
+TARGET_ROLE_PREFIX = "role:"
+BULK_TARGETS_HELP = (
+    "Targets can be any number of character names, `location:<name>` for every character in a location, or "
+    "`role:<role>` for every character of the players with a role."
+)
 
 
 @dataclass
@@ -54,44 +74,116 @@ class InterceptedMessage:
     character_id: int
 
 
+@dataclass
+class PendingRelay:
+    location_id: int
+    author_id: Optional[int] = None
+    author_name: Optional[str] = None
+    messages: list[Message] = field(default_factory=list)
+    flush_task: Optional[asyncio.Task] = None
+
+    def format(self, extra_content: Optional[str] = None) -> str:
+        contents = [message.content for message in self.messages]
+        if extra_content is not None:
+            contents.append(extra_content)
+        return _format_relay(self.author_name, "\n".join(contents))
+
+
+class CharacterPluginSettings(PluginSettings):
+    use_channel_navigation: bool = False
+    arrival_replay_messages: int = DEFAULT_ARRIVAL_REPLAY_MESSAGES
+    status_board: bool = False
+    spectator_digest: bool = False
+
+
 class CharacterPlugin(Plugin):
     intercepted: dict[int, InterceptedMessage]
+    announcements: dict[int, Announcement]
+    transcripts: TranscriptStore
+    pending_relays: dict[int, PendingRelay]
+    scheduler: ActionScheduler
+    status_board: StatusBoard
+    digest: SpectatorDigest
+    relay_index: RelayIndex
+    settings_model = CharacterPluginSettings
 
     @classmethod
     def assert_models(cls) -> None:
         assert Character
         assert Connection
         assert Location
+        assert LocationRelaySettings
+        assert CharacterTrait
+        assert CharacterStatusMessage
+        assert CharacterKey
+        assert ScheduledAction
+        assert ActivityRollup
+        assert RelayCopy
+        assert CharacterSheetVersion
 
     def __init__(self, bot: "RaconteurBot"):
         super().__init__(bot)
         self.intercepted = {}
+        self.announcements = {}
+        self.transcripts = TranscriptStore()
+        self.pending_relays = {}
+        self.scheduler = ActionScheduler(self.run_scheduled_action)
+        self.status_board = StatusBoard(self.transcripts)
+        self.digest = SpectatorDigest()
+        self.relay_index = RelayIndex()
+
+        with get_session() as session:
+            migrate_legacy_keys(session)
 
         # Load up a cache of recent messages for various commands
-        self.cached_messages = {"locations": {}, "characters": {}}
+        self.cached_messages = {"characters": {}}
         if os.path.exists(CACHED_MESSAGES_PATH):
             with open(CACHED_MESSAGES_PATH, "rb") as f:
                 self.cached_messages = pickle.load(f)
 
+        # Older caches kept the last few messages of each location, move them over to the transcripts
+        for location_id, last_messages in self.cached_messages.pop("locations", {}).items():
+            if not len(self.transcripts.get(location_id)):
+                for cached_message in last_messages:
+                    self.transcripts.append(location_id, TranscriptEntry(
+                        text=cached_message.text,
+                        timestamp=cached_message.timestamp,
+                        author_id=cached_message.author_id,
+                    ))
+
     def save_cached_message(self, cached_message: CachedMessage):
         if cached_message.author_id:
             self.cached_messages["characters"][cached_message.author_id] = cached_message
         if cached_message.location_id:
-            if cached_message.location_id not in self.cached_messages["locations"]:
-                self.cached_messages["locations"][cached_message.location_id] = deque(maxlen=MAX_LAST_LOCATION_MESSAGES)
-            self.cached_messages["locations"][cached_message.location_id].append(cached_message)
+            self.transcripts.append(cached_message.location_id, TranscriptEntry(
+                text=cached_message.text,
+                timestamp=cached_message.timestamp,
+                author_id=cached_message.author_id,
+            ))
         with open(CACHED_MESSAGES_PATH, "wb") as f:
             pickle.dump(self.cached_messages, f)
 
-    def use_channel_navigation(self, session: Session, guild: Guild) -> bool:
-        return bool(self.get_setting(session, guild, "use_channel_navigation"))
+    async def on_ready(self) -> None:
+        self.scheduler.start()
+        activity_tracker.start()
+        self.relay_index.start()
+
+    async def on_close(self) -> None:
+        activity_tracker.flush()
+
+    @classmethod
+    def get_settings(cls, guild: Guild) -> CharacterPluginSettings:
+        return cast(CharacterPluginSettings, super().get_settings(guild))
+
+    def use_channel_navigation(self, guild: Guild) -> bool:
+        return self.get_settings(guild).use_channel_navigation
 
     async def on_message(self, message: Message) -> None:
-        with get_session() as session:
-            if self.use_channel_navigation(session, message.guild):
-                # No need to relay messages if everything is happening inside the location channels
-                return
+        if self.use_channel_navigation(message.guild):
+            # No need to relay messages if everything is happening inside the location channels
+            return
 
+        with get_session() as session:
             # Check if this is a reply to an intercepted message
             if message.reference and (intercepted := self.intercepted.get(message.reference.message_id)):
                 await self.handle_interception(session, message, intercepted)
@@ -102,12 +194,24 @@ class CharacterPlugin(Plugin):
                 # Otherwise, try to process it as a location message
                 await self.handle_location_message(session, message)
 
-    async def on_typing(self, channel: TextChannel, member: Member) -> None:
-        with get_session() as session:
-            if self.use_channel_navigation(session, channel.guild):
-                # No need to relay typing notifications if everything is happening inside the location channels
+    async def on_message_delete(self, guild: Guild, message_id: int) -> None:
+        for pending in self.pending_relays.values():
+            # A message deleted while waiting to be merged just shouldn't be relayed
+            if any(message.id == message_id for message in pending.messages):
+                pending.messages = [message for message in pending.messages if message.id != message_id]
+                if not pending.messages:
+                    if pending.flush_task:
+                        pending.flush_task.cancel()
+                    del self.pending_relays[pending.location_id]
                 return
+        await self.relay_index.propagate_delete(guild, message_id)
 
+    async def on_typing(self, channel: TextChannel, member: Member) -> None:
+        if self.use_channel_navigation(channel.guild):
+            # No need to relay typing notifications if everything is happening inside the location channels
+            return
+
+        with get_session() as session:
             if author := Character.get_for_channel(session, channel.id, member.id):
                 typings = []
                 for character in author.location.characters:
@@ -122,11 +226,11 @@ class CharacterPlugin(Plugin):
                 await asyncio.gather(*typings)
 
     async def on_reaction_add(self, reaction: Reaction, user: Member) -> None:
-        with get_session() as session:
-            if self.use_channel_navigation(session, reaction.message.guild):
-                # No need to relay reactions if everything is happening inside the location channels
-                return
+        if self.use_channel_navigation(reaction.message.guild):
+            # No need to relay reactions if everything is happening inside the location channels
+            return
 
+        with get_session() as session:
             if reaction.message.id in self.intercepted and (intercepted := self.intercepted.get(reaction.message.id)):
                 author = Character.get_by_id(session, reaction.message.guild.id, intercepted.character_id)
                 if not author:
@@ -146,14 +250,9 @@ class CharacterPlugin(Plugin):
         if not location or not author:
             return
 
-        channels = []
-        for character in location.characters:
-            if character.channel_id:
-                channels.append(message.guild.get_channel(character.channel_id))
-        if location.channel_id:
-            channels.append(message.guild.get_channel(location.channel_id))
-
-        await self.relay_message(message, [c for c in channels if c], author=author, location=location)
+        await self.flush_relay(location.id)
+        channels = _get_location_channels(message.guild, location)
+        await self.relay_message(message, channels, author=author, location=location)
         del self.intercepted[intercepted.original_message_id]
 
     async def handle_location_message(self, session: Session, message: Message) -> None:
@@ -204,8 +303,13 @@ class CharacterPlugin(Plugin):
                     channels.append(message.guild.get_channel(character.channel_id))
             channels.append(message.guild.get_channel(location.channel_id))
         if channels:
+            if location and location.coalesce_window and not message.attachments:
+                await self.queue_relay(message, location, author=author)
+                return
+            if location:
+                await self.flush_relay(location.id)
             await self.relay_message(message, [c for c in channels if c], author=author, location=location)
-            await message.delete()
+            await self.relay_index.delete_original(message)
 
     async def relay_message(
         self,
@@ -214,22 +318,105 @@ class CharacterPlugin(Plugin):
         author: Optional[Character] = None,
         location: Optional[Location] = None,
     ) -> None:
-        intro = f"__**{author.name}**__\n" if author else ""
-        formatted_message = f"{intro}{message.content}"
-        message_ids = [
-            (message_copy.channel.id, message_copy.id)
-            for message_copy in await send_message_copies(channels, formatted_message, message.attachments)
-        ]
+        await self.relay_text(
+            channels,
+            _format_relay(author.name if author else None, message.content),
+            message.created_at,
+            attachments=message.attachments,
+            author_id=author.id if author else None,
+            location_id=location.id if location else None,
+            original_message_ids=[message.id],
+        )
+
+    async def relay_text(
+        self,
+        channels: Iterable[TextChannel],
+        text: str,
+        timestamp: datetime,
+        attachments: Optional[list[Attachment]] = None,
+        author_id: Optional[int] = None,
+        location_id: Optional[int] = None,
+        original_message_ids: Optional[list[int]] = None,
+    ) -> None:
+        channels = list(channels)
+        message_copies = await send_message_copies(channels, text, attachments)
+        message_ids = [(message_copy.channel.id, message_copy.id) for message_copy in message_copies]
+        if channels:
+            guild = channels[0].guild
+            if original_message_ids:
+                self.relay_index.record(guild.id, original_message_ids, message_copies)
+            if location_id:
+                activity_tracker.record(guild.id, ActivityKind.LOCATION_MESSAGE, location_id, timestamp)
+                if self.get_settings(guild).spectator_digest:
+                    self.digest.add(guild, location_id, text)
+            if author_id:
+                activity_tracker.record(guild.id, ActivityKind.CHARACTER_MESSAGE, author_id, timestamp)
         self.save_cached_message(
             CachedMessage(
-                text=formatted_message,
-                timestamp=message.created_at,
-                author_id=author.id if author else None,
-                location_id=location.id if location else None,
+                text=text,
+                timestamp=timestamp,
+                author_id=author_id,
+                location_id=location_id,
                 message_ids=message_ids,
             )
         )
 
+    async def queue_relay(self, message: Message, location: Location, author: Optional[Character] = None) -> None:
+        # Consecutive messages from the same author are merged into a single relay, which is sent once the location's
+        # coalescing window expires or as soon as someone else speaks
+        author_id = author.id if author else None
+        pending = self.pending_relays.get(location.id)
+        if pending and (
+                pending.author_id != author_id or len(pending.format(message.content)) > MESSAGE_CHARS_LIMIT
+        ):
+            await self.flush_relay(location.id)
+            pending = None
+        if not pending:
+            pending = PendingRelay(
+                location_id=location.id,
+                author_id=author_id,
+                author_name=author.name if author else None,
+            )
+            pending.flush_task = asyncio.create_task(self._flush_relay_later(pending, location.coalesce_window))
+            self.pending_relays[location.id] = pending
+        pending.messages.append(message)
+
+    async def flush_relay(self, location_id: int) -> None:
+        pending = self.pending_relays.pop(location_id, None)
+        if not pending:
+            return
+        if pending.flush_task and pending.flush_task is not asyncio.current_task():
+            pending.flush_task.cancel()
+
+        # Characters may have come or gone while the window was open, so the recipients are only resolved now
+        guild: Guild = pending.messages[0].guild
+        with get_session() as session:
+            location = Location.get(session, guild.id, pending.location_id)
+            channels = _get_location_channels(guild, location) if location else []
+        await self.relay_text(
+            channels,
+            pending.format(),
+            pending.messages[-1].created_at,
+            author_id=pending.author_id,
+            location_id=pending.location_id,
+            original_message_ids=[message.id for message in pending.messages],
+        )
+
+        # All the original messages were sent in the same channel, so they can be removed in one go
+        channel: TextChannel = pending.messages[0].channel
+        if len(pending.messages) > 1:
+            await self.relay_index.delete_originals(channel, pending.messages)
+        else:
+            await self.relay_index.delete_original(pending.messages[0])
+
+    async def _flush_relay_later(self, pending: PendingRelay, delay: int) -> None:
+        await asyncio.sleep(delay)
+        if self.pending_relays.get(pending.location_id) is pending:
+            try:
+                await self.flush_relay(pending.location_id)
+            except Exception as e:
+                logging.exception(e)
+
     @command(
         help_msg="Synchronizes the locations in the database with the channels on the server.",
         requires_gm=True,
@@ -274,6 +461,32 @@ class CharacterPlugin(Plugin):
 
         yield "Sync complete"
 
+    @command(
+        help_msg=f"Merges consecutive messages from the same author in this location into a single relayed message if "
+                 f"they are sent within the specified number of seconds (maximum {MAX_COALESCE_WINDOW}). A value of 0 "
+                 f"disables merging. If no value is provided, displays the current setting.",
+        requires_gm=True,
+    )
+    async def location_coalesce(self, ctx: CommandCallContext, seconds: Optional[int] = None) -> str:
+        with get_session() as session:
+            location = Location.get_for_channel(session, ctx.guild.id, ctx.channel.id)
+            if not location:
+                raise CommandException("Cannot set message merging: no location bound to this channel.")
+            if seconds is None:
+                if not location.coalesce_window:
+                    return f"Messages are not merged in `{location.name}`."
+                return f"Messages are merged in `{location.name}` over {location.coalesce_window} seconds."
+            if seconds < 0 or seconds > MAX_COALESCE_WINDOW:
+                raise CommandException(
+                    f"Cannot set message merging: the window must be between 0 and {MAX_COALESCE_WINDOW} seconds."
+                )
+            location.coalesce_window = seconds
+            session.commit()
+            if not seconds:
+                await self.flush_relay(location.id)
+                return f"Messages are no longer merged in `{location.name}`."
+            return f"Messages are now merged in `{location.name}` over {seconds} seconds."
+
     @command(
         help_msg="Sets the Discord channel bound to a specific character.",
         requires_gm=True,
@@ -308,14 +521,21 @@ class CharacterPlugin(Plugin):
     async def status(self, ctx: CommandCallContext, status: Optional[str] = None) -> Optional[str]:
         with get_session() as session:
             character = get_channel_character(ctx, session)
+            use_status_board = self.get_settings(ctx.guild).status_board
             if status is None:
-                await send_status(ctx.guild, character)
+                if use_status_board:
+                    await self.status_board.update_character(ctx.guild, character)
+                    session.commit()
+                else:
+                    await send_status(ctx.guild, character)
             else:
                 status = status.strip()
                 if len(status) > CHARACTER_STATUS_MAX_LENGTH:
                     raise CommandException(f"Status is too long (maximum {CHARACTER_STATUS_MAX_LENGTH} characters)")
                 character.status = status
                 session.commit()
+                if use_status_board and character.location_id:
+                    self.status_board.request_update(ctx.guild, character.location_id)
             return None
 
     @command(
@@ -377,12 +597,16 @@ class CharacterPlugin(Plugin):
             if connection.locked:
                 raise CommandException(f"Cannot move to `{location}`: `{new_location.name}` is locked off.")
 
-            # Check if enough time has passed to make the move to this location
+            # Replace any move which was already queued up for this character
+            if queued_move := ScheduledAction.get_move_for_character(session, character.id):
+                self.scheduler.cancel(session, queued_move)
+
+            # If not enough time has passed to make the move to this location, queue it up for when it will have
             next_movement = character.last_movement + timedelta(seconds=connection.timer)
             now = datetime.utcnow()
             if next_movement > now:
                 remaining_seconds = (next_movement - now).total_seconds()
-                minutes = remaining_seconds // 60
+                minutes = int(remaining_seconds // 60)
                 seconds = int(remaining_seconds % 60)
                 if remaining_seconds > 59:
                     time_remaining = (
@@ -391,7 +615,15 @@ class CharacterPlugin(Plugin):
                     )
                 else:
                     time_remaining = f"{seconds} second" + ("s" if seconds != 1 else "")
-                raise CommandException(f"Cannot move to `{location}`: {time_remaining} left before you can move there.")
+                self.scheduler.schedule(session, ScheduledAction(
+                    game_guild_id=ctx.guild.id,
+                    run_at=next_movement,
+                    type=ScheduledActionType.MOVE,
+                    member_id=ctx.member.id,
+                    character_id=character.id,
+                    location_id=new_location.id,
+                ))
+                return f"**{character.name}** will move to `{new_location.name}` in {time_remaining}."
 
             await self.move_character(session, ctx.guild, character, new_location)
             session.commit()
@@ -448,28 +680,21 @@ class CharacterPlugin(Plugin):
             location_2_obj = Location.get_by_name(session, ctx.guild.id, location_2)
             if not location_2_obj:
                 raise CommandException(f"Cannot give key: unknown location `{location_2}`.")
-            for connection in location_1_obj.connections:
-                if location_2_obj in (connection.location_1, connection.location_2):
-                    break
-            else:
+            connection = _find_connection(location_1_obj, location_2_obj)
+            if not connection:
                 raise CommandException(f"Cannot give key: no connection between `{location_1}` and `{location_2}`.")
             if character.has_key(connection):
                 raise CommandException(f"Cannot give key: **{character.name}** already has a key for this connection.")
-            elif next((
-                    trait for trait in character.traits
-                    if trait.type == CharacterTraitType.KEY and trait.name == key_name
-            ), None):
+            elif character.get_key_by_name(key_name):
                 raise CommandException(
                     f"Cannot give key: a key with the name **{key_name}** already exists for this character."
                 )
             else:
-                key = CharacterTrait()
+                key = CharacterKey()
                 key.game = character.game
-                key.character = character
                 key.name = key_name
-                key.type = CharacterTraitType.KEY
-                key.value = str(connection.id)
-                character.traits.append(key)
+                key.connection = connection
+                character.keys[connection.id] = key
                 session.commit()
                 return (
                     f"The key **{key_name}** from `{location_1}` to `{location_2}` has been given to "
@@ -488,20 +713,145 @@ class CharacterPlugin(Plugin):
             character = _get_character_implicit(session, player, character_name)
             if not character:
                 raise CommandException(f"Cannot remove key: unknown character.")
-            for trait in character.traits:
-                if trait.type == CharacterTraitType.KEY and trait.name == key_name:
-                    connection = session.get(Connection, int(trait.value))
-                    if connection:
-                        path = f"from `{connection.location_1.name}` to `{connection.location_2.name}`"
-                    else:
-                        path = "for a removed connection"
-                    session.delete(trait)
-                    session.commit()
-                    return f"The key **{key_name}** {path} has been removed from **{character.name}**."
-            else:
+            key = character.get_key_by_name(key_name)
+            if not key:
                 raise CommandException(
                     f"Cannot remove key: character **{character.name}** does not own a key named **{key_name}**."
                 )
+            path = f"from `{key.connection.location_1.name}` to `{key.connection.location_2.name}`"
+            session.delete(key)
+            session.commit()
+            return f"The key **{key_name}** {path} has been removed from **{character.name}**."
+
+    @command(
+        help_msg="Gives a key between two locations to many characters at once. " + BULK_TARGETS_HELP,
+        requires_gm=True,
+    )
+    async def key_give_all(
+            self, ctx: CommandCallContext, key_name: str, location_1: str, location_2: str, *targets: str
+    ) -> str:
+        location_1 = location_1.strip()
+        location_2 = location_2.strip()
+        key_name = key_name.strip()
+        with get_session() as session:
+            characters = _get_targeted_characters(ctx, session, targets)
+            location_1_obj = Location.get_by_name(session, ctx.guild.id, location_1)
+            if not location_1_obj:
+                raise CommandException(f"Cannot give key: unknown location `{location_1}`.")
+            location_2_obj = Location.get_by_name(session, ctx.guild.id, location_2)
+            if not location_2_obj:
+                raise CommandException(f"Cannot give key: unknown location `{location_2}`.")
+            connection = _find_connection(location_1_obj, location_2_obj)
+            if not connection:
+                raise CommandException(f"Cannot give key: no connection between `{location_1}` and `{location_2}`.")
+            given = CharacterKey.give_bulk(
+                session, ctx.guild.id, [character.id for character in characters], connection.id, key_name
+            )
+            session.commit()
+            return _format_bulk_summary(
+                f"The key **{key_name}** from `{location_1}` to `{location_2}` has been given to",
+                [character for character in characters if character.id in given],
+                [character for character in characters if character.id not in given],
+                "already had this key or a key with the same name",
+            )
+
+    @command(help_msg="Removes a key from many characters at once by its name. " + BULK_TARGETS_HELP, requires_gm=True)
+    async def key_remove_all(self, ctx: CommandCallContext, key_name: str, *targets: str) -> str:
+        key_name = key_name.strip()
+        with get_session() as session:
+            characters = _get_targeted_characters(ctx, session, targets)
+            num_removed = CharacterKey.remove_bulk(session, [character.id for character in characters], key_name)
+            session.commit()
+            return f"The key **{key_name}** has been removed from {num_removed} of {len(characters)} character(s)."
+
+    @command(
+        help_msg="Schedules an action to run in this location's channel after the specified number of minutes. The "
+                 "action can be one of `lock`, `unlock`, `hide` or `reveal`, followed by the name of a connected "
+                 "location, or `broadcast`, followed by the text to broadcast to this location.",
+        requires_gm=True,
+    )
+    async def schedule(self, ctx: CommandCallContext, minutes: int, action: str, argument: str) -> str:
+        try:
+            action_type: Optional[ScheduledActionType] = ScheduledActionType(action.strip().lower())
+        except ValueError:
+            action_type = None
+        if action_type is None or action_type == ScheduledActionType.MOVE:
+            raise CommandException(f"Cannot schedule `{action}`: unknown action.")
+        if minutes < 0:
+            raise CommandException(f"Cannot schedule `{action}`: the delay cannot be negative.")
+        argument = argument.strip()
+        with get_session() as session:
+            location = Location.get_for_channel(session, ctx.guild.id, ctx.channel.id)
+            if not location:
+                raise CommandException(f"Cannot schedule `{action}`: no location bound to this channel.")
+            scheduled_action = ScheduledAction(
+                game_guild_id=ctx.guild.id,
+                run_at=datetime.utcnow() + timedelta(minutes=minutes),
+                type=action_type,
+                member_id=ctx.member.id,
+                location_id=location.id,
+            )
+            if action_type == ScheduledActionType.BROADCAST:
+                scheduled_action.text = argument
+            else:
+                connection, other_location = get_connection(session, location, argument, True)
+                if not connection:
+                    raise CommandException(
+                        f"Cannot schedule `{action}`: no connection to `{argument}` from `{location.name}`."
+                    )
+                scheduled_action.connection_id = connection.id
+            self.scheduler.schedule(session, scheduled_action)
+            return f"Scheduled action #{scheduled_action.id} (`{action_type.value}`) to run in {minutes} minute(s)."
+
+    @command(help_msg="Lists all the scheduled actions for this server.", requires_gm=True)
+    async def schedule_list(self, ctx: CommandCallContext) -> str:
+        with get_session() as session:
+            actions = ScheduledAction.get_all_of_guild(session, ctx.guild.id)
+            if not actions:
+                return "There are no scheduled actions."
+            now = datetime.utcnow()
+            return "The following actions are scheduled:\n" + "\n".join(
+                f"- #{action.id} in {naturaldelta(max(action.run_at - now, timedelta()))}: "
+                f"{_describe_scheduled_action(action)}"
+                for action in actions
+            )
+
+    @command(help_msg="Cancels a scheduled action by its number.", requires_gm=True)
+    async def schedule_cancel(self, ctx: CommandCallContext, action_id: int) -> str:
+        with get_session() as session:
+            action = ScheduledAction.get(session, ctx.guild.id, action_id)
+            if not action:
+                raise CommandException(f"Cannot cancel action #{action_id}: no such scheduled action.")
+            self.scheduler.cancel(session, action)
+            return f"Scheduled action #{action_id} has been cancelled."
+
+    async def run_scheduled_action(self, session: Session, action: ScheduledAction) -> None:
+        guild = self.bot.get_guild(action.game_guild_id)
+        if not guild:
+            return
+        if action.type == ScheduledActionType.MOVE:
+            character = action.character
+            if not character or not character.location or not action.location:
+                return
+            character_channel = guild.get_channel(character.channel_id) if character.channel_id else None
+            connection, new_location = get_connection(session, character.location, action.location.name, False)
+            if not connection or not new_location or connection.locked:
+                if character_channel:
+                    await send_message(
+                        character_channel,
+                        f"**{character.name}** can no longer move to `{action.location.name}` from here."
+                    )
+                return
+            await self.move_character(session, guild, character, new_location)
+            session.commit()
+        elif action.type == ScheduledActionType.BROADCAST:
+            if action.location:
+                await send_broadcast(guild, action.location, action.text or "")
+        elif action.connection:
+            if action.type in (ScheduledActionType.LOCK, ScheduledActionType.UNLOCK):
+                await set_connection_locked(session, guild, action.connection, action.type == ScheduledActionType.LOCK)
+            elif action.type in (ScheduledActionType.HIDE, ScheduledActionType.REVEAL):
+                await set_connection_hidden(session, guild, action.connection, action.type == ScheduledActionType.HIDE)
 
     @command(help_msg="Locks the connection to a location.")
     async def lock(self, ctx: CommandCallContext, location: str) -> Optional[str]:
@@ -542,15 +892,14 @@ class CharacterPlugin(Plugin):
             character = get_channel_character(ctx, session)
             if not character.location:
                 raise CommandException(f"Cannot pickup **{name}**: your character isn't in any location yet.")
-            if any(item.name == name for item in character.get_inventory()):
+            if character.traits.get(CharacterTraitType.ITEM, name):
                 raise CommandException(f"Cannot pickup **{name}**: your character is already carrying this item.")
             item = CharacterTrait()
             item.game = character.game
-            item.character = character
             item.type = CharacterTraitType.ITEM
             item.name = name
             item.value = description
-            character.traits.append(item)
+            character.traits.add(item)
             session.commit()
             await send_broadcast(ctx.guild, character.location, f"**{character.name}** picks up **{item.name}**.")
 
@@ -561,7 +910,7 @@ class CharacterPlugin(Plugin):
             character = get_channel_character(ctx, session)
             if not character.location:
                 raise CommandException(f"Cannot drop **{name}**: your character isn't in any location yet.")
-            item = next((item for item in character.get_inventory() if item.name == name), None)
+            item = character.traits.get(CharacterTraitType.ITEM, name)
             if not item:
                 raise CommandException(f"Cannot drop **{name}**: your character isn't carrying this item.")
             session.delete(item)
@@ -584,45 +933,140 @@ class CharacterPlugin(Plugin):
                 raise CommandException(
                     f"Cannot set flag `{name}`: invalid name, must consist only of lowercase letters and underscores."
                 )
-            for trait in character.traits:
-                if trait.type == CharacterTraitType.FLAG and trait.name == name:
-                    break
-            else:
+            trait = character.traits.get(CharacterTraitType.FLAG, name)
+            if not trait:
                 trait = CharacterTrait()
                 trait.game = character.game
                 trait.name = name
                 trait.type = CharacterTraitType.FLAG
-                character.traits.append(trait)
+                character.traits.add(trait)
             trait.value = value
             session.commit()
             return f"Successfully set flag `{name}` to \"{value}\"."
 
+    @command(help_msg="Sets a flag on many characters at once. " + BULK_TARGETS_HELP, requires_gm=True)
+    async def flag_all(self, ctx: CommandCallContext, name: str, value: str, *targets: str) -> str:
+        name = name.strip()
+        value = value.strip()
+        if not re.match(r"^[a-z_]+$", name):
+            raise CommandException(
+                f"Cannot set flag `{name}`: invalid name, must consist only of lowercase letters and underscores."
+            )
+        with get_session() as session:
+            characters = _get_targeted_characters(ctx, session, targets)
+            num_updated, num_created = CharacterTrait.set_flag_bulk(
+                session, ctx.guild.id, [character.id for character in characters], name, value
+            )
+            session.commit()
+            return (
+                f"Successfully set flag `{name}` to \"{value}\" on {len(characters)} character(s) "
+                f"({num_created} new, {num_updated} updated): "
+                + ", ".join(f"**{character.name}**" for character in characters)
+            )
+
+    @command(
+        help_msg="Displays the history of messages sent in your current location, most recent first. Older messages "
+                 "can be viewed by specifying a page number.",
+    )
+    async def history(self, ctx: CommandCallContext, page: Optional[int] = None) -> str:
+        page = page or 1
+        if page < 1:
+            raise CommandException(f"Cannot display history: invalid page {page}.")
+        with get_session() as session:
+            location = Location.get_for_channel(session, ctx.guild.id, ctx.channel.id)
+            if not location:
+                location = get_channel_character(ctx, session).location
+            if not location:
+                raise CommandException("Cannot display history: your character isn't in any location yet.")
+            transcript = self.transcripts.get(location.id)
+            entries = transcript.get_page(page)
+            if not entries:
+                if page == 1:
+                    return f"There is no history for `{location.name}` yet."
+                raise CommandException(
+                    f"Cannot display history: `{location.name}` only has {transcript.num_pages} page(s) of history."
+                )
+            return (
+                f"_*History of `{location.name}` (page {page} of {transcript.num_pages}):*_\n\n"
+                + "\n\n".join(f"_{entry.timestamp:%Y-%m-%d %H:%M} UTC_\n{entry.text}" for entry in entries)
+            )
+
+    @command(
+        help_msg="Exports the full history of a channel (this one by default) to a file, in one of the following "
+                 "formats: `md` (default), `html`, `jsonl`. An interrupted export resumes where it left off.",
+        requires_gm=True,
+    )
+    async def export(
+            self, ctx: CommandCallContext, export_format: Optional[str] = None, channel: Optional[TextChannel] = None
+    ) -> AsyncIterable[str]:
+        try:
+            parsed_format = ExportFormat((export_format or ExportFormat.MARKDOWN.value).strip().lower())
+        except ValueError:
+            raise CommandException(f"Cannot export: unknown format `{export_format}`.")
+        channel = channel or ctx.channel
+        yield f"Exporting the history of {channel.mention}, this may take a while."
+        result = await export_channel(channel, parsed_format)
+        summary = (
+            f"Exported {result.num_messages} messages from {channel.mention}"
+            + (" (resumed from an interrupted export)" if result.resumed else "") + "."
+        )
+        if os.path.getsize(result.path) <= MAX_EXPORT_UPLOAD_SIZE:
+            await ctx.channel.send(summary, file=File(result.path))
+        else:
+            yield f"{summary} The export is too large to upload, it has been saved as `{result.path}`."
+
+    @command(
+        help_msg="Announces a message in every location and character channel of the game. Progress is reported as "
+                 "the announcement goes out, and it can be stopped with `.announcecancel`.",
+        requires_gm=True,
+    )
+    async def announce(self, ctx: CommandCallContext, text: str) -> Optional[str]:
+        if ctx.guild.id in self.announcements:
+            raise CommandException("Cannot announce: another announcement is still being sent.")
+        with get_session() as session:
+            channel_ids = get_game_channel_ids(session, ctx.guild.id)
+        channels = []
+        failures = {}
+        for channel_id in channel_ids:
+            if channel := ctx.guild.get_channel(channel_id):
+                channels.append(channel)
+            else:
+                failures[channel_id] = "channel not found"
+        announcement = Announcement(channels, text, failures)
+        self.announcements[ctx.guild.id] = announcement
+        try:
+            progress_message = await ctx.channel.send(announcement.format_progress())
+            await announcement.run(progress_message)
+        finally:
+            del self.announcements[ctx.guild.id]
+        return announcement.format_report() if announcement.failures else None
+
+    @command(help_msg="Stops the announcement currently being sent.", requires_gm=True)
+    async def announce_cancel(self, ctx: CommandCallContext) -> str:
+        announcement = self.announcements.get(ctx.guild.id)
+        if not announcement:
+            raise CommandException("Cannot cancel: no announcement is being sent.")
+        announcement.cancel()
+        return "The announcement will stop once the messages currently being sent are out."
+
     # TODO Add radio commands
 
-    @command(help_msg="Rolls a set of standard polyhedral dice (d4, d6, d8, d10, d12, d20, d100). Example: 1d6 3d8")
+    @command(
+        help_msg="Rolls dice (d4, d6, d8, d10, d12, d20, d100 or any other number of sides) and adds up the result. "
+                 "Dice can keep the highest or lowest rolls (`4d6kh3`, `2d20kl1`), drop some (`4d6dl1`) or explode "
+                 "on their highest face (`3d6!`), and can be combined with modifiers (`1d20 + 5`) or repeated "
+                 "(`6x 3d6`). Example: 1d6 3d8",
+    )
     async def roll(self, ctx: CommandCallContext, dice: str) -> Optional[str]:
-        elements = re.split(r"\s+", dice.strip())
-        rolls = []
-        for element in elements:
-            if not (match := re.match(r"^(\d+)d(\d+)$", element)):
-                raise CommandException("Invalid roll request")
-            num_dice, num_sides = int(match.group(1)), int(match.group(2))
-            for _ in range(num_dice):
-                # Special case for the d100
-                if num_sides == 100:
-                    rolls.append((random.randint(0, num_sides - 1), num_sides))
-                else:
-                    rolls.append((random.randint(1, num_sides), num_sides))
-        roll_results = " + ".join(
-            (str(roll).zfill(2) if num_sides == 100 else str(roll)) + f" [d{num_sides}]" for roll, num_sides in rolls
-        )
-        if len(rolls) == 1:
-            roll_message = f"rolled {roll_results}"
+        results = roll_dice_expression(parse_dice_expression(dice))
+        if len(results) == 1:
+            roll_message = f"rolled {format_dice_roll_result(results[0])}"
         else:
-            total = sum(roll for roll, num_sides in rolls)
-            roll_message = f"rolled **{total}** = {roll_results}"
+            roll_message = f"rolled `{dice.strip()}`:" + "".join(
+                f"\n{i}. {format_dice_roll_result(result)}" for i, result in enumerate(results, start=1)
+            )
         with get_session() as session:
-            if self.use_channel_navigation(session, ctx.guild):
+            if self.use_channel_navigation(ctx.guild):
                 try:
                     character = get_channel_character(ctx, session)
                     await send_broadcast(ctx.guild, character.location, f"**{character.name}** " + roll_message)
@@ -639,12 +1083,20 @@ class CharacterPlugin(Plugin):
                 ):
                     await send_broadcast(ctx.guild, character.location, f"**{character.name}** " + roll_message)
                     return None
-            return f"**{ctx.message.author.display_name}** " + roll_message
+            return f"**{ctx.member.display_name}** " + roll_message
+
+    @command(
+        help_msg="Computes the exact odds of a roll: its mean, percentiles and, with a target, the chance of rolling "
+                 "at least that much. Supports the same dice as `.roll`, except exploding dice. Example: 4d6kh3 >= 15",
+    )
+    async def odds(self, ctx: CommandCallContext, dice: str) -> str:
+        expression, target = parse_odds_query(dice)
+        return format_distribution(expression, get_distribution(expression), target)
 
     @command(help_msg="Toggles a character's messages for interception by the GM.", requires_gm=True)
     async def intercept(self, ctx: CommandCallContext, player: Member, name: Optional[str] = None) -> str:
         with get_session() as session:
-            if not self.use_channel_navigation(session, ctx.guild):
+            if not self.use_channel_navigation(ctx.guild):
                 raise CommandException("Cannot intercept messages while in channel navigation mode")
 
             character = _get_character_implicit(session, player, name)
@@ -665,8 +1117,10 @@ class CharacterPlugin(Plugin):
                 return f"**{character.name}**'s messages are no longer being intercepted."
 
     async def move_character(self, session: Session, guild: Guild, character: Character, new_location: Location) -> None:
-        use_channel_navigation = self.use_channel_navigation(session, guild)
+        use_channel_navigation = self.use_channel_navigation(guild)
         character.last_movement = datetime.utcnow()
+        if character.location:
+            await self.flush_relay(character.location.id)
 
         if use_channel_navigation and (member := guild.get_member(character.member_id)):
             if (
@@ -687,22 +1141,29 @@ class CharacterPlugin(Plugin):
             f"**{character.name}** moves in from `{character.location.name}`"
             if character.location else f"**{character.name}** appears"
         )
+        old_location = character.location
         character.location = new_location
-        await send_status(guild, character)
+        activity_tracker.record(guild.id, ActivityKind.MOVE, new_location.id)
+        if self.get_settings(guild).status_board:
+            # The new location's update also covers the character that just moved in
+            if old_location:
+                self.status_board.request_update(guild, old_location.id)
+            self.status_board.request_update(guild, new_location.id)
+        else:
+            await send_status(guild, character)
 
         # Replay the last few messages in the channel from the past week
         channel: TextChannel = guild.get_channel(character.channel_id) if character.channel_id else None
-        last_messages: Sequence[CachedMessage] = self.cached_messages["locations"].get(new_location.id, [])
-        now = datetime.now()
-        min_timestamp = now - MAX_AGE_LAST_LOCATION_MESSAGES
-        texts = [
-            cached_message.text for cached_message in last_messages if cached_message.timestamp > min_timestamp
-        ]
-        if texts and channel:
+        num_replayed = self.get_settings(guild).arrival_replay_messages
+        now = datetime.utcnow()
+        last_messages = self.transcripts.get(new_location.id).get_recent(
+            num_replayed, now - MAX_AGE_LAST_LOCATION_MESSAGES
+        ) if num_replayed > 0 else []
+        if last_messages and channel:
             await send_message(
                 channel,
                 f"_*Recent activity (last message sent {naturaldelta(now - last_messages[-1].timestamp)} ago):*_\n\n"
-                + "\n\n".join(texts)
+                + "\n\n".join(entry.text for entry in last_messages)
             )
 
     @classmethod
@@ -715,6 +1176,8 @@ class CharacterPlugin(Plugin):
             "Characters": characters_all.__name__,
             "Game Master": {
                 "Locations": characters_locations.__name__,
+                "Activity": characters_activity.__name__,
+                "World": characters_world.__name__,
             },
             "Your Data": {
                 "Characters": characters_yours.__name__,
@@ -722,11 +1185,28 @@ class CharacterPlugin(Plugin):
         }
 
 
+def _describe_scheduled_action(action: ScheduledAction) -> str:
+    # The targets of an action may be removed before it runs, in which case running it does nothing
+    if action.type == ScheduledActionType.MOVE:
+        character_name = action.character.name if action.character else "(deleted character)"
+        location_name = action.location.name if action.location else "(deleted location)"
+        return f"move **{character_name}** to `{location_name}`"
+    elif action.type == ScheduledActionType.BROADCAST:
+        location_name = action.location.name if action.location else "(deleted location)"
+        return f"broadcast to `{location_name}`: {action.text}"
+    connection = action.connection
+    if not connection:
+        return f"{action.type.value} (deleted connection)"
+    return f"{action.type.value} `{connection.location_1.name}` to `{connection.location_2.name}`"
+
+
+def _format_relay(author_name: Optional[str], content: str) -> str:
+    intro = f"__**{author_name}**__\n" if author_name else ""
+    return f"{intro}{content}"
+
+
 def get_channel_character(ctx: CommandCallContext, session: Session) -> Character:
-    use_channel_navigation = bool(
-        get_setting(CharacterPlugin.__name__, session, ctx.guild, "use_channel_navigation")
-    )
-    if use_channel_navigation:
+    if CharacterPlugin.get_settings(ctx.guild).use_channel_navigation:
         # Channel navigation assumes there is only one character per player
         characters = Character.get_all_of_member(session, ctx.guild.id, ctx.member.id)
         character = characters[0] if len(characters) == 1 else None
@@ -737,6 +1217,67 @@ def get_channel_character(ctx: CommandCallContext, session: Session) -> Characte
     return character
 
 
+def _get_location_channels(guild: Guild, location: Location) -> list[TextChannel]:
+    channel_ids = [character.channel_id for character in location.characters if character.channel_id]
+    if location.channel_id:
+        channel_ids.append(location.channel_id)
+    return [channel for channel in map(guild.get_channel, channel_ids) if channel]
+
+
+def _find_connection(location_1: Location, location_2: Location) -> Optional[Connection]:
+    for connection in location_1.connections:
+        if location_2 in (connection.location_1, connection.location_2):
+            return connection
+    return None
+
+
+def _get_targeted_characters(ctx: CommandCallContext, session: Session, targets: Iterable[str]) -> list[Character]:
+    location_names = set()
+    member_ids: set[int] = set()
+    names = set()
+    for target in targets:
+        target = target.strip()
+        if target.lower().startswith(TARGET_LOCATION_PREFIX):
+            location_names.add(target[len(TARGET_LOCATION_PREFIX):].strip())
+        elif target.lower().startswith(TARGET_ROLE_PREFIX):
+            role = cast(Role, CommandParam("role", Role).parse(ctx.guild, target[len(TARGET_ROLE_PREFIX):]))
+            member_ids.update(member.id for member in role.members)
+        elif target:
+            names.add(target)
+    if not (location_names or member_ids or names):
+        raise CommandException("No characters targeted. " + BULK_TARGETS_HELP)
+
+    locations = {
+        location.name: location for location in Location.get_all(session, ctx.guild.id)
+        if location.name in location_names
+    }
+    if unknown_locations := location_names - locations.keys():
+        raise CommandException("Unknown location(s): " + ", ".join(f"`{name}`" for name in sorted(unknown_locations)))
+    characters = Character.get_all_targeted(
+        session, ctx.guild.id, [location.id for location in locations.values()], member_ids, names
+    )
+    if unknown_names := names - {character.name for character in characters}:
+        raise CommandException("Unknown character(s): " + ", ".join(f"**{name}**" for name in sorted(unknown_names)))
+    if not characters:
+        raise CommandException("No characters matched the given targets.")
+    return characters
+
+
+def _format_bulk_summary(
+        intro: str, applied: list[Character], skipped: list[Character], skipped_reason: str
+) -> str:
+    summary = f"{intro} {len(applied)} character(s)"
+    if applied:
+        summary += ": " + ", ".join(f"**{character.name}**" for character in applied)
+    summary += "."
+    if skipped:
+        summary += (
+            f"\nSkipped {len(skipped)} character(s) who {skipped_reason}: "
+            + ", ".join(f"**{character.name}**" for character in skipped)
+        )
+    return summary
+
+
 def _get_character_implicit(session: Session, player: Member, name: Optional[str] = None) -> Character:
     if name:
         character = _get_character_fuzzy(session, player, name.strip())
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from discord import Guild, Message, Object, TextChannel, NotFound, HTTPException
+from sqlalchemy import insert
+
+from raconteur.models.base import get_session
+from raconteur.plugins.character.models import RelayCopy
+
+# Copies are only tracked for a week, which also keeps them within the two weeks allowed by bulk deletes
+RELAY_INDEX_TTL = timedelta(days=7)
+RELAY_INDEX_SWEEP_INTERVAL = 60 * 60
+
+
+class RelayIndex:
+    """Persistent map from original messages to the copies relayed in other channels.
+
+    Each copy is stored as its own small row, looked up by any message of the relay to propagate deletions. Edits
+    aren't propagated, as the originals are deleted as soon as they are relayed. Rows expire after a while and are
+    swept regularly.
+    """
+
+    ignored_deletions: set[int]
+    task: Optional[asyncio.Task]
+
+    def __init__(self) -> None:
+        self.ignored_deletions = set()
+        self.task = None
+
+    def start(self) -> None:
+        if not self.task:
+            self.task = asyncio.create_task(self._sweep())
+
+    async def delete_original(self, message: Message) -> None:
+        # Originals are deleted by the bot itself once relayed, which must not take the relayed copies along. The
+        # deletion event arrives later through the gateway, so the ID is only forgotten here if no event will come.
+        self.ignored_deletions.add(message.id)
+        try:
+            await message.delete()
+        except Exception:
+            self.ignored_deletions.discard(message.id)
+            raise
+
+    async def delete_originals(self, channel: TextChannel, messages: list[Message]) -> None:
+        # Same as above, for originals merged into a single relay, which come back as one bulk deletion event
+        message_ids = {message.id for message in messages}
+        self.ignored_deletions.update(message_ids)
+        try:
+            await channel.delete_messages(messages)
+        except Exception:
+            self.ignored_deletions.difference_update(message_ids)
+            raise
+
+    @staticmethod
+    def record(guild_id: int, original_message_ids: list[int], copies: list[Message]) -> None:
+        if not original_message_ids or not copies:
+            return
+        now = datetime.utcnow()
+        with get_session() as session:
+            session.execute(insert(RelayCopy), [
+                {
+                    "game_guild_id": guild_id,
+                    "original_message_id": original_message_id,
+                    "channel_id": copy.channel.id,
+                    "message_id": copy.id,
+                    "created_at": now,
+                }
+                for original_message_id in original_message_ids for copy in copies
+            ])
+            session.commit()
+
+    async def propagate_delete(self, guild: Guild, message_id: int) -> None:
+        if message_id in self.ignored_deletions:
+            self.ignored_deletions.discard(message_id)
+            return
+        with get_session() as session:
+            copies = RelayCopy.get_all_related(session, message_id)
+            if not copies:
+                return
+            # Remove the rows first, so that the deletions below don't trigger another round of propagation
+            message_ids_by_channel: dict[int, set[int]] = defaultdict(set)
+            for copy in copies:
+                if copy.message_id != message_id:
+                    message_ids_by_channel[copy.channel_id].add(copy.message_id)
+                session.delete(copy)
+            session.commit()
+
+        deletions = []
+        for channel_id, message_ids in message_ids_by_channel.items():
+            channel: Optional[TextChannel] = guild.get_channel(channel_id)
+            if not channel:
+                continue
+            if len(message_ids) > 1:
+                deletions.append(channel.delete_messages([Object(id=copy_id) for copy_id in message_ids]))
+            else:
+                deletions.append(channel.get_partial_message(next(iter(message_ids))).delete())
+        await _gather_ignoring_missing(deletions)
+
+    async def _sweep(self) -> None:
+        while True:
+            try:
+                with get_session() as session:
+                    RelayCopy.delete_expired(session, datetime.utcnow() - RELAY_INDEX_TTL)
+                    session.commit()
+            except Exception as e:
+                logging.exception(e)
+            await asyncio.sleep(RELAY_INDEX_SWEEP_INTERVAL)
+
+
+async def _gather_ignoring_missing(operations: list) -> None:
+    for result in await asyncio.gather(*operations, return_exceptions=True):
+        if isinstance(result, NotFound):
+            # Already gone, which is the point anyway
+            continue
+        if isinstance(result, HTTPException):
+            logging.warning(f"Failed to propagate a change to a relayed message: {result}")
+        elif isinstance(result, Exception):
+            logging.exception(result)
@@ -0,0 +1,86 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from typing import Callable, Awaitable, Optional
+
+from sqlalchemy.orm import Session
+
+from raconteur.models.base import get_session
+from raconteur.plugins.character.models import ScheduledAction
+
+ScheduledActionHandler = Callable[[Session, ScheduledAction], Awaitable[None]]
+
+
+class ActionScheduler:
+    """Runs scheduled actions when they are due.
+
+    Pending actions live in the database so they survive restarts, but only their due time and ID are kept in memory,
+    in a heap. The scheduler sleeps until the earliest one is due instead of polling the database; an action is only
+    loaded from the database when it is run, so cancelling one just means deleting its row.
+    """
+
+    heap: list[tuple[datetime, int]]
+    wakeup: asyncio.Event
+    task: Optional[asyncio.Task]
+
+    def __init__(self, handler: ScheduledActionHandler):
+        self.handler: ScheduledActionHandler = handler
+        self.heap = []
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def start(self) -> None:
+        if self.task:
+            return
+        with get_session() as session:
+            self.heap = [(action.run_at, action.id) for action in ScheduledAction.get_all(session)]
+        heapq.heapify(self.heap)
+        self.task = asyncio.create_task(self._run())
+
+    def schedule(self, session: Session, action: ScheduledAction) -> ScheduledAction:
+        session.add(action)
+        session.commit()
+        heapq.heappush(self.heap, (action.run_at, action.id))
+        if self.heap[0][1] == action.id:
+            # The new action is due before anything else, wake the scheduler up so that it doesn't oversleep
+            self.wakeup.set()
+        return action
+
+    @staticmethod
+    def cancel(session: Session, action: ScheduledAction) -> None:
+        # The stale heap entry is discarded once it comes due and its action can no longer be found
+        session.delete(action)
+        session.commit()
+
+    async def _run(self) -> None:
+        while True:
+            if not self.heap:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            run_at, action_id = self.heap[0]
+            delay = (run_at - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                continue
+            heapq.heappop(self.heap)
+            await self._execute(action_id)
+
+    async def _execute(self, action_id: int) -> None:
+        with get_session() as session:
+            action = session.get(ScheduledAction, action_id)
+            if not action:
+                return
+            try:
+                await self.handler(session, action)
+            except Exception as e:
+                logging.exception(e)
+            session.rollback()
+            if action := session.get(ScheduledAction, action_id):
+                session.delete(action)
+                session.commit()
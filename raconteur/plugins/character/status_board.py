@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from discord import Guild, NotFound, TextChannel
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from raconteur.models.base import get_session
+from raconteur.plugins.character.communication import build_status_embed, STATUS_ACTIVITY_SAMPLE
+from raconteur.plugins.character.models import Character
+from raconteur.plugins.character.transcripts import TranscriptStore
+
+STATUS_BOARD_DEBOUNCE = 5
+
+
+class StatusBoard:
+    """Keeps a single pinned status message up to date in each character channel.
+
+    Updates are requested per location and debounced, so that a burst of status changes or moves only results in one
+    edit per character channel once the window has passed.
+    """
+
+    transcripts: TranscriptStore
+    pending: dict[int, asyncio.Task]
+
+    def __init__(self, transcripts: TranscriptStore):
+        self.transcripts = transcripts
+        self.pending = {}
+
+    def request_update(self, guild: Guild, location_id: int) -> None:
+        if location_id not in self.pending:
+            self.pending[location_id] = asyncio.create_task(self._update_later(guild, location_id))
+
+    async def update_location(self, guild: Guild, location_id: int) -> None:
+        with get_session() as session:
+            characters = session.execute(
+                select(Character)
+                .where(Character.game_guild_id == guild.id, Character.location_id == location_id)
+                .options(selectinload(Character.status_message))
+            ).scalars()
+            activity = self._get_activity(location_id)
+            await asyncio.gather(*[self.update_character(guild, character, activity) for character in characters])
+            session.commit()
+
+    async def update_character(
+            self, guild: Guild, character: Character, activity: Optional[list[datetime]] = None
+    ) -> None:
+        channel: TextChannel = guild.get_channel(character.channel_id) if character.channel_id else None
+        if not channel:
+            return
+        if activity is None:
+            activity = self._get_activity(character.location_id) if character.location_id else []
+        embed = build_status_embed(character, activity)
+        if character.status_message_id:
+            try:
+                await channel.get_partial_message(character.status_message_id).edit(embed=embed)
+                return
+            except NotFound:
+                # The status message was deleted, post a new one
+                pass
+        message = await channel.send(embed=embed)
+        await message.pin()
+        character.status_message_id = message.id
+
+    async def _update_later(self, guild: Guild, location_id: int) -> None:
+        await asyncio.sleep(STATUS_BOARD_DEBOUNCE)
+        del self.pending[location_id]
+        try:
+            await self.update_location(guild, location_id)
+        except Exception as e:
+            logging.exception(e)
+
+    def _get_activity(self, location_id: int) -> list[datetime]:
+        return [entry.timestamp for entry in self.transcripts.get(location_id).get_recent(STATUS_ACTIVITY_SAMPLE)]
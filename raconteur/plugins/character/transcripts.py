@@ -0,0 +1,131 @@
+import gzip
+import json
+import os
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+TRANSCRIPTS_PATH = "plugin_characters_transcripts"
+TRANSCRIPT_PAGE_SIZE = 20
+
+_EPOCH = datetime(1970, 1, 1)
+_HEAD_FILE = "head.jsonl"
+_INDEX_FILE = "index"
+
+
+@dataclass(frozen=True)
+class TranscriptEntry:
+    text: str
+    timestamp: datetime
+    author_id: Optional[int] = None
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"t": (self.timestamp - _EPOCH).total_seconds(), "a": self.author_id, "x": self.text},
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, line: str) -> "TranscriptEntry":
+        data = json.loads(line)
+        return cls(text=data["x"], timestamp=_EPOCH + timedelta(seconds=data["t"]), author_id=data["a"])
+
+
+class LocationTranscript:
+    """Append-only transcript of the messages relayed in a single location.
+
+    New entries go to an uncompressed head file; once it holds a full page, it is sealed into its own compressed chunk.
+    Since every sealed chunk holds exactly one page, reading a page never touches more than two files.
+    """
+
+    path: str
+    chunk_timestamps: list[float]
+    head: list[TranscriptEntry]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.chunk_timestamps = []
+        self.head = []
+        if os.path.exists(os.path.join(path, _INDEX_FILE)):
+            with open(os.path.join(path, _INDEX_FILE), "r", encoding="utf-8") as f:
+                self.chunk_timestamps = [float(line) for line in f if line.strip()]
+        if os.path.exists(os.path.join(path, _HEAD_FILE)):
+            with open(os.path.join(path, _HEAD_FILE), "r", encoding="utf-8") as f:
+                self.head = [TranscriptEntry.from_json(line) for line in f if line.strip()]
+
+    def __len__(self) -> int:
+        return len(self.chunk_timestamps) * TRANSCRIPT_PAGE_SIZE + len(self.head)
+
+    @property
+    def num_pages(self) -> int:
+        return (len(self) + TRANSCRIPT_PAGE_SIZE - 1) // TRANSCRIPT_PAGE_SIZE
+
+    def append(self, entry: TranscriptEntry) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        self.head.append(entry)
+        if len(self.head) < TRANSCRIPT_PAGE_SIZE:
+            with open(os.path.join(self.path, _HEAD_FILE), "a", encoding="utf-8") as f:
+                f.write(entry.to_json() + "\n")
+            return
+
+        # The head is full, seal it into a compressed chunk and start a new one
+        chunk_idx = len(self.chunk_timestamps)
+        with gzip.open(self._get_chunk_path(chunk_idx), "wt", encoding="utf-8") as f:
+            f.writelines(head_entry.to_json() + "\n" for head_entry in self.head)
+        first_timestamp = (self.head[0].timestamp - _EPOCH).total_seconds()
+        with open(os.path.join(self.path, _INDEX_FILE), "a", encoding="utf-8") as f:
+            f.write(f"{first_timestamp}\n")
+        self.chunk_timestamps.append(first_timestamp)
+        self.head = []
+        open(os.path.join(self.path, _HEAD_FILE), "w").close()
+
+    def get_page(self, page: int) -> list[TranscriptEntry]:
+        """Returns the entries on the given page, oldest first; page 1 holds the most recent entries."""
+        total = len(self)
+        end = total - (page - 1) * TRANSCRIPT_PAGE_SIZE
+        return self._read_range(max(end - TRANSCRIPT_PAGE_SIZE, 0), end) if page > 0 and end > 0 else []
+
+    def get_recent(self, limit: int, since: Optional[datetime] = None) -> list[TranscriptEntry]:
+        start = len(self) - limit
+        if since is not None:
+            # Skip every sealed chunk which only contains entries older than the cutoff
+            first_chunk = max(bisect_right(self.chunk_timestamps, (since - _EPOCH).total_seconds()) - 1, 0)
+            start = max(start, first_chunk * TRANSCRIPT_PAGE_SIZE)
+        entries = self._read_range(max(start, 0), len(self))
+        return [entry for entry in entries if since is None or entry.timestamp > since]
+
+    def _read_range(self, start: int, end: int) -> list[TranscriptEntry]:
+        entries = []
+        for chunk_idx in range(start // TRANSCRIPT_PAGE_SIZE, (end - 1) // TRANSCRIPT_PAGE_SIZE + 1):
+            chunk_start = chunk_idx * TRANSCRIPT_PAGE_SIZE
+            chunk = self._read_chunk(chunk_idx)
+            entries.extend(chunk[max(start - chunk_start, 0):end - chunk_start])
+        return entries
+
+    def _read_chunk(self, chunk_idx: int) -> list[TranscriptEntry]:
+        if chunk_idx == len(self.chunk_timestamps):
+            return self.head
+        with gzip.open(self._get_chunk_path(chunk_idx), "rt", encoding="utf-8") as f:
+            return [TranscriptEntry.from_json(line) for line in f if line.strip()]
+
+    def _get_chunk_path(self, chunk_idx: int) -> str:
+        return os.path.join(self.path, f"{chunk_idx}.jsonl.gz")
+
+
+class TranscriptStore:
+    path: str
+    transcripts: dict[int, LocationTranscript]
+
+    def __init__(self, path: str = TRANSCRIPTS_PATH):
+        self.path = path
+        self.transcripts = {}
+
+    def get(self, location_id: int) -> LocationTranscript:
+        if location_id not in self.transcripts:
+            self.transcripts[location_id] = LocationTranscript(os.path.join(self.path, str(location_id)))
+        return self.transcripts[location_id]
+
+    def append(self, location_id: int, entry: TranscriptEntry) -> None:
+        self.get(location_id).append(entry)
+
@@ -0,0 +1,58 @@
+import re
+
+from raconteur.plugins.character.models import CHARACTER_NAME_MAX_LENGTH, CHARACTER_STATUS_MAX_LENGTH, \
+    CHARACTER_APPEARANCE_MAX_LENGTH, LOCATION_NAME_MAX_LENGTH, LOCATION_CATEGORY_MAX_LENGTH, \
+    LOCATION_DESCRIPTION_MAX_LENGTH
+
+LOCATION_NAME_PATTERN = re.compile(r"^[a-z0-9\-]*$")
+PORTRAIT_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif")
+
+
+def get_character_validation_errors(name: str, portrait: str, status: str, appearance: str) -> list[str]:
+    validation_errors = []
+    if not name:
+        validation_errors.append("You must specify a name")
+    if len(name) > CHARACTER_NAME_MAX_LENGTH:
+        validation_errors.append(
+            f"Character name is too long (must be {CHARACTER_NAME_MAX_LENGTH} characters or less)"
+        )
+    if len(status) > CHARACTER_STATUS_MAX_LENGTH:
+        validation_errors.append(
+            f"Character status is too long (must be {CHARACTER_STATUS_MAX_LENGTH} characters or less)"
+        )
+    if len(appearance) > CHARACTER_APPEARANCE_MAX_LENGTH:
+        validation_errors.append(
+            f"Character appearance is too long (must be {CHARACTER_APPEARANCE_MAX_LENGTH} characters or less)"
+        )
+    # noinspection HttpUrlsUsage
+    if portrait and not (
+            (portrait.startswith("http://") or portrait.startswith("https://"))
+            and portrait.endswith(PORTRAIT_EXTENSIONS)
+    ):
+        validation_errors.append("You must specify a valid image URL (PNG, JPG or GIF)")
+    return validation_errors
+
+
+def get_location_validation_errors(name: str, category: str, description: str) -> list[str]:
+    validation_errors = []
+    if not name:
+        validation_errors.append("You must specify a name")
+    if len(name) > LOCATION_NAME_MAX_LENGTH:
+        validation_errors.append(
+            f"Location name is too long (must be {LOCATION_NAME_MAX_LENGTH} characters or less)"
+        )
+    if not LOCATION_NAME_PATTERN.match(name):
+        validation_errors.append("Location name must consist only of lowercase letters, numbers and dashes")
+    if not category:
+        validation_errors.append("You must specify a category")
+    if len(category) > LOCATION_CATEGORY_MAX_LENGTH:
+        validation_errors.append(
+            f"Location category is too long (must be {LOCATION_CATEGORY_MAX_LENGTH} characters or less)"
+        )
+    if not description:
+        validation_errors.append("You must specify a description")
+    if len(description) > LOCATION_DESCRIPTION_MAX_LENGTH:
+        validation_errors.append(
+            f"Location description is too long (must be {LOCATION_DESCRIPTION_MAX_LENGTH} characters or less)"
+        )
+    return validation_errors
@@ -1,24 +1,42 @@
+import codecs
 import http
 import re
-from collections import defaultdict
-from typing import Optional, Any, Callable
+from collections import defaultdict, Counter
+from datetime import datetime, timedelta
+from typing import Optional, Any, Callable, AsyncIterator, Iterator
+from urllib.parse import quote
 
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Form, HTTPException, File, UploadFile
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from starlette.requests import Request
-from starlette.responses import RedirectResponse, Response
+from starlette.responses import RedirectResponse, Response, StreamingResponse
 
 from raconteur.models.base import get_session
+from raconteur.plugins.character.activity import get_hour
+from raconteur.plugins.character.export import ExportFormat, iter_raw_channel_history, format_header, \
+    format_message, format_footer
 from raconteur.plugins.character.models import Character, CHARACTER_NAME_MAX_LENGTH, CHARACTER_STATUS_MAX_LENGTH, \
     CHARACTER_APPEARANCE_MAX_LENGTH, Location, LOCATION_DESCRIPTION_MAX_LENGTH, LOCATION_CATEGORY_MAX_LENGTH, \
-    LOCATION_NAME_MAX_LENGTH, Connection
-from raconteur.plugins.umbreal.models import UmbrealSheet
+    LOCATION_NAME_MAX_LENGTH, Connection, ActivityRollup, ActivityKind
+from raconteur.plugins.character.validation import get_character_validation_errors, get_location_validation_errors
+from raconteur.plugins.character.world import export_world, import_world, WorldImportReport, UMBREAL_SHEET_TYPE, \
+    UNKNOWN_ARMIES_SHEET_TYPE
+from raconteur.plugins.umbreal.models import UmbrealSheet, UmbrealTraitsVersion
+from raconteur.plugins.umbreal.web import validate_umbreal_sheet
 from raconteur.plugins.unknown_armies.models import UnknownArmiesSheet
+from raconteur.plugins.unknown_armies.web import validate_unknown_armies_sheet
+from raconteur.web.client import get_client
 from raconteur.web.context import RequestContext
 from raconteur.web.templates import render_response
 from raconteur.web.utils import check_permissions, VALIDATION_ERRORS, add_validation_errors
 
-LOCATION_NAME_PATTERN = re.compile(r"^[a-z0-9\-]*$")
+ACTIVITY_WINDOW = timedelta(days=7)
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.MARKDOWN: "text/markdown",
+    ExportFormat.HTML: "text/html",
+    ExportFormat.JSONL: "application/x-ndjson",
+}
 
 character_plugin_router = APIRouter()
 
@@ -139,6 +157,8 @@ async def characters_yours_delete(request: Request, current_game_id: int, charac
             assert context.current_user
             if character := Character.get(session, current_game_id, context.current_user.id, character_id):
                 session.delete(character)
+                # Umbreal traits are looked up by character name, and the character's sheet goes along with it
+                UmbrealTraitsVersion.bump(session, current_game_id)
                 session.commit()
             else:
                 context.errors.append("Failed to locate entity")
@@ -283,6 +303,155 @@ async def characters_locations_delete(request: Request, current_game_id: int, lo
         )
 
 
+@character_plugin_router.get("/{current_game_id}/character/activity")
+async def characters_activity(request: Request, current_game_id: int) -> Response:
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if await check_permissions(context, require_gm=True):
+            # Only the hourly rollups are read, the dashboard never has to go through the message history
+            now = get_hour(datetime.utcnow())
+            since = now - ACTIVITY_WINDOW + timedelta(hours=1)
+            totals: dict[ActivityKind, Counter[int]] = defaultdict(Counter)
+            hourly: Counter[datetime] = Counter()
+            for rollup in ActivityRollup.get_all_since(session, current_game_id, since):
+                totals[rollup.kind][rollup.subject_id] += rollup.count
+                if rollup.kind == ActivityKind.LOCATION_MESSAGE:
+                    hourly[rollup.hour] += rollup.count
+
+            locations = {location.id: location for location in Location.get_all(session, guild_id=current_game_id)}
+            characters = {
+                character.id: character for character in Character.get_all_of_guild(session, current_game_id)
+            }
+            hours = [since + timedelta(hours=i) for i in range(int(ACTIVITY_WINDOW / timedelta(hours=1)))]
+            context.extra["hours"] = [(hour, hourly[hour]) for hour in hours]
+            context.extra["max_hourly"] = max(hourly.values(), default=0)
+            context.extra["locations"] = [
+                (location, totals[ActivityKind.LOCATION_MESSAGE][location_id], totals[ActivityKind.MOVE][location_id],
+                 totals[ActivityKind.BROADCAST][location_id])
+                for location_id, location in locations.items()
+            ]
+            context.extra["locations"].sort(key=lambda row: row[1], reverse=True)
+            context.extra["characters"] = sorted(
+                [
+                    (character, totals[ActivityKind.CHARACTER_MESSAGE][character_id])
+                    for character_id, character in characters.items()
+                ],
+                key=lambda row: row[1],
+                reverse=True,
+            )
+        return render_response("character/activity.html", context)
+
+
+@character_plugin_router.get("/{current_game_id}/character/world")
+async def characters_world(request: Request, current_game_id: int) -> Response:
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if not await check_permissions(context, require_gm=True):
+            raise HTTPException(403, "You must be a GM to manage the world.")
+        return render_response("character/world.html", context)
+
+
+@character_plugin_router.get("/{current_game_id}/character/world/export")
+async def characters_world_export(request: Request, current_game_id: int) -> Response:
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if not await check_permissions(context, require_gm=True):
+            raise HTTPException(403, "You must be a GM to export the world.")
+
+    def generate() -> Iterator[str]:
+        # The export is read as it is sent, so it needs its own session for the whole duration of the response
+        with get_session() as export_session:
+            yield from export_world(export_session, current_game_id)
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="world-{current_game_id}.jsonl"'},
+    )
+
+
+@character_plugin_router.post("/{current_game_id}/character/world/import")
+async def characters_world_import(request: Request, current_game_id: int, world: UploadFile = File(...)) -> Response:
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if await check_permissions(context, require_gm=True):
+            try:
+                # The upload is decoded line by line, as it may be too large to read in memory at once
+                report = import_world(session, current_game_id, codecs.iterdecode(world.file, "utf-8"), validators={
+                    UMBREAL_SHEET_TYPE.name: validate_umbreal_sheet,
+                    UNKNOWN_ARMIES_SHEET_TYPE.name: validate_unknown_armies_sheet,
+                })
+            except UnicodeDecodeError:
+                session.rollback()
+                report = WorldImportReport(errors=["The world file must be encoded in UTF-8"])
+            except IntegrityError as e:
+                session.rollback()
+                report = WorldImportReport(errors=[f"The world conflicts with existing data: {e.orig}"])
+            context.extra["report"] = report
+            if report.errors:
+                add_validation_errors(context, report.errors)
+        return render_response("character/world.html", context)
+
+
+@character_plugin_router.get("/{current_game_id}/character/export/location/{location_id}")
+async def characters_export_location(
+        request: Request, current_game_id: int, location_id: int, export_format: str = "md", after: int = 0
+) -> Response:
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if not await check_permissions(context, require_gm=True):
+            raise HTTPException(403, "You must be a GM to export locations.")
+        location = Location.get(session, current_game_id, location_id)
+        if not location or not location.channel_id:
+            raise HTTPException(404, "Failed to locate location.")
+        return _stream_export(location.channel_id, location.name, export_format, after)
+
+
+@character_plugin_router.get("/{current_game_id}/character/export/character/{character_id}")
+async def characters_export_character(
+        request: Request, current_game_id: int, character_id: int, export_format: str = "md", after: int = 0
+) -> Response:
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if not await check_permissions(context):
+            raise HTTPException(403, "You do not have access to this game.")
+        assert context.current_user
+        character = Character.get_by_id(session, current_game_id, character_id)
+        if not character or (not context.permissions.is_gm and character.member_id != context.current_user.id):
+            raise HTTPException(404, "Failed to locate character.")
+        if not character.channel_id:
+            raise HTTPException(404, "This character does not have a channel.")
+        return _stream_export(character.channel_id, character.name, export_format, after)
+
+
+def _stream_export(channel_id: int, title: str, export_format: str, after: int) -> StreamingResponse:
+    try:
+        parsed_format = ExportFormat(export_format)
+    except ValueError:
+        raise HTTPException(400, f"Invalid export format: {export_format}")
+
+    async def generate() -> AsyncIterator[str]:
+        # Exports can be resumed by passing the ID of the last exported message as "after"
+        if not after:
+            yield format_header(parsed_format, title)
+        async for message in iter_raw_channel_history(await get_client(), channel_id, after):
+            yield format_message(parsed_format, message)
+        yield format_footer(parsed_format)
+
+    return StreamingResponse(
+        generate(),
+        media_type=EXPORT_MEDIA_TYPES[parsed_format],
+        headers={"Content-Disposition": _get_content_disposition(f"{title}.{parsed_format.value}")},
+    )
+
+
+def _get_content_disposition(filename: str) -> str:
+    # Header values must be plain ASCII, so the actual name goes in the RFC 5987 parameter and older clients get an
+    # approximation of it
+    fallback = re.sub(r'[^\x20-\x7e]|["\\]', "_", filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
 async def _edit_entity(
         template: str,
         request: Request,
@@ -352,42 +521,21 @@ def _populate_character(
 
     character.game_guild_id = context.current_game.guild_id
     character.member_id = context.current_user.id
+    if character.name != name.strip():
+        UmbrealTraitsVersion.bump(session, context.current_game.guild_id)
     character.name = name.strip()
     character.portrait = portrait.strip()
     character.status = status.strip()
     character.appearance = appearance.strip()
 
-    validation_errors = []
-    if not character.name:
-        validation_errors.append("You must specify a name")
-    if len(character.name) > CHARACTER_NAME_MAX_LENGTH:
-        validation_errors.append(
-            f"Character name is too long (must be {CHARACTER_NAME_MAX_LENGTH} characters or less)"
-        )
+    validation_errors = get_character_validation_errors(
+        character.name, character.portrait, character.status, character.appearance
+    )
     if (
             (existing_character := Character.get_by_name(session, context.current_game.guild_id, character.name))
             and existing_character != character
     ):
         validation_errors.append("A character with this name already exists")
-    if len(character.status) > CHARACTER_STATUS_MAX_LENGTH:
-        validation_errors.append(
-            f"Character status is too long (must be {CHARACTER_STATUS_MAX_LENGTH} characters or less)"
-        )
-    if len(character.appearance) > CHARACTER_APPEARANCE_MAX_LENGTH:
-        validation_errors.append(
-            f"Character appearance is too long (must be {CHARACTER_APPEARANCE_MAX_LENGTH} characters or less)"
-        )
-    # noinspection HttpUrlsUsage
-    if character.portrait and not (
-            (character.portrait.startswith("http://") or character.portrait.startswith("https://"))
-            and (
-                    character.portrait.endswith(".png")
-                    or character.portrait.endswith(".jpg")
-                    or character.portrait.endswith(".jpeg")
-                    or character.portrait.endswith(".gif")
-            )
-    ):
-        validation_errors.append("You must specify a valid image URL (PNG, JPG or GIF)")
 
     add_validation_errors(context, validation_errors)
 
@@ -409,32 +557,12 @@ def _populate_location(
     location.category = category.strip()
     location.description = description.strip()
 
-    validation_errors = []
-    if not location.name:
-        validation_errors.append("You must specify a name")
-    if len(location.name) > LOCATION_NAME_MAX_LENGTH:
-        validation_errors.append(
-            f"Location name is too long (must be {LOCATION_NAME_MAX_LENGTH} characters or less)"
-        )
-    if not LOCATION_NAME_PATTERN.match(location.name):
-        validation_errors.append("Location name must consist only of lowercase letters, numbers and dashes")
+    validation_errors = get_location_validation_errors(location.name, location.category, location.description)
     if (
             (existing_location := Location.get_by_name(session, context.current_game.guild_id, location.name))
             and existing_location != location
     ):
         validation_errors.append("A location with this name already exists")
-    if not location.category:
-        validation_errors.append("You must specify a category")
-    if len(location.category) > LOCATION_CATEGORY_MAX_LENGTH:
-        validation_errors.append(
-            f"Location category is too long (must be {LOCATION_CATEGORY_MAX_LENGTH} characters or less)"
-        )
-    if not location.description:
-        validation_errors.append("You must specify a description")
-    if len(location.description) > LOCATION_DESCRIPTION_MAX_LENGTH:
-        validation_errors.append(
-            f"Location description is too long (must be {LOCATION_DESCRIPTION_MAX_LENGTH} characters or less)"
-        )
 
     add_validation_errors(context, validation_errors)
 
@@ -0,0 +1,813 @@
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Iterable, Iterator, Hashable, Optional, Callable, cast
+
+from pydantic import BaseModel
+from sqlalchemy import select, insert, delete, bindparam, Table, Enum as EnumType
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from raconteur.plugins.character.models import Location, Connection, Character, CharacterTrait, CharacterKey, \
+    CharacterSheetVersion, LocationRelaySettings
+from raconteur.plugins.character.validation import get_location_validation_errors, get_character_validation_errors
+from raconteur.plugins.umbreal.models import UmbrealSheet, UmbrealTrait, UmbrealLawbreak, UmbrealTraitsVersion
+from raconteur.plugins.unknown_armies.models import UnknownArmiesSheet, UnknownArmiesSkill
+
+WORLD_FORMAT_VERSION = 1
+WORLD_EXPORT_BATCH_SIZE = 500
+
+LOCATION_FIELDS = ("name", "category", "description")
+CONNECTION_FIELDS = ("timer", "locked", "hidden")
+CHARACTER_FIELDS = ("member_id", "name", "status", "appearance", "portrait")
+TRAIT_FIELDS = ("type", "name", "value")
+UMBREAL_TRAIT_FIELDS = ("set", "name", "value", "description")
+UMBREAL_LAWBREAK_FIELDS = ("name", "description")
+UNKNOWN_ARMIES_SKILL_FIELDS = ("name", "value", "ability", "is_obsession")
+
+
+@dataclass
+class WorldSheetType:
+    """Describes how a game system's sheet and its child rows are stored, so they can all be handled the same way."""
+
+    name: str
+    sheet_table: Table
+    children: dict[str, tuple[Table, tuple[str, ...]]]
+    # Fields identifying a child row within its sheet, so that edited sheets can be matched row by row
+    child_keys: dict[str, tuple[str, ...]]
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        return tuple(
+            column.key for column in self.sheet_table.columns if column.key not in ("character_id", "game_guild_id")
+        )
+
+
+UMBREAL_SHEET_TYPE = WorldSheetType(
+    name="umbreal_sheet",
+    sheet_table=UmbrealSheet.__table__,
+    children={
+        "traits": (UmbrealTrait.__table__, UMBREAL_TRAIT_FIELDS),
+        "lawbreaks": (UmbrealLawbreak.__table__, UMBREAL_LAWBREAK_FIELDS),
+    },
+    child_keys={"traits": ("set", "name"), "lawbreaks": ("name",)},
+)
+UNKNOWN_ARMIES_SHEET_TYPE = WorldSheetType(
+    name="unknown_armies_sheet",
+    sheet_table=UnknownArmiesSheet.__table__,
+    children={"skills": (UnknownArmiesSkill.__table__, UNKNOWN_ARMIES_SKILL_FIELDS)},
+    child_keys={"skills": ("name",)},
+)
+SHEET_TYPES = [UMBREAL_SHEET_TYPE, UNKNOWN_ARMIES_SHEET_TYPE]
+
+# Checks a sheet about to be written, given its fields and its child rows, and returns what is wrong with it
+SheetValidator = Callable[[dict[str, Any], dict[str, list[dict[str, Any]]]], Iterable[str]]
+
+
+@dataclass
+class EntityDiff:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+
+
+@dataclass
+class WorldImportReport:
+    diffs: dict[str, EntityDiff] = field(default_factory=lambda: defaultdict(EntityDiff))
+    errors: list[str] = field(default_factory=list)
+
+
+class SheetChange(BaseModel):
+    character_id: int
+    # Version of the sheet this change was made from, which must still be the current one; left out for new sheets
+    version: Optional[int] = None
+    # Partial changes only touch the fields and child rows they list, while full ones replace the whole sheet
+    partial: bool = False
+    fields: dict[str, Any] = {}
+    children: dict[str, list[dict[str, Any]]] = {}
+    removed_children: dict[str, list[dict[str, Any]]] = {}
+
+
+class SheetChanges(BaseModel):
+    sheets: list[SheetChange]
+
+
+class SheetChangesResponse(BaseModel):
+    success: bool = False
+    errors: list[str] = []
+    versions: dict[int, int] = {}
+
+
+@dataclass
+class SheetUpsertReport:
+    versions: dict[int, int] = field(default_factory=dict)
+    diffs: dict[str, EntityDiff] = field(default_factory=lambda: defaultdict(EntityDiff))
+    errors: list[str] = field(default_factory=list)
+
+
+def export_world(session: Session, guild_id: int) -> Iterator[str]:
+    """Exports a game's world as JSON lines, one entity per line.
+
+    Rows are read straight from the tables in batches, so that exporting a large world never loads it all in memory.
+    Entities refer to each other by name, as IDs aren't meaningful outside of the database they come from.
+    """
+    yield _dump({"type": "world", "version": WORLD_FORMAT_VERSION})
+
+    coalesce_windows = {
+        row["location_id"]: row["coalesce_window"]
+        for row in _iter_rows(session, LocationRelaySettings.__table__, guild_id)
+    }
+    location_names = {}
+    for row in _iter_rows(session, Location.__table__, guild_id):
+        location_names[row["id"]] = row["name"]
+        yield _dump({
+            "type": "location",
+            **_pick(row, LOCATION_FIELDS),
+            "coalesce_window": coalesce_windows.get(row["id"], 0),
+        })
+
+    connection_names = {}
+    for row in _iter_rows(session, Connection.__table__, guild_id):
+        connection_names[row["id"]] = (location_names[row["location_1_id"]], location_names[row["location_2_id"]])
+        yield _dump({
+            "type": "connection",
+            "location_1": location_names[row["location_1_id"]],
+            "location_2": location_names[row["location_2_id"]],
+            **_pick(row, CONNECTION_FIELDS),
+        })
+
+    traits = _group_rows(session, CharacterTrait.__table__, guild_id, "character_id", TRAIT_FIELDS)
+    keys: dict[int, list[dict[str, Any]]] = defaultdict(list)
+    for row in _iter_rows(session, CharacterKey.__table__, guild_id):
+        location_1, location_2 = connection_names[row["connection_id"]]
+        keys[row["character_id"]].append({"name": row["name"], "location_1": location_1, "location_2": location_2})
+    character_names = {}
+    for row in _iter_rows(session, Character.__table__, guild_id):
+        character_names[row["id"]] = row["name"]
+        yield _dump({
+            "type": "character",
+            **_pick(row, CHARACTER_FIELDS),
+            "location": location_names.get(row["location_id"]),
+            "traits": traits.get(row["id"], []),
+            "keys": keys.get(row["id"], []),
+        })
+
+    for sheet_type in SHEET_TYPES:
+        children = {
+            key: _group_rows(session, table, guild_id, "sheet_id", child_fields)
+            for key, (table, child_fields) in sheet_type.children.items()
+        }
+        for row in _iter_rows(session, sheet_type.sheet_table, guild_id):
+            yield _dump({
+                "type": sheet_type.name,
+                "character": character_names[row["character_id"]],
+                **_pick(row, sheet_type.fields),
+                **{key: child_rows.get(row["character_id"], []) for key, child_rows in children.items()},
+            })
+
+
+def import_world(
+        session: Session,
+        guild_id: int,
+        lines: Iterable[str],
+        validators: Optional[dict[str, SheetValidator]] = None,
+) -> WorldImportReport:
+    """Imports a world exported by export_world, merging it into the game's existing world.
+
+    Entities are matched by name: missing ones are created and existing ones are updated, while anything that isn't
+    part of the import is left alone. Everything is validated before a single row is written, and all the changes are
+    then applied in one transaction with batched statements, so a failed import never leaves a half-imported world.
+    Sheets are also checked by the validator of their game system, if one is given for their type name.
+    """
+    report = WorldImportReport()
+    entities: dict[str, list[tuple[int, dict[str, Any]]]] = defaultdict(list)
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            report.errors.append(f"Line {line_number}: invalid JSON ({e.msg})")
+            continue
+        if not isinstance(data, dict) or not isinstance(data.get("type"), str):
+            report.errors.append(f"Line {line_number}: missing entity type")
+            continue
+        entities[data["type"]].append((line_number, data))
+
+    headers = entities.pop("world", [])
+    if not headers or headers[0][1].get("version") != WORLD_FORMAT_VERSION:
+        report.errors.append(f"Missing or unsupported world header, expected version {WORLD_FORMAT_VERSION}")
+    known_types = {"location", "connection", "character"} | {sheet_type.name for sheet_type in SHEET_TYPES}
+    for entity_type in entities.keys() - known_types:
+        report.errors.append(f"Line {entities[entity_type][0][0]}: unknown entity type `{entity_type}`")
+    if report.errors:
+        return report
+
+    try:
+        _import_entities(session, guild_id, entities, report, validators or {})
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        # Malformed entities are reported rather than crashing the whole import
+        report.errors.append(f"Malformed entity: {e!r}")
+    if report.errors:
+        session.rollback()
+    else:
+        UmbrealTraitsVersion.bump(session, guild_id)
+        session.commit()
+    return report
+
+
+def _import_entities(
+        session: Session,
+        guild_id: int,
+        entities: dict[str, list[tuple[int, dict[str, Any]]]],
+        report: WorldImportReport,
+        validators: dict[str, SheetValidator],
+) -> None:
+    errors = report.errors
+
+    # Locations
+    existing_locations = {row["name"]: row for row in _iter_rows(session, Location.__table__, guild_id)}
+    existing_location_names = {row["id"]: name for name, row in existing_locations.items()}
+    locations: dict[Hashable, dict[str, Any]] = {}
+    for line_number, data in entities["location"]:
+        row: dict[str, Any] = {
+            "name": str(data["name"]).strip(),
+            "category": str(data["category"]).strip(),
+            "description": str(data["description"]).strip(),
+            "coalesce_window": int(data.get("coalesce_window") or 0),
+        }
+        errors.extend(f"Line {line_number}: {error}" for error in get_location_validation_errors(
+            row["name"], row["category"], row["description"]
+        ))
+        if row["name"] in locations:
+            errors.append(f"Line {line_number}: location `{row['name']}` is defined more than once")
+        locations[row["name"]] = row
+    known_locations = existing_locations.keys() | locations.keys()
+
+    # Connections, matched by the pair of locations they link
+    existing_connections: dict[Hashable, dict[str, Any]] = {
+        frozenset((existing_location_names[row["location_1_id"]], existing_location_names[row["location_2_id"]])): row
+        for row in _iter_rows(session, Connection.__table__, guild_id)
+    }
+    connections: dict[Hashable, dict[str, Any]] = {}
+    for line_number, data in entities["connection"]:
+        location_1, location_2 = str(data["location_1"]), str(data["location_2"])
+        row = {
+            "location_1": location_1,
+            "location_2": location_2,
+            "timer": int(data.get("timer") or 0),
+            "locked": bool(data.get("locked")),
+            "hidden": bool(data.get("hidden")),
+        }
+        for location_name in (location_1, location_2):
+            if location_name not in known_locations:
+                errors.append(f"Line {line_number}: unknown location `{location_name}`")
+        if location_1 == location_2:
+            errors.append(f"Line {line_number}: a location cannot be connected to itself")
+        if row["timer"] < 0:
+            errors.append(f"Line {line_number}: timer time cannot be negative")
+        connection_key: Hashable = frozenset((location_1, location_2))
+        if connection_key in connections:
+            errors.append(f"Line {line_number}: connection from `{location_1}` to `{location_2}` is defined twice")
+        connections[connection_key] = row
+    known_connections = existing_connections.keys() | connections.keys()
+
+    # Characters, along with their traits and keys
+    existing_characters = {row["name"]: row for row in _iter_rows(session, Character.__table__, guild_id)}
+    characters: dict[Hashable, dict[str, Any]] = {}
+    for line_number, data in entities["character"]:
+        row = {
+            "member_id": int(data["member_id"]),
+            "name": str(data["name"]).strip(),
+            "status": str(data.get("status") or "").strip(),
+            "appearance": str(data.get("appearance") or "").strip(),
+            "portrait": str(data.get("portrait") or "").strip(),
+            "location": data.get("location"),
+            "traits": [
+                _parse_columns(CharacterTrait.__table__, trait, TRAIT_FIELDS) for trait in data.get("traits", [])
+            ],
+            "keys": [
+                {"name": str(key["name"]), "connection": frozenset((str(key["location_1"]), str(key["location_2"])))}
+                for key in data.get("keys", [])
+            ],
+        }
+        errors.extend(f"Line {line_number}: {error}" for error in get_character_validation_errors(
+            row["name"], row["portrait"], row["status"], row["appearance"]
+        ))
+        if row["name"] in characters:
+            errors.append(f"Line {line_number}: character **{row['name']}** is defined more than once")
+        if row["location"] is not None and row["location"] not in known_locations:
+            errors.append(f"Line {line_number}: unknown location `{row['location']}`")
+        for key in row["keys"]:
+            if key["connection"] not in known_connections:
+                errors.append(f"Line {line_number}: key **{key['name']}** is for an unknown connection")
+        characters[row["name"]] = row
+    known_characters = existing_characters.keys() | characters.keys()
+
+    # Sheets of every game system
+    sheets: dict[str, dict[str, dict[str, Any]]] = {}
+    for sheet_type in SHEET_TYPES:
+        sheets[sheet_type.name] = {}
+        for line_number, data in entities[sheet_type.name]:
+            character_name = str(data["character"])
+            if character_name not in known_characters:
+                errors.append(f"Line {line_number}: unknown character **{character_name}**")
+            if character_name in sheets[sheet_type.name]:
+                errors.append(f"Line {line_number}: sheet for **{character_name}** is defined more than once")
+            row = _parse_columns(sheet_type.sheet_table, data, sheet_type.fields)
+            sheet_errors = list(_get_missing_fields(sheet_type.sheet_table, row))
+            children = {}
+            for child_key, (table, child_fields) in sheet_type.children.items():
+                children[child_key] = [_parse_columns(table, child, child_fields) for child in data.get(child_key, [])]
+                for child in children[child_key]:
+                    sheet_errors.extend(_get_missing_fields(table, child))
+                sheet_errors.extend(_get_duplicate_children(sheet_type, child_key, children[child_key]))
+            validate = validators.get(sheet_type.name)
+            if validate and not sheet_errors:
+                sheet_errors.extend(validate(row, children))
+            errors.extend(f"Line {line_number}: {error}" for error in sheet_errors)
+            sheets[sheet_type.name][character_name] = {**row, **children}
+
+    if errors:
+        return
+
+    # Everything is valid, write it all
+    created, updated = _upsert(session, Location.__table__, guild_id, existing_locations, locations, LOCATION_FIELDS)
+    location_ids = {
+        name: location_id for location_id, name in session.execute(
+            select(Location.id, Location.name).where(Location.game_guild_id == guild_id)
+        )
+    }
+    existing_relay_settings = {
+        row["location_id"]: row for row in _iter_rows(session, LocationRelaySettings.__table__, guild_id)
+    }
+    relay_settings = {
+        location_ids[name]: {"location_id": location_ids[name], "coalesce_window": row["coalesce_window"]}
+        for name, row in locations.items()
+        if row["coalesce_window"] or location_ids[name] in existing_relay_settings
+    }
+    created_relay_settings, updated_relay_settings = _upsert(
+        session,
+        LocationRelaySettings.__table__,
+        guild_id,
+        existing_relay_settings,
+        relay_settings,
+        ("location_id", "coalesce_window"),
+        primary_key="location_id",
+    )
+    changed_relay_settings = created_relay_settings | updated_relay_settings
+    updated |= {name for name in locations if location_ids[name] in changed_relay_settings}
+    report.diffs["locations"] = _get_diff(locations.keys(), created, updated)
+
+    for connection_key, row in connections.items():
+        if existing := existing_connections.get(connection_key):
+            # Keep the existing orientation of the connection
+            row["location_1_id"], row["location_2_id"] = existing["location_1_id"], existing["location_2_id"]
+        else:
+            row["location_1_id"] = location_ids[row["location_1"]]
+            row["location_2_id"] = location_ids[row["location_2"]]
+    created, updated = _upsert(
+        session,
+        Connection.__table__,
+        guild_id,
+        existing_connections,
+        connections,
+        CONNECTION_FIELDS + ("location_1_id", "location_2_id"),
+    )
+    report.diffs["connections"] = _get_diff(connections.keys(), created, updated)
+    location_names = {location_id: name for name, location_id in location_ids.items()}
+    connection_ids = {
+        frozenset((location_names[location_1_id], location_names[location_2_id])): connection_id
+        for connection_id, location_1_id, location_2_id in session.execute(
+            select(Connection.id, Connection.location_1_id, Connection.location_2_id)
+            .where(Connection.game_guild_id == guild_id)
+        )
+    }
+
+    for row in characters.values():
+        row["location_id"] = location_ids[row["location"]] if row["location"] is not None else None
+    created, updated = _upsert(
+        session, Character.__table__, guild_id, existing_characters, characters, CHARACTER_FIELDS + ("location_id",)
+    )
+    character_ids = {
+        name: character_id for character_id, name in session.execute(
+            select(Character.id, Character.name).where(Character.game_guild_id == guild_id)
+        )
+    }
+    changed_ids = _replace_children(
+        session,
+        CharacterTrait.__table__,
+        guild_id,
+        "character_id",
+        {character_ids[name]: row["traits"] for name, row in characters.items()},
+        TRAIT_FIELDS,
+    )
+    changed_ids |= _replace_children(
+        session,
+        CharacterKey.__table__,
+        guild_id,
+        "character_id",
+        {
+            character_ids[name]: [
+                {"name": key["name"], "connection_id": connection_ids[key["connection"]]} for key in row["keys"]
+            ]
+            for name, row in characters.items()
+        },
+        ("name", "connection_id"),
+    )
+    updated |= {name for name in characters if character_ids[name] in changed_ids}
+    report.diffs["characters"] = _get_diff(characters.keys(), created, updated)
+
+    for sheet_type in SHEET_TYPES:
+        existing_sheets = {row["character_id"]: row for row in _iter_rows(session, sheet_type.sheet_table, guild_id)}
+        sheet_rows = {}
+        for character_name, row in sheets[sheet_type.name].items():
+            row["character_id"] = character_ids[character_name]
+            sheet_rows[row["character_id"]] = row
+        created, updated = _upsert(
+            session,
+            sheet_type.sheet_table,
+            guild_id,
+            existing_sheets,
+            sheet_rows,
+            sheet_type.fields + ("character_id",),
+            primary_key="character_id",
+        )
+        for child_key, (table, child_fields) in sheet_type.children.items():
+            updated |= _replace_children(
+                session,
+                table,
+                guild_id,
+                "sheet_id",
+                {character_id: row[child_key] for character_id, row in sheet_rows.items()},
+                child_fields,
+            )
+        report.diffs[sheet_type.name.replace("_", " ") + "s"] = _get_diff(sheet_rows.keys(), created, updated)
+        # Sheets open in an editor must be reloaded before their next save, like after any other change
+        changed_sheet_ids = [cast(int, character_id) for character_id in created | updated]
+        versions = CharacterSheetVersion.get_all(session, sheet_type.name, changed_sheet_ids)
+        if not CharacterSheetVersion.bump_expected(session, guild_id, sheet_type.name, versions):
+            errors.append(f"Some of the {sheet_type.name.replace('_', ' ')}s were changed during the import, try again")
+
+
+def get_sheets(
+        session: Session, guild_id: int, sheet_type: WorldSheetType, member_id: Optional[int] = None
+) -> list[dict[str, Any]]:
+    """Returns the sheets of a game system along with their versions, in the same shape as the changes they accept."""
+    query = select(Character.id).where(Character.game_guild_id == guild_id)
+    if member_id is not None:
+        query = query.where(Character.member_id == member_id)
+    character_ids = list(session.execute(query).scalars())
+    rows = list(_iter_rows_of(session, sheet_type.sheet_table, "character_id", character_ids))
+    sheet_ids = [row["character_id"] for row in rows]
+    versions = CharacterSheetVersion.get_all(session, sheet_type.name, sheet_ids)
+    children: dict[str, dict[int, list[dict[str, Any]]]] = {}
+    for child_key, (table, child_fields) in sheet_type.children.items():
+        children[child_key] = defaultdict(list)
+        for child in _iter_rows_of(session, table, "sheet_id", sheet_ids):
+            children[child_key][child["sheet_id"]].append(_pick(child, child_fields))
+    return [
+        {
+            "character_id": row["character_id"],
+            "version": versions[row["character_id"]],
+            "fields": _pick(row, sheet_type.fields),
+            "children": {child_key: child_rows[row["character_id"]] for child_key, child_rows in children.items()},
+        }
+        for row in rows
+    ]
+
+
+def upsert_sheets(
+        session: Session,
+        guild_id: int,
+        sheet_type: WorldSheetType,
+        changes: list[SheetChange],
+        member_id: Optional[int] = None,
+        validate: Optional[SheetValidator] = None,
+) -> SheetUpsertReport:
+    """Creates or edits many sheets of a game system at once, from whole or partial changes.
+
+    Each change is diffed against the stored sheet, and only the rows which actually changed are written, with a
+    single statement per table and kind of write. Changes must be made from the current version of their sheet, which
+    then gets bumped. If any sheet is invalid or was changed in the meantime, nothing is written at all. Committing is
+    left to the caller.
+    """
+    report = SheetUpsertReport()
+    errors = report.errors
+    character_ids = [change.character_id for change in changes]
+    if len(set(character_ids)) != len(character_ids):
+        errors.append("Each sheet can only be changed once at a time")
+    query = select(Character.id).where(Character.game_guild_id == guild_id, Character.id.in_(character_ids))
+    if member_id is not None:
+        query = query.where(Character.member_id == member_id)
+    known_ids = set(session.execute(query).scalars())
+    errors.extend(f"Failed to locate character {character_id}" for character_id in character_ids
+                  if character_id not in known_ids)
+    if errors:
+        return report
+
+    existing_sheets: dict[Hashable, dict[str, Any]] = {
+        row["character_id"]: row
+        for row in _iter_rows_of(session, sheet_type.sheet_table, "character_id", character_ids)
+    }
+    # Child rows are keyed by their sheet and their key fields, and also grouped by sheet to apply the changes
+    existing_children: dict[str, dict[Hashable, dict[str, Any]]] = {}
+    existing_children_by_sheet: dict[int, dict[str, dict[tuple, dict[str, Any]]]] = defaultdict(
+        lambda: {child_key: {} for child_key in sheet_type.children}
+    )
+    for child_key, (table, child_fields) in sheet_type.children.items():
+        existing_children[child_key] = {}
+        for row in _iter_rows_of(session, table, "sheet_id", character_ids):
+            key = tuple(row[field_name] for field_name in sheet_type.child_keys[child_key])
+            existing_children[child_key][(row["sheet_id"], *key)] = row
+            existing_children_by_sheet[row["sheet_id"]][child_key][key] = _pick(row, child_fields)
+    versions = CharacterSheetVersion.get_all(session, sheet_type.name, character_ids)
+
+    sheet_rows: dict[Hashable, dict[str, Any]] = {}
+    child_rows: dict[str, dict[Hashable, dict[str, Any]]] = {child_key: {} for child_key in sheet_type.children}
+    for change in changes:
+        change_errors = _get_sheet_change_errors(sheet_type, change, existing_sheets, versions)
+        if not change_errors:
+            try:
+                row, children = _apply_sheet_change(
+                    sheet_type, change, existing_sheets, existing_children_by_sheet[change.character_id]
+                )
+                change_errors.extend(_get_missing_fields(sheet_type.sheet_table, row))
+                for child_key, (table, child_fields) in sheet_type.children.items():
+                    for child in children[child_key].values():
+                        change_errors.extend(_get_missing_fields(table, child))
+                if validate and not change_errors:
+                    change_errors.extend(validate(row, {
+                        child_key: list(rows.values()) for child_key, rows in children.items()
+                    }))
+            except (KeyError, TypeError, ValueError) as e:
+                # Including values of the wrong type, which the validation trips on
+                change_errors.append(f"malformed sheet ({e!r})")
+            else:
+                sheet_rows[change.character_id] = {**row, "character_id": change.character_id}
+                for child_key, rows in children.items():
+                    for key, child in rows.items():
+                        child_rows[child_key][(change.character_id, *key)] = {**child, "sheet_id": change.character_id}
+        errors.extend(f"Sheet of character {change.character_id}: {error}" for error in change_errors)
+    if errors:
+        return report
+
+    try:
+        created, updated = _upsert(
+            session,
+            sheet_type.sheet_table,
+            guild_id,
+            existing_sheets,
+            sheet_rows,
+            sheet_type.fields + ("character_id",),
+            primary_key="character_id",
+        )
+        report.diffs["sheets"] = _get_diff(sheet_rows.keys(), created, updated)
+        changed_ids = {cast(int, character_id) for character_id in created | updated}
+        for child_key, (table, child_fields) in sheet_type.children.items():
+            created, updated = _upsert(
+                session,
+                table,
+                guild_id,
+                existing_children[child_key],
+                child_rows[child_key],
+                child_fields + ("sheet_id",),
+            )
+            deleted = [key for key in existing_children[child_key] if key not in child_rows[child_key]]
+            if deleted:
+                session.execute(delete(table).where(
+                    table.c.id.in_([existing_children[child_key][key]["id"] for key in deleted])
+                ))
+            report.diffs[child_key] = _get_diff(child_rows[child_key].keys(), created, updated)
+            report.diffs[child_key].deleted = len(deleted)
+            changed_ids |= {cast(tuple, key)[0] for key in (*created, *updated, *deleted)}
+
+        bumped = CharacterSheetVersion.bump_expected(
+            session, guild_id, sheet_type.name, {character_id: versions[character_id] for character_id in changed_ids}
+        )
+    except IntegrityError:
+        # Another sheet, or another version of a sheet, was created concurrently
+        bumped = False
+    if not bumped:
+        session.rollback()
+        errors.append("Some of the sheets were changed in the meantime, reload them and try again")
+        return report
+
+    report.versions = {
+        character_id: versions[character_id] + (character_id in changed_ids) for character_id in character_ids
+    }
+    return report
+
+
+def _get_sheet_change_errors(
+        sheet_type: WorldSheetType,
+        change: SheetChange,
+        existing_sheets: dict[Hashable, dict[str, Any]],
+        versions: dict[int, int],
+) -> list[str]:
+    errors = []
+    current_version = versions[change.character_id]
+    if change.character_id not in existing_sheets:
+        if change.partial:
+            errors.append("there is no sheet to edit yet, it needs to be created whole")
+        if change.version not in (None, current_version):
+            errors.append(f"the sheet was deleted since version {change.version}")
+    elif change.version is None:
+        errors.append("a sheet already exists, its version is needed to edit it")
+    elif change.version != current_version:
+        errors.append(f"the sheet was changed since version {change.version}, it is now at version {current_version}")
+
+    errors.extend(f"unknown field `{name}`" for name in change.fields if name not in sheet_type.fields)
+    for child_key in {*change.children, *change.removed_children}:
+        if child_key not in sheet_type.children:
+            errors.append(f"unknown rows `{child_key}`")
+            continue
+        child_fields = sheet_type.children[child_key][1]
+        for child in change.children.get(child_key, []):
+            errors.extend(f"unknown field `{name}` in `{child_key}`" for name in child if name not in child_fields)
+        for child in (*change.children.get(child_key, []), *change.removed_children.get(child_key, [])):
+            if any(name not in child for name in sheet_type.child_keys[child_key]):
+                errors.append(f"rows of `{child_key}` need their {', '.join(sheet_type.child_keys[child_key])}")
+        errors.extend(_get_duplicate_children(sheet_type, child_key, change.children.get(child_key, [])))
+    return errors
+
+
+def _get_duplicate_children(
+        sheet_type: WorldSheetType, child_key: str, children: list[dict[str, Any]]
+) -> Iterator[str]:
+    # Only the last of the rows sharing a key would be kept, silently dropping the others
+    key_fields = sheet_type.child_keys[child_key]
+    seen = set()
+    for child in children:
+        values = [child.get(name) for name in key_fields]
+        key = tuple(repr(value) for value in values)
+        if key in seen:
+            names = ", ".join(str(value.value if isinstance(value, Enum) else value) for value in values)
+            yield f"duplicate row in `{child_key}`: {names}"
+        seen.add(key)
+
+
+def _apply_sheet_change(
+        sheet_type: WorldSheetType,
+        change: SheetChange,
+        existing_sheets: dict[Hashable, dict[str, Any]],
+        existing_children: dict[str, dict[tuple, dict[str, Any]]],
+) -> tuple[dict[str, Any], dict[str, dict[tuple, dict[str, Any]]]]:
+    """Returns the fields and the child rows of a sheet once a change is applied to it."""
+    table = sheet_type.sheet_table
+    if change.partial:
+        row = {
+            **_pick(existing_sheets[change.character_id], sheet_type.fields),
+            **_parse_columns(table, change.fields, tuple(change.fields), use_defaults=False),
+        }
+    else:
+        row = _parse_columns(table, change.fields, sheet_type.fields)
+
+    children = {}
+    for child_key, (child_table, child_fields) in sheet_type.children.items():
+        key_fields = sheet_type.child_keys[child_key]
+        current = existing_children[child_key]
+        rows = dict(current) if change.partial else {}
+        for child in change.children.get(child_key, []):
+            key = tuple(_parse_columns(child_table, child, key_fields).values())
+            if change.partial and key in current:
+                rows[key] = {**current[key], **_parse_columns(child_table, child, tuple(child), use_defaults=False)}
+            else:
+                rows[key] = _parse_columns(child_table, child, child_fields)
+        for child in change.removed_children.get(child_key, []):
+            rows.pop(tuple(_parse_columns(child_table, child, key_fields).values()), None)
+        children[child_key] = rows
+    return row, children
+
+
+def _get_missing_fields(table: Table, row: dict[str, Any]) -> Iterator[str]:
+    for field_name, value in row.items():
+        if value is None and not table.c[field_name].nullable:
+            yield f"missing field `{field_name}`"
+
+
+def _iter_rows_of(
+        session: Session, table: Table, parent_column: str, parent_ids: list[int]
+) -> Iterator[dict[str, Any]]:
+    result = session.execute(select(table).where(table.c[parent_column].in_(parent_ids)))
+    for row in result.yield_per(WORLD_EXPORT_BATCH_SIZE).mappings():
+        yield dict(row)
+
+
+def _upsert(
+        session: Session,
+        table: Table,
+        guild_id: int,
+        existing: dict[Hashable, dict[str, Any]],
+        incoming: dict[Hashable, dict[str, Any]],
+        fields: tuple[str, ...],
+        primary_key: str = "id",
+) -> tuple[set[Hashable], set[Hashable]]:
+    """Inserts the new rows and updates the changed ones, each with a single executemany statement.
+
+    Returns the keys of the rows which were created and of those which were updated.
+    """
+    created: dict[Hashable, dict[str, Any]] = {}
+    updated: dict[Hashable, dict[str, Any]] = {}
+    for key, row in incoming.items():
+        values = _pick(row, fields)
+        if key not in existing:
+            created[key] = {"game_guild_id": guild_id, **values}
+        elif any(existing[key][field_name] != value for field_name, value in values.items()):
+            updated[key] = {"_primary_key": existing[key][primary_key], **values}
+    if created:
+        session.execute(insert(table), list(created.values()))
+    if updated:
+        session.execute(
+            table.update()
+            .where(table.c[primary_key] == bindparam("_primary_key"))
+            .values({field_name: bindparam(field_name) for field_name in fields}),
+            list(updated.values()),
+        )
+    return set(created), set(updated)
+
+
+def _replace_children(
+        session: Session,
+        table: Table,
+        guild_id: int,
+        parent_column: str,
+        incoming: dict[int, list[dict[str, Any]]],
+        fields: tuple[str, ...],
+) -> set[int]:
+    """Replaces the child rows of every parent whose children differ from the imported ones.
+
+    Returns the IDs of the parents whose children were replaced.
+    """
+    existing: dict[int, list[str]] = defaultdict(list)
+    for row in _iter_rows(session, table, guild_id):
+        existing[row[parent_column]].append(repr(tuple(row[field_name] for field_name in fields)))
+    changed = {
+        parent_id for parent_id, children in incoming.items()
+        if sorted(existing.get(parent_id, [])) != sorted(
+            repr(tuple(child[field_name] for field_name in fields)) for child in children
+        )
+    }
+    if changed:
+        session.execute(delete(table).where(table.c[parent_column].in_(changed)))
+        new_rows = [
+            {"game_guild_id": guild_id, parent_column: parent_id, **_pick(child, fields)}
+            for parent_id in changed for child in incoming[parent_id]
+        ]
+        if new_rows:
+            session.execute(insert(table), new_rows)
+    return changed
+
+
+def _get_diff(keys: Iterable[Hashable], created: set[Hashable], updated: set[Hashable]) -> EntityDiff:
+    keys = set(keys)
+    num_updated = len(updated - created)
+    return EntityDiff(created=len(created), updated=num_updated, unchanged=len(keys) - len(created) - num_updated)
+
+
+def _iter_rows(session: Session, table: Table, guild_id: int) -> Iterator[dict[str, Any]]:
+    result = session.execute(select(table).where(table.c.game_guild_id == guild_id))
+    for row in result.yield_per(WORLD_EXPORT_BATCH_SIZE).mappings():
+        yield dict(row)
+
+
+def _group_rows(
+        session: Session, table: Table, guild_id: int, parent_column: str, fields: tuple[str, ...]
+) -> dict[int, list[dict[str, Any]]]:
+    grouped: dict[int, list[dict[str, Any]]] = defaultdict(list)
+    for row in _iter_rows(session, table, guild_id):
+        grouped[row[parent_column]].append(_pick(row, fields))
+    return grouped
+
+
+def _parse_columns(
+        table: Table, data: dict[str, Any], fields: tuple[str, ...], use_defaults: bool = True
+) -> dict[str, Any]:
+    row = {}
+    for field_name in fields:
+        column = table.c[field_name]
+        value = data.get(field_name)
+        if use_defaults and value is None and column.default is not None and column.default.is_scalar:
+            value = column.default.arg
+        if value is not None and isinstance(column.type, EnumType) and column.type.enum_class:
+            value = column.type.enum_class(value)
+        elif value is not None:
+            _check_type(field_name, column.type.python_type, value)
+        row[field_name] = value
+    return row
+
+
+def _check_type(field_name: str, python_type: type, value: Any) -> None:
+    # Values come straight from JSON, where booleans would otherwise pass for integers
+    if not isinstance(value, python_type) or (isinstance(value, bool) and python_type is not bool):
+        raise ValueError(f"`{field_name}` must be of type {python_type.__name__}, not {type(value).__name__}")
+
+
+def _pick(row: dict[str, Any], fields: tuple[str, ...]) -> dict[str, Any]:
+    return {field_name: row[field_name] for field_name in fields}
+
+
+def _dump(data: dict[str, Any]) -> str:
+    return json.dumps(data, default=lambda value: value.value if isinstance(value, Enum) else str(value)) + "\n"
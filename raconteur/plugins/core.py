@@ -16,7 +16,7 @@ class CorePlugin(Plugin):
         valid_commands = []
         for plugin in self.bot.get_enabled_plugins(ctx.guild):
             for plugin_command in plugin.commands.values():
-                if has_permission_for_command(plugin_command, ctx.message):
+                if has_permission_for_command(plugin_command, ctx.member):
                     valid_commands.append(str(plugin_command))
         return "\n".join(valid_commands)
 
@@ -35,15 +35,15 @@ class CorePlugin(Plugin):
             role_operations = []
             if not game.gm_role_id:
                 role_operations.append(
-                    ("gm_role_id", (ctx.message.guild.create_role(name="Game Master", colour=Colour.dark_blue())))
+                    ("gm_role_id", (ctx.guild.create_role(name="Game Master", colour=Colour.dark_blue())))
                 )
             if not game.player_role_id:
                 role_operations.append(
-                    ("player_role_id", ctx.message.guild.create_role(name="Player", colour=Colour.dark_red()))
+                    ("player_role_id", ctx.guild.create_role(name="Player", colour=Colour.dark_red()))
                 )
             if not game.spectator_role_id:
                 role_operations.append(
-                    ("spectator_role_id", ctx.message.guild.create_role(name="Spectator", colour=Colour.orange()))
+                    ("spectator_role_id", ctx.guild.create_role(name="Spectator", colour=Colour.orange()))
                 )
             if role_operations:
                 yield "Setting up roles for game session"
@@ -69,6 +69,8 @@ class CorePlugin(Plugin):
                     else:
                         game.plugins.append(GamePlugin(name=name))
                         session.commit()
+                        plugin.invalidate_settings(ctx.guild)
+                        await self.bot.sync_application_commands(ctx.guild)
                         return f"Plugin **{name}** has been enabled"
         raise CommandException(f'Unknown plugin "{name}"')
 
@@ -86,15 +88,19 @@ class CorePlugin(Plugin):
                     else:
                         game.plugins.remove(game_plugin)
                         session.commit()
+                        plugin.invalidate_settings(ctx.guild)
+                        await self.bot.sync_application_commands(ctx.guild)
                         return f"Plugin **{name}** has been disabled"
         raise CommandException(f"Unknown plugin **{name}**")
 
     @command(help_msg="Sets a plugin setting.", requires_gm=True)
     async def setting(self, ctx: CommandCallContext, plugin: str, name: str, value: str) -> str:
-        with get_session() as session:
-            parsed_value = convert_setting_value(value)
-            self.set_setting(ctx.guild, session, name, parsed_value, plugin)
-            return f"Successfully set `{plugin}.{name}` to `{parsed_value}`"
+        for bot_plugin in self.bot.plugins:
+            if bot_plugin.__class__.__name__ == plugin:
+                with get_session() as session:
+                    parsed_value = bot_plugin.set_setting(ctx.guild, session, name, convert_setting_value(value))
+                    return f"Successfully set `{plugin}.{name}` to `{parsed_value}`"
+        raise CommandException(f"Unknown plugin **{plugin}**")
 
 
 def convert_setting_value(value: str) -> Union[None, bool, int, float, str]:
@@ -0,0 +1,123 @@
+import heapq
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from itertools import accumulate
+
+MAX_CHOICES = 15
+MAX_PLOT_POINT_CHOICES = 5
+FALLBACK_EFFECT = 4
+
+
+@dataclass
+class DiceResult:
+    name: str
+    rating: int
+    value: int
+
+
+@dataclass(eq=True, frozen=True)
+class RollChoice:
+    total: int
+    effect: int
+    plot_points: int = 0
+
+    def __lt__(self, other: "RollChoice") -> bool:
+        if self.total < other.total:
+            return True
+        if self.total == other.total and self.effect < other.effect:
+            return True
+        return False
+
+    def __str__(self) -> str:
+        text = f"**{self.total}** (:d{self.effect}:)"
+        if self.plot_points:
+            text += f" for {self.plot_points} :PP:"
+        return text
+
+    @property
+    def label(self) -> str:
+        # Plain text version, for places where markdown and emojis aren't rendered
+        text = f"{self.total} (d{self.effect})"
+        if self.plot_points:
+            text += f" for {self.plot_points} PP"
+        return text
+
+
+def get_valid_results(results: list[DiceResult]) -> list[DiceResult]:
+    return [result for result in results if result.value != 1]
+
+
+def determine_best_choices(results: list[DiceResult]) -> list[RollChoice]:
+    """
+    Returns the best free arrangements of a roll, adding up one or two dice and keeping the highest remaining die as
+    the effect, from best to worst.
+    """
+    valid_results = get_valid_results(results)
+    # Dice with the same value and rating are interchangeable, so only pairs of distinct kinds of dice are considered,
+    # of which there are a few dozen at most however large the pool is
+    counts = Counter((result.value, result.rating) for result in valid_results)
+    rating_counts = Counter(result.rating for result in valid_results)
+    ratings = sorted(rating_counts, reverse=True)
+    kinds = list(counts)
+
+    def get_effect(*taken_ratings: int) -> int:
+        for rating in ratings:
+            if rating_counts[rating] > taken_ratings.count(rating):
+                return rating
+        return FALLBACK_EFFECT
+
+    choices = set()
+    for i, (value, rating) in enumerate(kinds):
+        choices.add(RollChoice(total=value, effect=get_effect(rating)))
+        if counts[value, rating] > 1:
+            choices.add(RollChoice(total=value * 2, effect=get_effect(rating, rating)))
+        for other_value, other_rating in kinds[i + 1:]:
+            choices.add(RollChoice(total=value + other_value, effect=get_effect(rating, other_rating)))
+    return heapq.nlargest(MAX_CHOICES, choices)
+
+
+def determine_plot_point_choices(results: list[DiceResult], free_choices: list[RollChoice]) -> list[RollChoice]:
+    """
+    Returns the arrangements adding up three dice or more, spending a plot point per die past the second, which are
+    better than any free or cheaper arrangement in either total or effect.
+    """
+    valid_results = sorted(get_valid_results(results), key=lambda result: result.value, reverse=True)
+    num_dice = len(valid_results)
+    prefix_totals = [0, *accumulate(result.value for result in valid_results)]
+    # Highest rating among the dice from each position onwards, which are the ones left over after taking the top ones
+    suffix_effects = [FALLBACK_EFFECT] * (num_dice + 1)
+    for idx in range(num_dice - 1, -1, -1):
+        suffix_effects[idx] = max(valid_results[idx].rating, suffix_effects[idx + 1])
+    positions_by_rating: dict[int, list[int]] = {}
+    for idx, result in enumerate(valid_results):
+        positions_by_rating.setdefault(result.rating, []).append(idx)
+
+    # Best total reached so far for each effect die, at the lowest cost
+    best_totals: dict[int, int] = {}
+    for choice in free_choices:
+        best_totals[choice.effect] = max(best_totals.get(choice.effect, 0), choice.total)
+
+    choices = []
+    for num_taken in range(3, num_dice + 1):
+        # Either take the highest dice, or keep back the lowest die of a rating to use as the effect
+        candidates = {(prefix_totals[num_taken], suffix_effects[num_taken])}
+        if num_taken < num_dice:
+            for rating, positions in positions_by_rating.items():
+                kept_back_idx = bisect_left(positions, num_taken)
+                if kept_back_idx:
+                    position = positions[kept_back_idx - 1]
+                    candidates.add((
+                        prefix_totals[num_taken + 1] - valid_results[position].value,
+                        max(rating, suffix_effects[num_taken + 1]),
+                    ))
+
+        # Going from the best effect down, an arrangement is only worth it if it beats every total seen with an effect
+        # at least as good, whether from a cheaper arrangement or from this one
+        for total, effect in sorted(candidates, key=lambda candidate: (candidate[1], candidate[0]), reverse=True):
+            if total > max((best for best_effect, best in best_totals.items() if best_effect >= effect), default=0):
+                choices.append(RollChoice(total=total, effect=effect, plot_points=num_taken - 2))
+                best_totals[effect] = total
+        if len(choices) >= MAX_PLOT_POINT_CHOICES:
+            break
+    return choices[:MAX_PLOT_POINT_CHOICES]
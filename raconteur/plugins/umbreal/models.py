@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+from datetime import datetime
 from enum import Enum
 from typing import Optional, Iterable
 
-from sqlalchemy import Column, Enum as EnumType, Integer, ForeignKey, String, select
+from sqlalchemy import Column, Enum as EnumType, Integer, ForeignKey, String, select, DateTime, UniqueConstraint, \
+    delete, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship, backref, Session
 
 from raconteur.models.base import Base
@@ -21,6 +24,11 @@ class UmbrealTraitSet(Enum):
     COMPLICATIONS = "Complications"
 
 
+class UmbrealRollKind(Enum):
+    TEST = "test"
+    ACTION = "action"
+
+
 class UmbrealSheet(PluginModelMixin, Base):
     __plugin__ = "umbreal"
     __plugin_table_name__ = "sheets"
@@ -139,5 +147,65 @@ class UmbrealLawbreak(PluginModelMixin, Base):
     sheet = relationship(UmbrealSheet, back_populates="lawbreaks")
 
 
+class UmbrealRoll(PluginModelMixin, Base):
+    __plugin__ = "umbreal"
+    __plugin_table_name__ = "rolls"
+    __table_args__ = (
+        UniqueConstraint("game_guild_id", "kind", "name"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(EnumType(UmbrealRollKind, create_constraint=False, native_enum=False), nullable=False)
+    name = Column(String, nullable=False)
+    # Compact JSON of both sides of the roll
+    state = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    @classmethod
+    def get_all_active(cls, session: Session, now: datetime) -> list[UmbrealRoll]:
+        return [roll for roll, in session.execute(select(UmbrealRoll).where(UmbrealRoll.expires_at >= now))]
+
+    @classmethod
+    def delete_expired(cls, session: Session, now: datetime) -> int:
+        return session.execute(delete(UmbrealRoll).where(UmbrealRoll.expires_at < now)).rowcount
+
+
+class UmbrealTraitsVersion(PluginModelMixin, Base):
+    """Counter bumped whenever the sheets of a guild change, so that the bot can tell when its trait index is stale."""
+
+    __plugin__ = "umbreal"
+    __plugin_table_name__ = "traits_versions"
+    __table_args__ = (
+        UniqueConstraint("game_guild_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    @classmethod
+    def bump(cls, session: Session, guild_id: int) -> None:
+        if cls._increment(session, guild_id):
+            return
+        try:
+            # The first change of a guild can race with another one, in which case the row it created is bumped
+            with session.begin_nested():
+                session.add(UmbrealTraitsVersion(game_guild_id=guild_id, version=1))
+        except IntegrityError:
+            cls._increment(session, guild_id)
+
+    @classmethod
+    def _increment(cls, session: Session, guild_id: int) -> bool:
+        result = session.execute(
+            update(UmbrealTraitsVersion)
+            .where(UmbrealTraitsVersion.game_guild_id == guild_id)
+            .values(version=UmbrealTraitsVersion.version + 1)
+        )
+        return bool(result.rowcount)
+
+    @classmethod
+    def get_all(cls, session: Session) -> dict[int, int]:
+        return dict(session.execute(select(UmbrealTraitsVersion.game_guild_id, UmbrealTraitsVersion.version)).all())
+
+
 def _sorted_assets(traits: Iterable[UmbrealTrait], trait_set: UmbrealTraitSet) -> list[UmbrealTrait]:
     return sorted((trait for trait in traits if trait.set == trait_set), key=lambda t: t.name)
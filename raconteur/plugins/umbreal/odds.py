@@ -0,0 +1,117 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from math import prod
+from typing import Optional
+
+from raconteur.exceptions import CommandException
+from raconteur.plugins.umbreal.choices import FALLBACK_EFFECT
+
+MAX_ODDS_DICE = 20
+HEROIC_SUCCESS_MARGIN = 5
+
+# State of a partially rolled pool: the two dice making up the best total as (value, rating) pairs, from best to worst,
+# and the highest rating among the other dice that didn't hitch
+_PoolState = tuple[Optional[tuple[int, int]], Optional[tuple[int, int]], int]
+
+
+@dataclass(frozen=True)
+class CortexOdds:
+    """Exact outcomes of a Cortex Prime roll arranged for the best total, counted over every possible roll."""
+
+    num_outcomes: int
+    totals: dict[int, int]
+    effects: dict[int, int]
+    hitches: dict[int, int]
+    botches: int
+
+    def get_probability_to_beat(self, difficulty: int, margin: int = 0) -> float:
+        return sum(count for total, count in self.totals.items() if total > difficulty + margin) / self.num_outcomes
+
+
+def get_cortex_odds(ratings: list[int]) -> CortexOdds:
+    if not ratings:
+        raise CommandException("Cannot compute odds: you need to roll at least one die.")
+    if len(ratings) > MAX_ODDS_DICE:
+        raise CommandException(f"Cannot compute odds: at most {MAX_ODDS_DICE} dice can be rolled at once.")
+    # Outcomes don't depend on the order of the dice, so every pool with the same ratings shares a cache entry
+    return _get_cortex_odds(tuple(sorted(ratings)))
+
+
+def clear_cortex_odds_cache() -> None:
+    _get_cortex_odds.cache_clear()
+    _get_pool_states.cache_clear()
+
+
+@lru_cache(maxsize=256)
+def _get_cortex_odds(ratings: tuple[int, ...]) -> CortexOdds:
+    totals: dict[int, int] = defaultdict(int)
+    effects: dict[int, int] = defaultdict(int)
+    for (first, second, rest_rating), count in _get_pool_states(ratings).items():
+        # Without any die in the total, every die hitched and the roll is a botch
+        totals[first[0] + (second[0] if second else 0) if first else 0] += count
+        effects[rest_rating] += count
+
+    # Each die hitches on one face out of its rating, independently of the arrangement
+    hitches = [1]
+    for rating in ratings:
+        hitches = [
+            (hitches[num_hitches] if num_hitches < len(hitches) else 0) * (rating - 1)
+            + (hitches[num_hitches - 1] if num_hitches else 0)
+            for num_hitches in range(len(hitches) + 1)
+        ]
+    return CortexOdds(
+        num_outcomes=prod(ratings),
+        totals=dict(totals),
+        effects=dict(effects),
+        hitches=dict(enumerate(hitches)),
+        botches=hitches[-1],
+    )
+
+
+@lru_cache(maxsize=1024)
+def _get_pool_states(ratings: tuple[int, ...]) -> dict[_PoolState, int]:
+    # Pools are built one die at a time, so the states of every smaller pool are cached along the way
+    if not ratings:
+        return {(None, None, FALLBACK_EFFECT): 1}
+    rating = ratings[-1]
+    states: dict[_PoolState, int] = defaultdict(int)
+    for (first, second, rest_rating), count in _get_pool_states(ratings[:-1]).items():
+        states[first, second, rest_rating] += count
+        for value in range(2, rating + 1):
+            die = (value, rating)
+            displaced = None
+            if first is None:
+                new_first, new_second = die, None
+            elif _is_better_for_total(die, first):
+                new_first, new_second, displaced = die, first, second
+            elif second is None:
+                new_first, new_second = first, die
+            elif _is_better_for_total(die, second):
+                new_first, new_second, displaced = first, die, second
+            else:
+                new_first, new_second, displaced = first, second, die
+            new_rest_rating = max(rest_rating, displaced[1]) if displaced else rest_rating
+            states[new_first, new_second, new_rest_rating] += count
+    return dict(states)
+
+
+def _is_better_for_total(die: tuple[int, int], other: tuple[int, int]) -> bool:
+    # The best total uses the highest values and, on ties, the lowest ratings to leave the best effect die
+    return die[0] > other[0] or (die[0] == other[0] and die[1] < other[1])
+
+
+def format_cortex_odds(ratings: list[int], odds: CortexOdds, difficulty: int) -> str:
+    num_rolls = odds.num_outcomes
+    pool = ", ".join(f":d{rating}:" for rating in sorted(ratings, reverse=True))
+    effects = ", ".join(
+        f":d{effect}: {count / num_rolls:.0%}" for effect, count in sorted(odds.effects.items(), reverse=True)
+    )
+    return "\n".join([
+        f"Odds for {pool} against a difficulty of **{difficulty}**, keeping the best total:",
+        f"- **Success:** {odds.get_probability_to_beat(difficulty):.1%}",
+        f"- **Heroic success:** {odds.get_probability_to_beat(difficulty, HEROIC_SUCCESS_MARGIN - 1):.1%}",
+        f"- **At least one hitch:** {1 - odds.hitches.get(0, 0) / num_rolls:.1%}",
+        f"- **Botch:** {odds.botches / num_rolls:.1%}",
+        f"- **Effect die:** {effects}",
+    ])
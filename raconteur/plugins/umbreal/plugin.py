@@ -1,135 +1,72 @@
-import asyncio
-import itertools
 import re
-from dataclasses import dataclass, field
 from random import randint
 from typing import Optional, Union, Iterable
 
-from discord import Reaction, Member, TextChannel, Message
+from discord import Guild, TextChannel
+from discord.http import HTTPClient
 from fastapi import APIRouter
 from sqlalchemy.orm import Session
 
 from raconteur.commands import command, CommandCallContext
 from raconteur.exceptions import CommandException
+from raconteur.interactions import Interaction, InteractionResponseType, SelectOption, build_select_menu, \
+    send_message_with_components, edit_message_components, respond_to_interaction, reply_ephemeral
 from raconteur.messages import send_message
 from raconteur.models.base import get_session
 from raconteur.plugin import Plugin, get_permissions_for_member
+from raconteur.plugins.character.models import CharacterSheetVersion
 from raconteur.plugins.character.plugin import get_channel_character
-from raconteur.plugins.umbreal.models import UmbrealSheet, UmbrealTraitSet, UmbrealTrait
+from raconteur.plugins.character.world import UMBREAL_SHEET_TYPE
+from raconteur.plugins.umbreal.choices import DiceResult, RollChoice, determine_best_choices, \
+    determine_plot_point_choices, get_valid_results
+from raconteur.plugins.umbreal.odds import get_cortex_odds, format_cortex_odds
+from raconteur.plugins.umbreal.models import UmbrealSheet, UmbrealRoll, UmbrealTraitsVersion
+from raconteur.plugins.umbreal.rolls import RollStore, Side, Test, Action
+from raconteur.plugins.umbreal.traits import trait_index, EMPTY_TRAIT_LOOKUP
 from raconteur.plugins.umbreal.web import umbreal_router, umbreal_list
-from raconteur.utils import fuzzy_search
 
 DICE_ROLL_PATTERN = re.compile(r"(?P<num>\d+)?d(?P<rating>\d+)")
 TRAIT_ROLL_PATTERN = re.compile(r"(?:(?P<character>.+?)?!)?(?P<trait>.+)")
-PLAYER_VALID_TRAIT_SETS = {
-    UmbrealTraitSet.ASSETS,
-    UmbrealTraitSet.ATTRIBUTES,
-    UmbrealTraitSet.DISTINCTIONS,
-    UmbrealTraitSet.POWERS,
-    UmbrealTraitSet.SIGNATURE_ASSETS,
-    UmbrealTraitSet.SKILLS,
-}
-OTHER_VALID_TRAIT_SETS = {UmbrealTraitSet.COMPLICATIONS}
 VALID_DICE_RATINGS = {4, 6, 8, 10, 12}
-
-MAX_CHOICES = 15
-
-
-@dataclass
-class DiceResult:
-    name: str
-    rating: int
-    value: int
-
-
-@dataclass(eq=True, frozen=True)
-class RollChoice:
-    total: int
-    effect: int
-
-    def __lt__(self, other: "RollChoice") -> bool:
-        if self.total < other.total:
-            return True
-        if self.total == other.total and self.effect < other.effect:
-            return True
-        return False
-
-    def __str__(self) -> str:
-        return f"**{self.total}** (:d{self.effect}:)"
-
-
-@dataclass
-class Side:
-    member_id: Optional[int] = None
-    user_name: Optional[str] = None
-    options: list[RollChoice] = field(default_factory=list)
-    message_id: Optional[int] = None
-    rolls: list[DiceResult] = field(default_factory=list)
-    choice: Optional[RollChoice] = None
-
-
-@dataclass
-class Test:
-    name: str
-    difficulty: Side = field(default_factory=lambda: Side())
-    player: Side = field(default_factory=lambda: Side())
-
-
-@dataclass
-class Action:
-    name: str
-    action: Side = field(default_factory=lambda: Side())
-    reaction: Side = field(default_factory=lambda: Side())
+CHOICE_MENU_ID = "umbreal:choice"
 
 
 class UmbrealPlugin(Plugin):
-    ongoing_tests: dict[str, Test]
-    ongoing_actions: dict[str, Action]
+    rolls: RollStore
 
     @classmethod
     def assert_models(cls) -> None:
         assert UmbrealSheet
+        assert UmbrealRoll
+        assert UmbrealTraitsVersion
 
     def __init__(self, bot):
         super().__init__(bot)
-        self.ongoing_tests = {}
-        self.ongoing_actions = {}
-
-    async def on_reaction_add(self, reaction: Reaction, user: Member) -> None:
-        emoji = reaction.emoji if isinstance(reaction.emoji, str) else reaction.emoji.name
-        for option_idx in range(MAX_CHOICES):
-            if _get_unicode_emoji_for_choice(option_idx) == emoji:
-                break
-        else:
-            # Not a choice emoji
+        self.rolls = RollStore()
+
+    async def on_ready(self) -> None:
+        self.rolls.start()
+        trait_index.start()
+
+    async def on_interaction(self, guild: Guild, interaction: Interaction) -> None:
+        if interaction.custom_id != CHOICE_MENU_ID or not interaction.message_id:
+            return
+        choice_message = self.rolls.get_for_choice_message(interaction.message_id)
+        if not choice_message:
+            await reply_ephemeral(self.bot.http, interaction, "This roll is no longer waiting for a result.")
+            return
+        guild_id, roll, side = choice_message
+        if side.member_id != interaction.member_id:
+            await reply_ephemeral(self.bot.http, interaction, f"Only **{side.user_name}** can choose this result.")
             return
-        channel = reaction.message.channel
-
-        # Check if this is a test
-        for test in self.ongoing_tests.values():
-            try:
-                if test.difficulty.message_id == reaction.message.id and test.difficulty.member_id == user.id:
-                    await _set_test_difficulty_choice(channel, test, test.difficulty.options[option_idx])
-                    return
-                if test.player.message_id == reaction.message.id and test.player.member_id == user.id:
-                    await _set_test_player_choice(channel, test, test.player.options[option_idx])
-                    del self.ongoing_tests[test.name]
-                    return
-            except IndexError:
-                return
-
-        # Check if this is an action
-        for action in self.ongoing_actions.values():
-            try:
-                if action.action.message_id == reaction.message.id and action.action.member_id == user.id:
-                    await _set_action_choice(channel, action, action.action.options[option_idx])
-                    return
-                if action.reaction.message_id == reaction.message.id and action.reaction.member_id == user.id:
-                    await _set_reaction_choice(channel, action, action.reaction.options[option_idx])
-                    del self.ongoing_actions[action.name]
-                    return
-            except IndexError:
-                return
+        option_idx = int(interaction.values[0]) if interaction.values else len(side.options)
+        channel = guild.get_channel(interaction.channel_id)
+        if option_idx >= len(side.options) or not isinstance(channel, TextChannel):
+            return
+        if isinstance(roll, Test):
+            await self._choose_for_test(channel, guild_id, roll, side, side.options[option_idx], interaction)
+        else:
+            await self._choose_for_action(channel, guild_id, roll, side, side.options[option_idx], interaction)
 
     @command(
         help_msg="Runs a named Cortex Prime test. If a test with that name doesn't exist, this roll sets the "
@@ -138,23 +75,22 @@ class UmbrealPlugin(Plugin):
     )
     async def test(self, ctx: CommandCallContext, name: str, *traits: str) -> None:
         with get_session() as session:
-            if name not in self.ongoing_tests:
+            test = self.rolls.get_test(ctx.guild.id, name)
+            if not test:
                 test = Test(name=name)
-                await _roll_for_test_side(ctx, session, test.difficulty, test.name, traits)
-                self.ongoing_tests[name] = test
-            elif self.ongoing_tests[name].difficulty.choice:
+                await _roll_for_test_side(self.bot.http, ctx, session, test.difficulty, test.name, traits)
+                self.rolls.save(ctx.guild.id, test)
+                self.rolls.track_choice_message(ctx.guild.id, test, test.difficulty)
+            elif test.difficulty.choice:
+                self.rolls.untrack_choice_message(test.player)
                 await _roll_for_test_side(
-                    ctx,
-                    session,
-                    self.ongoing_tests[name].player,
-                    self.ongoing_tests[name].name,
-                    traits,
-                    self.ongoing_tests[name].difficulty.choice
+                    self.bot.http, ctx, session, test.player, test.name, traits, test.difficulty.choice
                 )
+                self.rolls.save(ctx.guild.id, test)
+                self.rolls.track_choice_message(ctx.guild.id, test, test.player)
             else:
                 raise CommandException(
-                    "You need to choose a roll result, either by reacting to the results list or by using "
-                    "`.testset`."
+                    "You need to choose a roll result, either from the results menu or by using `.testset`."
                 )
 
     @command(
@@ -164,40 +100,47 @@ class UmbrealPlugin(Plugin):
     )
     async def action(self, ctx: CommandCallContext, name: str, *traits: str) -> None:
         with get_session() as session:
-            if name not in self.ongoing_actions:
+            action = self.rolls.get_action(ctx.guild.id, name)
+            if not action:
                 action = Action(name=name)
-                await _roll_for_action_side(ctx, session, action.action, action.name, traits)
-                self.ongoing_actions[name] = action
-            elif self.ongoing_actions[name].action.choice:
+                await _roll_for_action_side(self.bot.http, ctx, session, action.action, action.name, traits)
+                self.rolls.save(ctx.guild.id, action)
+                self.rolls.track_choice_message(ctx.guild.id, action, action.action)
+            elif action.action.choice:
+                self.rolls.untrack_choice_message(action.reaction)
                 await _roll_for_action_side(
-                    ctx,
-                    session,
-                    self.ongoing_actions[name].reaction,
-                    self.ongoing_actions[name].name,
-                    traits,
-                    self.ongoing_actions[name].action.choice
+                    self.bot.http, ctx, session, action.reaction, action.name, traits, action.action.choice
                 )
+                self.rolls.save(ctx.guild.id, action)
+                self.rolls.track_choice_message(ctx.guild.id, action, action.reaction)
             else:
                 raise CommandException(
-                    "You need to choose a roll result, either by reacting to the results list or by using "
-                    "`.actionset`."
+                    "You need to choose a roll result, either from the results menu or by using `.actionset`."
                 )
 
+    @command(
+        help_msg="Computes the odds of beating a difficulty with the given traits, without rolling them. Example: "
+                 "`.testodds 11 d8 strength`",
+        requires_player=True
+    )
+    async def test_odds(self, ctx: CommandCallContext, difficulty: int, *traits: str) -> str:
+        with get_session() as session:
+            ratings = [rating for name, rating in _get_dice_ratings(session, ctx, traits)]
+        return format_cortex_odds(ratings, get_cortex_odds(ratings), difficulty)
+
     @command(
         help_msg="Manually sets the result of a named test, if a custom arrangement is desired.",
         requires_player=True
     )
     async def test_set(self, ctx: CommandCallContext, name: str, total: int, effect: int) -> None:
-        if name not in self.ongoing_tests:
+        test = self.rolls.get_test(ctx.guild.id, name)
+        if not test:
             raise CommandException(f"There is no test with the name `{name}`")
-        test = self.ongoing_tests[name]
         choice = RollChoice(total=total, effect=effect)
         if test.difficulty.member_id == ctx.member.id:
-            await _set_test_difficulty_choice(ctx.channel, test, choice)
-            return
+            await self._choose_for_test(ctx.channel, ctx.guild.id, test, test.difficulty, choice)
         elif test.player.member_id == ctx.member.id:
-            await _set_test_player_choice(ctx.channel, test, choice)
-            del self.ongoing_tests[name]
+            await self._choose_for_test(ctx.channel, ctx.guild.id, test, test.player, choice)
         else:
             raise CommandException(f"You need to roll for test {name} first")
 
@@ -206,16 +149,14 @@ class UmbrealPlugin(Plugin):
         requires_player=True
     )
     async def action_set(self, ctx: CommandCallContext, name: str, total: int, effect: int) -> None:
-        if name not in self.ongoing_actions:
+        action = self.rolls.get_action(ctx.guild.id, name)
+        if not action:
             raise CommandException(f"There is no action with the name `{name}`")
-        action = self.ongoing_actions[name]
         choice = RollChoice(total=total, effect=effect)
         if action.action.member_id == ctx.member.id:
-            await _set_action_choice(ctx.channel, action, choice)
-            return
+            await self._choose_for_action(ctx.channel, ctx.guild.id, action, action.action, choice)
         elif action.reaction.member_id == ctx.member.id:
-            await _set_reaction_choice(ctx.channel, action, choice)
-            del self.ongoing_actions[name]
+            await self._choose_for_action(ctx.channel, ctx.guild.id, action, action.reaction, choice)
         else:
             raise CommandException(f"You need to roll for action `{name}` first")
 
@@ -230,8 +171,12 @@ class UmbrealPlugin(Plugin):
                 raise CommandException("Failed to locate Umbreal character sheet")
             if not amount:
                 return f"**{sheet.character.name}** currently has **{sheet.plot_points}** :PP:."
+            if sheet.plot_points + amount < 0:
+                raise CommandException(f"**{sheet.character.name}** only has **{sheet.plot_points}** :PP:.")
             sheet.plot_points += amount
+            CharacterSheetVersion.bump(session, ctx.guild.id, UMBREAL_SHEET_TYPE.name, sheet.character_id)
             session.commit()
+            trait_index.invalidate(ctx.guild.id)
             return f"**{sheet.character.name}** {'gains' if amount > 0 else 'spends'} **{abs(amount)}** :PP:."
 
     @command(
@@ -248,6 +193,8 @@ class UmbrealPlugin(Plugin):
                     f"**{sheet.character.name}** currently has **{sheet.xp_current} XP**, with a lifetime total of "
                     f"**{sheet.xp_lifetime} XP**."
                 )
+            if sheet.xp_current + amount < 0:
+                raise CommandException(f"**{sheet.character.name}** only has **{sheet.xp_current} XP**.")
             sheet.xp_current += amount
             if amount > 0:
                 sheet.xp_lifetime += amount
@@ -257,9 +204,74 @@ class UmbrealPlugin(Plugin):
                     f"**{sheet.character.name}** loses **{abs(amount)} XP**, for a new total of **{sheet.xp_current}** "
                     f"XP."
                 )
+            CharacterSheetVersion.bump(session, ctx.guild.id, UMBREAL_SHEET_TYPE.name, sheet.character_id)
             session.commit()
+            trait_index.invalidate(ctx.guild.id)
             return msg
 
+    async def _choose_for_test(
+            self,
+            channel: TextChannel,
+            guild_id: int,
+            test: Test,
+            side: Side,
+            choice: RollChoice,
+            interaction: Optional[Interaction] = None,
+    ) -> None:
+        if not await self._pay_for_choice(guild_id, side, choice, interaction):
+            return
+        # The side stops accepting choices before anything is awaited, so that quick double selections only count once
+        self.rolls.untrack_choice_message(side)
+        await self._close_choice_menu(channel, side, interaction)
+        if side is test.difficulty:
+            await _set_test_difficulty_choice(channel, test, choice)
+            self.rolls.save(guild_id, test)
+        else:
+            self.rolls.remove(guild_id, test)
+            await _set_test_player_choice(channel, test, choice)
+
+    async def _choose_for_action(
+            self,
+            channel: TextChannel,
+            guild_id: int,
+            action: Action,
+            side: Side,
+            choice: RollChoice,
+            interaction: Optional[Interaction] = None,
+    ) -> None:
+        if not await self._pay_for_choice(guild_id, side, choice, interaction):
+            return
+        self.rolls.untrack_choice_message(side)
+        await self._close_choice_menu(channel, side, interaction)
+        if side is action.action:
+            await _set_action_choice(channel, action, choice)
+            self.rolls.save(guild_id, action)
+        else:
+            self.rolls.remove(guild_id, action)
+            await _set_reaction_choice(channel, action, choice)
+
+    async def _pay_for_choice(
+            self, guild_id: int, side: Side, choice: RollChoice, interaction: Optional[Interaction]
+    ) -> bool:
+        # Plot points are spent without awaiting anything first, so that a double selection can't pay twice
+        try:
+            _spend_plot_points(guild_id, side, choice)
+        except CommandException as e:
+            if not interaction:
+                raise
+            await reply_ephemeral(self.bot.http, interaction, str(e))
+            return False
+        return True
+
+    async def _close_choice_menu(self, channel: TextChannel, side: Side, interaction: Optional[Interaction]) -> None:
+        # Removing the menu is the only edit the roll message gets, and it doubles as the response to the interaction
+        if interaction:
+            await respond_to_interaction(
+                self.bot.http, interaction, InteractionResponseType.UPDATE_MESSAGE, {"components": []}
+            )
+        elif side.message_id and side.options and side.choice is None:
+            await edit_message_components(self.bot.http, channel.id, side.message_id, [])
+
     @classmethod
     def get_web_router(cls) -> Optional[APIRouter]:
         return umbreal_router
@@ -292,11 +304,6 @@ async def _set_reaction_choice(channel: TextChannel, action: Action, choice: Rol
 async def _set_initial_choice(channel: TextChannel, name: str, side: Side, choice: RollChoice) -> None:
     side.choice = choice
     await send_message(channel, f"**{side.user_name}** sets their roll for `{name}` to {side.choice}.")
-    react_message: Message = await channel.fetch_message(side.message_id)
-    await asyncio.gather(
-        react_message.edit(content=react_message.content.split("You can react with")[0].rstrip()),
-        react_message.clear_reactions(),
-    )
 
 
 async def _set_counter_choice(
@@ -325,15 +332,9 @@ async def _set_counter_choice(
         message += f"This is a **failure** for **{for_name}**."
     await send_message(channel, message)
 
-    if counter.message_id:
-        react_message: Message = await channel.fetch_message(counter.message_id)
-        await asyncio.gather(
-            react_message.edit(content=react_message.content.split("You can react with")[0].rstrip()),
-            react_message.clear_reactions(),
-        )
-
 
 async def _roll_for_test_side(
+    http: HTTPClient,
     ctx: CommandCallContext,
     session: Session,
     side: Side,
@@ -342,11 +343,12 @@ async def _roll_for_test_side(
     difficulty: Optional[RollChoice] = None,
 ) -> None:
     await _roll_for_side(ctx, session, side, trait_names)
-    text = _build_roll_message(side.user_name, roll_name, side.rolls, side.options, "testset", difficulty)
-    await _send_roll_choice_message(ctx, side, text)
+    text = _build_roll_message(side.user_name, roll_name, side.rolls, difficulty)
+    await _send_roll_choice_message(http, ctx, side, text, "testset")
 
 
 async def _roll_for_action_side(
+    http: HTTPClient,
     ctx: CommandCallContext,
     session: Session,
     side: Side,
@@ -355,25 +357,65 @@ async def _roll_for_action_side(
     action: Optional[RollChoice] = None,
 ) -> None:
     await _roll_for_side(ctx, session, side, trait_names)
-    text = _build_roll_message(side.user_name, roll_name, side.rolls, side.options, "actionset", action)
-    await _send_roll_choice_message(ctx, side, text)
+    text = _build_roll_message(side.user_name, roll_name, side.rolls, action)
+    await _send_roll_choice_message(http, ctx, side, text, "actionset")
 
 
 async def _roll_for_side(
     ctx: CommandCallContext, session: Session, side: Side, trait_names: Iterable[str]
 ) -> None:
+    sheet = _get_sheet(ctx, session)
     side.member_id = ctx.member.id
+    side.character_id = sheet.character_id if sheet else None
     side.user_name = _get_user_name(ctx, session)
     side.rolls = _roll(session, ctx, trait_names)
-    side.options = _determine_best_choices(side.rolls)
+    side.options = determine_best_choices(side.rolls)
+    if sheet:
+        # Only the arrangements the character can currently afford are offered
+        side.options += [
+            choice for choice in determine_plot_point_choices(side.rolls, side.options)
+            if choice.plot_points <= sheet.plot_points
+        ]
     side.choice = RollChoice(total=0, effect=4) if not side.options else None
 
 
-async def _send_roll_choice_message(ctx: CommandCallContext, side: Side, text: str) -> None:
+async def _send_roll_choice_message(
+        http: HTTPClient, ctx: CommandCallContext, side: Side, text: str, set_command: str
+) -> None:
     # TODO Fix this so that it supports rooms that are private to the user
-    message = await send_message(ctx.channel, text)
-    side.message_id = message.id
-    await asyncio.gather(*[message.add_reaction(_get_unicode_emoji_for_choice(i)) for i in range(len(side.options))])
+    if not side.options:
+        side.message_id = (await send_message(ctx.channel, text)).id
+        return
+    menu = build_select_menu(
+        CHOICE_MENU_ID,
+        f"Pick a result, or use .{set_command} to set your own",
+        [
+            SelectOption(
+                label=choice.label,
+                value=str(idx),
+                description=f"Adds {choice.plot_points + 2} dice to the total" if choice.plot_points else None,
+            )
+            for idx, choice in enumerate(side.options)
+        ],
+    )
+    side.message_id = await send_message_with_components(http, ctx.channel, text, menu)
+
+
+def _spend_plot_points(guild_id: int, side: Side, choice: RollChoice) -> None:
+    if not choice.plot_points:
+        return
+    with get_session() as session:
+        sheet = UmbrealSheet.get_for_character(session, side.character_id) if side.character_id else None
+        if not sheet:
+            raise CommandException("Only a character with an Umbreal sheet can spend plot points on a roll.")
+        if sheet.plot_points < choice.plot_points:
+            raise CommandException(
+                f"**{sheet.character.name}** only has **{sheet.plot_points}** PP, which isn't enough for this result."
+            )
+        sheet.plot_points -= choice.plot_points
+        CharacterSheetVersion.bump(session, guild_id, UMBREAL_SHEET_TYPE.name, sheet.character_id)
+        session.commit()
+    trait_index.invalidate(guild_id)
 
 
 def _get_user_name(ctx: CommandCallContext, session: Session) -> str:
@@ -401,15 +443,13 @@ def _build_roll_message(
     name: str,
     roll_name: str,
     results: list[DiceResult],
-    choices: list[RollChoice],
-    set_command: str,
     to_beat: Optional[RollChoice] = None,
 ) -> str:
     text = (
         f"**{name}** rolls for `{roll_name}`: "
         + ", ".join(f"**{result.value}** ({result.name} :d{result.rating}:)" for result in results) + "."
     )
-    valid_results = _get_valid_results(results)
+    valid_results = get_valid_results(results)
 
     num_hitches = len(results) - len(valid_results)
     if num_hitches == len(results):
@@ -417,52 +457,27 @@ def _build_roll_message(
     elif num_hitches:
         text += f"\n\nThere are **{num_hitches} hitches**. "
 
-    if valid_results:
-        text += (
-            f"\n\nYou can react with one of the following pre-determined results, or use `.{set_command}` to specify a "
-            "custom result (you can include more dice in the result by spending 1 :PP: per die):\n"
-        )
-        for i, choice in enumerate(choices):
-            text += f"\n:{_get_emoji_name_for_choice(i)}: {choice}"
-
-        if to_beat is not None:
-            text += f"\n\nThe roll to beat is {to_beat}"
+    if valid_results and to_beat is not None:
+        text += f"\n\nThe roll to beat is {to_beat}"
 
     return text
 
 
-def _determine_best_choices(results: list[DiceResult]) -> list[RollChoice]:
-    valid_results = _get_valid_results(results)
-    choices = []
-    for length in [1, 2]:
-        for combo in itertools.combinations(valid_results, length):
-            effects = [*(result.rating for result in valid_results if result not in combo)]
-            if not effects:
-                effects.append(4)  # Ensure there's always a d4 fallback
-            choices.append(RollChoice(total=sum(result.value for result in combo), effect=max(effects)))
-    return list(reversed(sorted(set(choices))))[:MAX_CHOICES]
-
-
-def _get_valid_results(results: list[DiceResult]) -> list[DiceResult]:
-    return [result for result in results if result.value != 1]
+def _roll(session: Session, ctx: CommandCallContext, trait_names: Iterable[str]) -> list[DiceResult]:
+    return [
+        DiceResult(name=name, value=randint(1, rating), rating=rating)
+        for name, rating in _get_dice_ratings(session, ctx, trait_names)
+    ]
 
 
-def _roll(session: Session, ctx: CommandCallContext, trait_names: Iterable[str]) -> list[DiceResult]:
-    # Compile all traits which are available to the user rolling
+def _get_dice_ratings(session: Session, ctx: CommandCallContext, trait_names: Iterable[str]) -> list[tuple[str, int]]:
     permissions = get_permissions_for_member(ctx.member)
     character = get_channel_character(ctx, session) if not permissions.is_gm else None
-    traits_by_name_and_character: dict[str, dict[str, UmbrealTrait]] = {}
-    character_traits_by_name: dict[str, UmbrealTrait] = {}
     # TODO Handle d4 complications
-    for sheet in UmbrealSheet.get_all_of_guild(session, ctx.guild.id):
-        valid_trait_sets = PLAYER_VALID_TRAIT_SETS if sheet.character == character else OTHER_VALID_TRAIT_SETS
-        traits_by_name_and_character[sheet.character.name] = {
-            trait.name: trait for trait in sheet.traits if trait.set in valid_trait_sets and trait.rating
-        }
-        if sheet.character == character:
-            character_traits_by_name = traits_by_name_and_character[sheet.character.name]
+    guild_traits = trait_index.get(session, ctx.guild.id)
+    character_traits = guild_traits.characters_by_id.get(character.id) if character else None
 
-    results = []
+    ratings = []
     for trait_string in trait_names:
         if match := DICE_ROLL_PATTERN.match(trait_string):
             num = int(match.group("num") or "1")
@@ -470,31 +485,26 @@ def _roll(session: Session, ctx: CommandCallContext, trait_names: Iterable[str])
             if rating not in VALID_DICE_RATINGS:
                 raise CommandException(f"Invalid dice rating: {trait_string}")
             for _ in range(0, num):
-                results.append(DiceResult(name=trait_string, value=randint(1, rating), rating=rating))
+                ratings.append((trait_string, rating))
         elif match := TRAIT_ROLL_PATTERN.match(trait_string):
             character_name = match.group("character")
             trait_name = match.group("trait")
             if character_name:
-                actual_character_name = fuzzy_search(character_name, traits_by_name_and_character.keys())
-                if not actual_character_name:
+                other_character_traits = guild_traits.search_character(character_name)
+                if not other_character_traits:
                     raise CommandException(f"Failed to locate character: {character_name}")
-                traits = traits_by_name_and_character[actual_character_name]
+                if other_character_traits is character_traits:
+                    traits = character_traits.own_traits
+                else:
+                    traits = other_character_traits.other_traits
             else:
-                traits = character_traits_by_name
+                traits = character_traits.own_traits if character_traits else EMPTY_TRAIT_LOOKUP
 
-            actual_trait_name = fuzzy_search(trait_name, traits.keys())
-            if not actual_trait_name:
+            trait = traits.search(trait_name)
+            if not trait:
                 raise CommandException(f"Failed to locate trait: {trait_name}")
-            trait = traits[actual_trait_name]
-            results.append(DiceResult(name=trait.name, value=randint(1, trait.rating), rating=trait.rating))
+            ratings.append(trait)
         else:
             raise CommandException(f"Invalid trait specification: {trait_string}")
-    return results
-
-
-def _get_emoji_name_for_choice(choice_idx: int) -> str:
-    return f"regional_indicator_{chr(ord('a')+choice_idx)}"
-
+    return ratings
 
-def _get_unicode_emoji_for_choice(choice_idx: int) -> str:
-    return chr(ord("🇦") + choice_idx)
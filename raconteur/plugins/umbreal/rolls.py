@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional, Union, Any
+
+from sqlalchemy import select, delete
+
+from raconteur.models.base import get_session
+from raconteur.plugins.umbreal.choices import DiceResult, RollChoice
+from raconteur.plugins.umbreal.models import UmbrealRoll, UmbrealRollKind
+
+# Rolls nobody has touched for a day are considered abandoned
+ROLL_TTL = timedelta(days=1)
+ROLL_SWEEP_INTERVAL = 10 * 60
+
+
+@dataclass
+class Side:
+    member_id: Optional[int] = None
+    # Character whose sheet pays for the plot points of the chosen arrangement, if any
+    character_id: Optional[int] = None
+    user_name: Optional[str] = None
+    options: list[RollChoice] = field(default_factory=list)
+    message_id: Optional[int] = None
+    rolls: list[DiceResult] = field(default_factory=list)
+    choice: Optional[RollChoice] = None
+
+
+@dataclass
+class Test:
+    name: str
+    difficulty: Side = field(default_factory=lambda: Side())
+    player: Side = field(default_factory=lambda: Side())
+
+
+@dataclass
+class Action:
+    name: str
+    action: Side = field(default_factory=lambda: Side())
+    reaction: Side = field(default_factory=lambda: Side())
+
+
+Roll = Union[Test, Action]
+RollKey = tuple[UmbrealRollKind, int, str]
+# Member ID, user name, message ID, dice results, options, choice and character ID of a side, as stored in JSON
+SideState = list[Any]
+
+
+class RollStore:
+    """Ongoing tests and actions of every guild, keyed by guild and roll name.
+
+    Rolls are kept in memory and written through to a table with one compact row per roll, which is reloaded in bulk
+    on startup. Rolls expire once they haven't been touched for a while, and are swept both from memory and from the
+    table. Messages waiting for a choice are indexed by ID so that menu selections can be matched without any scan.
+    """
+
+    rolls: dict[RollKey, Roll]
+    expirations: dict[RollKey, datetime]
+    choice_messages: dict[int, tuple[int, Roll, Side]]
+    task: Optional[asyncio.Task]
+
+    def __init__(self) -> None:
+        self.rolls = {}
+        self.expirations = {}
+        self.choice_messages = {}
+        self.task = None
+
+    def start(self) -> None:
+        if not self.task:
+            self._load()
+            self.task = asyncio.create_task(self._sweep())
+
+    def get_test(self, guild_id: int, name: str) -> Optional[Test]:
+        test = self._get((UmbrealRollKind.TEST, guild_id, name))
+        assert test is None or isinstance(test, Test)
+        return test
+
+    def get_action(self, guild_id: int, name: str) -> Optional[Action]:
+        action = self._get((UmbrealRollKind.ACTION, guild_id, name))
+        assert action is None or isinstance(action, Action)
+        return action
+
+    def get_for_choice_message(self, message_id: int) -> Optional[tuple[int, Roll, Side]]:
+        return self.choice_messages.get(message_id)
+
+    def save(self, guild_id: int, roll: Roll) -> None:
+        key = _get_key(guild_id, roll)
+        expires_at = datetime.utcnow() + ROLL_TTL
+        self.rolls[key] = roll
+        self.expirations[key] = expires_at
+        state = _dump_roll(roll)
+        with get_session() as session:
+            row = session.execute(select(UmbrealRoll).where(
+                UmbrealRoll.game_guild_id == guild_id, UmbrealRoll.kind == key[0], UmbrealRoll.name == roll.name,
+            )).scalar_one_or_none()
+            if row:
+                row.state = state
+                row.expires_at = expires_at
+            else:
+                session.add(UmbrealRoll(
+                    game_guild_id=guild_id, kind=key[0], name=roll.name, state=state, expires_at=expires_at
+                ))
+            session.commit()
+
+    def remove(self, guild_id: int, roll: Roll) -> None:
+        key = _get_key(guild_id, roll)
+        self._forget(key)
+        with get_session() as session:
+            session.execute(delete(UmbrealRoll).where(
+                UmbrealRoll.game_guild_id == guild_id, UmbrealRoll.kind == key[0], UmbrealRoll.name == roll.name,
+            ))
+            session.commit()
+
+    def track_choice_message(self, guild_id: int, roll: Roll, side: Side) -> None:
+        if side.message_id and side.options:
+            self.choice_messages[side.message_id] = (guild_id, roll, side)
+
+    def untrack_choice_message(self, side: Side) -> None:
+        if side.message_id:
+            self.choice_messages.pop(side.message_id, None)
+
+    def _get(self, key: RollKey) -> Optional[Roll]:
+        if key in self.expirations and self.expirations[key] < datetime.utcnow():
+            # Expired but not swept yet
+            self._forget(key)
+        return self.rolls.get(key)
+
+    def _forget(self, key: RollKey) -> None:
+        roll = self.rolls.pop(key, None)
+        self.expirations.pop(key, None)
+        if roll:
+            for side in _get_sides(roll):
+                self.untrack_choice_message(side)
+
+    def _load(self) -> None:
+        with get_session() as session:
+            rows = UmbrealRoll.get_all_active(session, datetime.utcnow())
+            for row in rows:
+                try:
+                    roll = _load_roll(row.kind, row.name, row.state)
+                except (ValueError, KeyError, TypeError) as e:
+                    logging.warning(f"Ignoring invalid Umbreal roll {row.name} in guild {row.game_guild_id}: {e}")
+                    continue
+                key = (row.kind, row.game_guild_id, row.name)
+                self.rolls[key] = roll
+                self.expirations[key] = row.expires_at
+                for side in _get_sides(roll):
+                    if side.choice is None:
+                        self.track_choice_message(row.game_guild_id, roll, side)
+        logging.info(f"Loaded {len(self.rolls)} ongoing Umbreal rolls")
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(ROLL_SWEEP_INTERVAL)
+            now = datetime.utcnow()
+            for key in [key for key, expires_at in self.expirations.items() if expires_at < now]:
+                self._forget(key)
+            try:
+                with get_session() as session:
+                    num_deleted = UmbrealRoll.delete_expired(session, now)
+                    session.commit()
+                if num_deleted:
+                    logging.info(f"Swept {num_deleted} expired Umbreal rolls")
+            except Exception as e:
+                logging.exception(e)
+
+
+def _get_key(guild_id: int, roll: Roll) -> RollKey:
+    return UmbrealRollKind.TEST if isinstance(roll, Test) else UmbrealRollKind.ACTION, guild_id, roll.name
+
+
+def _get_sides(roll: Roll) -> tuple[Side, Side]:
+    return (roll.difficulty, roll.player) if isinstance(roll, Test) else (roll.action, roll.reaction)
+
+
+def _dump_roll(roll: Roll) -> str:
+    return json.dumps([_dump_side(side) for side in _get_sides(roll)], separators=(",", ":"))
+
+
+def _dump_side(side: Side) -> SideState:
+    return [
+        side.member_id,
+        side.user_name,
+        side.message_id,
+        [[result.name, result.rating, result.value] for result in side.rolls],
+        [_dump_choice(choice) for choice in side.options],
+        _dump_choice(side.choice) if side.choice else None,
+        side.character_id,
+    ]
+
+
+def _dump_choice(choice: RollChoice) -> list[int]:
+    return [choice.total, choice.effect, choice.plot_points]
+
+
+def _load_roll(kind: UmbrealRollKind, name: str, state: str) -> Roll:
+    initial, counter = (_load_side(side) for side in json.loads(state))
+    if kind == UmbrealRollKind.TEST:
+        return Test(name=name, difficulty=initial, player=counter)
+    return Action(name=name, action=initial, reaction=counter)
+
+
+def _load_side(state: SideState) -> Side:
+    member_id, user_name, message_id, rolls, options, choice, *rest = state
+    return Side(
+        member_id=member_id,
+        character_id=rest[0] if rest else None,
+        user_name=user_name,
+        message_id=message_id,
+        rolls=[DiceResult(name=name, rating=rating, value=value) for name, rating, value in rolls],
+        options=[RollChoice(*option) for option in options],
+        choice=RollChoice(*choice) if choice else None,
+    )
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from raconteur.models.base import get_session
+from raconteur.plugins.umbreal.models import UmbrealSheet, UmbrealTraitSet, UmbrealTraitsVersion
+from raconteur.utils import FuzzyIndex
+
+PLAYER_VALID_TRAIT_SETS = {
+    UmbrealTraitSet.ASSETS,
+    UmbrealTraitSet.ATTRIBUTES,
+    UmbrealTraitSet.DISTINCTIONS,
+    UmbrealTraitSet.POWERS,
+    UmbrealTraitSet.SIGNATURE_ASSETS,
+    UmbrealTraitSet.SKILLS,
+}
+OTHER_VALID_TRAIT_SETS = {UmbrealTraitSet.COMPLICATIONS}
+TRAIT_INDEX_POLL_INTERVAL = 10
+
+
+@dataclass(frozen=True)
+class TraitLookup:
+    ratings_by_name: dict[str, int]
+    index: FuzzyIndex
+
+    @classmethod
+    def build(cls, ratings_by_name: dict[str, int]) -> "TraitLookup":
+        return cls(ratings_by_name=ratings_by_name, index=FuzzyIndex(ratings_by_name))
+
+    def search(self, query: str) -> Optional[tuple[str, int]]:
+        name = self.index.search(query)
+        return (name, self.ratings_by_name[name]) if name is not None else None
+
+
+EMPTY_TRAIT_LOOKUP = TraitLookup.build({})
+
+
+@dataclass(frozen=True)
+class CharacterTraits:
+    character_id: int
+    # Traits a character can roll for themselves, and traits others can roll against them
+    own_traits: TraitLookup
+    other_traits: TraitLookup
+
+
+@dataclass(frozen=True)
+class GuildTraits:
+    characters_by_name: dict[str, CharacterTraits]
+    characters_by_id: dict[int, CharacterTraits]
+    character_index: FuzzyIndex
+
+    def search_character(self, query: str) -> Optional[CharacterTraits]:
+        name = self.character_index.search(query)
+        return self.characters_by_name[name] if name is not None else None
+
+
+class TraitIndex:
+    """Ratable traits of every Umbreal sheet of a guild, prepared for fuzzy lookups.
+
+    The index of a guild is built from its sheets on first use and kept until one of its sheets changes, so that
+    rolling doesn't need to load every sheet of the guild each time. Changes made by the bot invalidate the index
+    directly; sheets are mostly edited through the website, which runs in another process, so it bumps a version per
+    guild instead, which the bot polls for every guild at once.
+    """
+
+    guilds: dict[int, GuildTraits]
+    versions: dict[int, int]
+    task: Optional[asyncio.Task]
+
+    def __init__(self) -> None:
+        self.guilds = {}
+        self.versions = {}
+        self.task = None
+
+    def start(self) -> None:
+        if not self.task:
+            self.task = asyncio.create_task(self._poll())
+
+    def get(self, session: Session, guild_id: int) -> GuildTraits:
+        if guild_id not in self.guilds:
+            self.guilds[guild_id] = _build_guild_traits(session, guild_id)
+        return self.guilds[guild_id]
+
+    def invalidate(self, guild_id: int) -> None:
+        self.guilds.pop(guild_id, None)
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                with get_session() as session:
+                    versions = UmbrealTraitsVersion.get_all(session)
+                for guild_id, version in versions.items():
+                    if self.versions.get(guild_id) != version:
+                        self.invalidate(guild_id)
+                self.versions = versions
+            except Exception as e:
+                logging.exception(e)
+            await asyncio.sleep(TRAIT_INDEX_POLL_INTERVAL)
+
+
+def _build_guild_traits(session: Session, guild_id: int) -> GuildTraits:
+    characters_by_name = {}
+    for sheet in UmbrealSheet.get_all_of_guild(session, guild_id):
+        characters_by_name[sheet.character.name] = CharacterTraits(
+            character_id=sheet.character_id,
+            own_traits=TraitLookup.build({
+                trait.name: trait.rating for trait in sheet.traits
+                if trait.set in PLAYER_VALID_TRAIT_SETS and trait.rating
+            }),
+            other_traits=TraitLookup.build({
+                trait.name: trait.rating for trait in sheet.traits
+                if trait.set in OTHER_VALID_TRAIT_SETS and trait.rating
+            }),
+        )
+    return GuildTraits(
+        characters_by_name=characters_by_name,
+        characters_by_id={traits.character_id: traits for traits in characters_by_name.values()},
+        character_index=FuzzyIndex(characters_by_name),
+    )
+
+
+trait_index = TraitIndex()
@@ -1,16 +1,19 @@
 import http
-from typing import Optional, Iterable
+from typing import Optional, Iterable, Any
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from starlette.requests import Request
 from starlette.responses import Response, RedirectResponse
 
 from raconteur.models.base import get_session
-from raconteur.plugins.character.models import Character
+from raconteur.plugins.character.models import Character, CharacterSheetVersion
+from raconteur.plugins.character.world import UMBREAL_SHEET_TYPE, SheetChanges, SheetChangesResponse, get_sheets, \
+    upsert_sheets
 from raconteur.plugins.umbreal.constants import D6, D4, D8, D12, D10
-from raconteur.plugins.umbreal.models import UmbrealSheet, UmbrealTrait, UmbrealTraitSet, UmbrealLawbreak
+from raconteur.plugins.umbreal.models import UmbrealSheet, UmbrealTrait, UmbrealTraitSet, UmbrealLawbreak, \
+    UmbrealTraitsVersion
 from raconteur.web.context import RequestContext
 from raconteur.web.templates import render_response
 from raconteur.web.utils import check_permissions
@@ -20,6 +23,15 @@ POWER_ALLOWED_VALUES = (0, D6, D8, D10, D12)
 SIGNATURE_ASSET_ALLOWED_VALUES = (D6, D8, D10, D12)
 NAME_MAX_LENGTH = 100
 DESCRIPTION_MAX_LENGTH = 1000
+ALLOWED_VALUES_BY_TRAIT_SET = {
+    UmbrealTraitSet.DISTINCTIONS: (D8,),
+    UmbrealTraitSet.ATTRIBUTES: DEFAULT_ALLOWED_VALUES,
+    UmbrealTraitSet.SKILLS: DEFAULT_ALLOWED_VALUES,
+    UmbrealTraitSet.POWERS: POWER_ALLOWED_VALUES,
+    UmbrealTraitSet.SIGNATURE_ASSETS: SIGNATURE_ASSET_ALLOWED_VALUES,
+    UmbrealTraitSet.ASSETS: DEFAULT_ALLOWED_VALUES,
+    UmbrealTraitSet.COMPLICATIONS: DEFAULT_ALLOWED_VALUES,
+}
 
 
 class UmbrealSheetTraitForm(BaseModel):
@@ -156,6 +168,8 @@ async def umbreal_delete(request: Request, current_game_id: int, character_id: i
         if await check_permissions(context, require_player=True):
             if model := UmbrealSheet.get(session, current_game_id, context.current_user.id, character_id):
                 session.delete(model)
+                UmbrealTraitsVersion.bump(session, current_game_id)
+                CharacterSheetVersion.bump(session, current_game_id, UMBREAL_SHEET_TYPE.name, character_id)
                 session.commit()
             else:
                 context.errors.append("Failed to locate entity")
@@ -196,6 +210,8 @@ async def umbreal_sheet(request: Request, current_game_id: int, sheet: UmbrealSh
             session.add(model)
 
         _populate_model(model, sheet, current_game_id)
+        UmbrealTraitsVersion.bump(session, current_game_id)
+        CharacterSheetVersion.bump(session, current_game_id, UMBREAL_SHEET_TYPE.name, model.character_id)
         session.commit()
 
         response.success = True
@@ -205,6 +221,52 @@ async def umbreal_sheet(request: Request, current_game_id: int, sheet: UmbrealSh
         return response
 
 
+@umbreal_router.get("/{current_game_id}/umbreal/api/sheets")
+async def umbreal_api_sheets(request: Request, current_game_id: int) -> list[dict[str, Any]]:
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if not await check_permissions(context) or not (context.permissions.is_gm or context.permissions.is_player):
+            raise HTTPException(403, "You must be a player to view character sheets.")
+        assert context.current_user
+        return get_sheets(
+            session,
+            current_game_id,
+            UMBREAL_SHEET_TYPE,
+            member_id=None if context.permissions.is_gm else context.current_user.id,
+        )
+
+
+@umbreal_router.post("/{current_game_id}/umbreal/api/sheets", response_model=SheetChangesResponse)
+async def umbreal_api_sheets_upsert(
+        request: Request, current_game_id: int, changes: SheetChanges
+) -> SheetChangesResponse:
+    response = SheetChangesResponse()
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if not await check_permissions(context) or not (context.permissions.is_gm or context.permissions.is_player):
+            response.errors.append("You must be a player to edit character sheets.")
+            return response
+        assert context.current_user
+        # GMs can import the sheets of every character at once, while players can only change their own
+        report = upsert_sheets(
+            session,
+            current_game_id,
+            UMBREAL_SHEET_TYPE,
+            changes.sheets,
+            member_id=None if context.permissions.is_gm else context.current_user.id,
+            validate=validate_umbreal_sheet,
+        )
+        if report.errors:
+            response.errors = report.errors
+            return response
+        UmbrealTraitsVersion.bump(session, current_game_id)
+        session.commit()
+
+        response.success = True
+        response.versions = report.versions
+        return response
+
+
 def _setup_context(session: Session, context: RequestContext) -> None:
     context.extra["characters"] = (
         (character.id, character.name) for character in
@@ -263,6 +325,32 @@ def _validate_form(form: UmbrealSheetForm) -> Iterable[str]:
                 yield f"XP milestone level must be less than {DESCRIPTION_MAX_LENGTH} characters long"
 
 
+def validate_umbreal_sheet(sheet: dict[str, Any], children: dict[str, list[dict[str, Any]]]) -> Iterable[str]:
+    for trait in children["traits"]:
+        yield from _validate_text("Trait name", trait["name"], NAME_MAX_LENGTH)
+        yield from _validate_text(f"Trait {trait['name']} description", trait["description"], DESCRIPTION_MAX_LENGTH)
+        if trait["value"] not in ALLOWED_VALUES_BY_TRAIT_SET[trait["set"]]:
+            yield f"Invalid value for trait {trait['name']}"
+    for lawbreak in children["lawbreaks"]:
+        yield from _validate_text("Lawbreak name", lawbreak["name"], NAME_MAX_LENGTH)
+        yield from _validate_text(
+            f"Lawbreak {lawbreak['name']} description", lawbreak["description"], DESCRIPTION_MAX_LENGTH
+        )
+    for name in ("xp_1_milestone", "xp_3_milestone", "xp_10_milestone"):
+        yield from _validate_text("XP milestone level", sheet[name], DESCRIPTION_MAX_LENGTH)
+    if sheet["plot_points"] < 0:
+        yield "Plot points cannot be negative"
+    if sheet["xp_current"] < 0 or sheet["xp_lifetime"] < 0:
+        yield "XP cannot be negative"
+
+
+def _validate_text(label: str, value: str, max_length: int) -> Iterable[str]:
+    if not value:
+        yield f"{label} cannot be empty"
+    elif len(value) > max_length:
+        yield f"{label} must be less than {max_length} characters long"
+
+
 def _populate_model(model: UmbrealSheet, form: UmbrealSheetForm, current_game_id: int) -> None:
     model.game_guild_id = current_game_id
     model.character_id = form.character_id
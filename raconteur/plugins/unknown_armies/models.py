@@ -4,7 +4,7 @@ from enum import Enum
 from typing import Optional
 
 from sqlalchemy import Column, Enum as EnumType, ForeignKey, Integer, String, Boolean, select
-from sqlalchemy.orm import relationship, backref, Session
+from sqlalchemy.orm import relationship, backref, Session, contains_eager
 
 from raconteur.models.base import Base
 from raconteur.plugin import PluginModelMixin
@@ -107,6 +107,18 @@ class UnknownArmiesSheet(PluginModelMixin, Base):
             )
         ]
 
+    @classmethod
+    def get_all_of_location(cls, session: Session, guild_id: int, location_id: int) -> list[UnknownArmiesSheet]:
+        # Characters and skills are loaded along with the sheets, in a single query
+        return list(session.execute(
+            select(UnknownArmiesSheet)
+            .join(UnknownArmiesSheet.character)
+            .outerjoin(UnknownArmiesSheet.skills)
+            .where(UnknownArmiesSheet.game_guild_id == guild_id, Character.location_id == location_id)
+            .options(contains_eager(UnknownArmiesSheet.character), contains_eager(UnknownArmiesSheet.skills))
+            .order_by(Character.name)
+        ).unique().scalars())
+
     @classmethod
     def get_for_character(cls, session: Session, character_id: int) -> Optional[UnknownArmiesSheet]:
         row = session.execute(
@@ -10,7 +10,7 @@ from raconteur.exceptions import CommandException
 from raconteur.models.base import get_session
 from raconteur.plugin import Plugin
 from raconteur.plugins.character.communication import send_broadcast
-from raconteur.plugins.character.models import Character
+from raconteur.plugins.character.models import Character, Location
 from raconteur.plugins.character.plugin import get_channel_character
 from raconteur.plugins.unknown_armies.models import UnknownArmiesSheet, UnknownArmiesSkill, UnknownArmiesAbility
 from raconteur.plugins.unknown_armies.web import unknown_armies_router, ua_list
@@ -56,75 +56,46 @@ class UnknownArmiesPlugin(Plugin):
             rank: str = SkillCheckRank.SIGNIFICANT.value,
             shift: Optional[int] = None,
     ) -> Optional[str]:
-        try:
-            skill_check_rank = SkillCheckRank(rank)
-        except ValueError:
-            raise CommandException(f"Invalid rank: `{rank}`")
-
+        skill_check_rank = _get_skill_check_rank(rank)
         with get_session() as session:
             sheet = _get_sheet(ctx, session)
-            skill, ability = _get_stat(sheet, stat)
-            ability_score = sheet.get_ability_score(ability)
-
-            result = random.randint(1, 100)
-            result_str = str(result).zfill(2)
-            is_matched = result_str[0] == result_str[1]
-            is_fumble = result == 0
-            is_crit = result == 1
-
-            if skill:
-                score = f"{skill.name} [{skill.value}]"
-            else:
-                score = f"{ability.value} [{ability_score}]"
-            message = f"**{sheet.character.name}** rolls **{result_str}** using **{score}**"
-            if shift is not None and skill is not None:
-                message += f" with a skill shift of **{shift}**"
-            if skill_check_rank == SkillCheckRank.MINOR:
-                message += " (minor)"
-            elif skill_check_rank == SkillCheckRank.SIGNIFICANT:
-                message += " (significant)"
-            elif skill_check_rank == SkillCheckRank.MAJOR:
-                message += " (major)"
-            message += ": "
-
-            if is_fumble:
-                result_type = SkillCheckResultType.CRITICAL_FAILURE
-            elif is_crit:
-                result_type = SkillCheckResultType.CRITICAL_SUCCESS
-            elif skill_check_rank in (SkillCheckRank.MINOR, SkillCheckRank.SIGNIFICANT):
-                if skill is not None:
-                    if result <= skill.value + (shift or 0):
-                        result_type = SkillCheckResultType.SUCCESS
-                    else:
-                        if skill_check_rank == SkillCheckRank.SIGNIFICANT and result <= ability_score:
-                            result_type = SkillCheckResultType.WEAK_SUCCESS
-                        else:
-                            result_type = SkillCheckResultType.FAILURE
-                else:
-                    if result <= ability_score - 30:
-                        result_type = SkillCheckResultType.WEAK_SUCCESS
-                    else:
-                        result_type = SkillCheckResultType.FAILURE
-            elif skill_check_rank == SkillCheckRank.MAJOR:
-                if skill is not None and result <= skill.value + (shift or 0):
-                    result_type = SkillCheckResultType.SUCCESS
-                elif is_matched or is_crit:
-                    result_type = SkillCheckResultType.SUCCESS
-                else:
-                    result_type = SkillCheckResultType.FAILURE
-            else:
-                raise ValueError(f"Invalid rank: {skill_check_rank}")
-
-            message += f"**{result_type.value}**"
-            if is_matched and not is_fumble:
-                message += " (matched)"
-
+            message = _roll_skill_check(sheet, stat, skill_check_rank, shift)
             if sheet.character.location:
                 await send_broadcast(ctx.guild, sheet.character.location, message)
                 return None
             else:
                 return message
 
+    @command(
+        help_msg="Rolls the same check for every character with a sheet in the location of this channel, and shares "
+                 "all the results at once. Takes the same `stat`, `rank` and `shift` as `.ua`.",
+        requires_gm=True
+    )
+    async def ua_group(
+            self,
+            ctx: CommandCallContext,
+            stat: str,
+            rank: str = SkillCheckRank.SIGNIFICANT.value,
+            shift: Optional[int] = None,
+    ) -> None:
+        skill_check_rank = _get_skill_check_rank(rank)
+        with get_session() as session:
+            location = Location.get_for_channel(session, ctx.guild.id, ctx.channel.id)
+            if not location:
+                raise CommandException("Group checks need to be rolled from the channel of a location.")
+            sheets = UnknownArmiesSheet.get_all_of_location(session, ctx.guild.id, location.id)
+            if not sheets:
+                raise CommandException(f"Nobody in **{location.name}** has an Unknown Armies sheet.")
+
+            lines = [f"**The GM** calls for a group check using `{stat}`:"]
+            for sheet in sheets:
+                try:
+                    lines.append(_roll_skill_check(sheet, stat, skill_check_rank, shift))
+                except CommandException as e:
+                    # A character missing the skill shouldn't prevent the others from rolling
+                    lines.append(f"**{sheet.character.name}** cannot roll: {e}")
+            await send_broadcast(ctx.guild, location, "\n".join(lines))
+
     @classmethod
     def get_web_router(cls) -> Optional[APIRouter]:
         return unknown_armies_router
@@ -138,6 +109,72 @@ class UnknownArmiesPlugin(Plugin):
         }
 
 
+def _get_skill_check_rank(rank: str) -> SkillCheckRank:
+    try:
+        return SkillCheckRank(rank)
+    except ValueError:
+        raise CommandException(f"Invalid rank: `{rank}`")
+
+
+def _roll_skill_check(sheet: UnknownArmiesSheet, stat: str, rank: SkillCheckRank, shift: Optional[int]) -> str:
+    skill, ability = _get_stat(sheet, stat)
+    ability_score = sheet.get_ability_score(ability)
+
+    result = random.randint(1, 100)
+    result_str = str(result).zfill(2)
+    is_matched = result_str[0] == result_str[1]
+    is_fumble = result == 0
+    is_crit = result == 1
+
+    if skill:
+        score = f"{skill.name} [{skill.value}]"
+    else:
+        score = f"{ability.value} [{ability_score}]"
+    message = f"**{sheet.character.name}** rolls **{result_str}** using **{score}**"
+    if shift is not None and skill is not None:
+        message += f" with a skill shift of **{shift}**"
+    if rank == SkillCheckRank.MINOR:
+        message += " (minor)"
+    elif rank == SkillCheckRank.SIGNIFICANT:
+        message += " (significant)"
+    elif rank == SkillCheckRank.MAJOR:
+        message += " (major)"
+    message += ": "
+
+    if is_fumble:
+        result_type = SkillCheckResultType.CRITICAL_FAILURE
+    elif is_crit:
+        result_type = SkillCheckResultType.CRITICAL_SUCCESS
+    elif rank in (SkillCheckRank.MINOR, SkillCheckRank.SIGNIFICANT):
+        if skill is not None:
+            if result <= skill.value + (shift or 0):
+                result_type = SkillCheckResultType.SUCCESS
+            else:
+                if rank == SkillCheckRank.SIGNIFICANT and result <= ability_score:
+                    result_type = SkillCheckResultType.WEAK_SUCCESS
+                else:
+                    result_type = SkillCheckResultType.FAILURE
+        else:
+            if result <= ability_score - 30:
+                result_type = SkillCheckResultType.WEAK_SUCCESS
+            else:
+                result_type = SkillCheckResultType.FAILURE
+    elif rank == SkillCheckRank.MAJOR:
+        if skill is not None and result <= skill.value + (shift or 0):
+            result_type = SkillCheckResultType.SUCCESS
+        elif is_matched or is_crit:
+            result_type = SkillCheckResultType.SUCCESS
+        else:
+            result_type = SkillCheckResultType.FAILURE
+    else:
+        raise ValueError(f"Invalid rank: {rank}")
+
+    message += f"**{result_type.value}**"
+    if is_matched and not is_fumble:
+        message += " (matched)"
+    return message
+
+
 def _get_stat(
         sheet: UnknownArmiesSheet, stat: str
 ) -> tuple[Optional[UnknownArmiesSkill], UnknownArmiesAbility]:
@@ -1,14 +1,16 @@
 import http
-from typing import Optional
+from typing import Optional, Any, Iterable
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from starlette.requests import Request
 from starlette.responses import Response, RedirectResponse
 
 from raconteur.models.base import get_session
-from raconteur.plugins.character.models import Character
+from raconteur.plugins.character.models import Character, CharacterSheetVersion
+from raconteur.plugins.character.world import UNKNOWN_ARMIES_SHEET_TYPE, SheetChanges, SheetChangesResponse, \
+    get_sheets, upsert_sheets
 from raconteur.plugins.unknown_armies.models import UnknownArmiesSheet, UnknownArmiesMadness, UnknownArmiesAbility, \
     UnknownArmiesSkill
 from raconteur.web.context import RequestContext
@@ -117,6 +119,7 @@ async def ua_delete(request: Request, current_game_id: int, character_id: int) -
         if await check_permissions(context, require_player=True):
             if model := UnknownArmiesSheet.get(session, current_game_id, context.current_user.id, character_id):
                 session.delete(model)
+                CharacterSheetVersion.bump(session, current_game_id, UNKNOWN_ARMIES_SHEET_TYPE.name, character_id)
                 session.commit()
             else:
                 context.errors.append("Failed to locate entity")
@@ -141,53 +144,7 @@ async def ua_sheet(request: Request, current_game_id: int, sheet: UnknownArmiesS
             if not character:
                 response.errors.append("Failed to locate character.")
 
-        if sheet.body < 0 or sheet.body > 100:
-            response.errors.append("Your Body score must be between 0 and 100.")
-        if sheet.speed < 0 or sheet.speed > 100:
-            response.errors.append("Your Speed score must be between 0 and 100.")
-        if sheet.mind < 0 or sheet.mind > 100:
-            response.errors.append("Your Mind score must be between 0 and 100.")
-        if sheet.soul < 0 or sheet.soul > 100:
-            response.errors.append("Your Soul score must be between 0 and 100.")
-
-        if sheet.xp < 0:
-            response.errors.append("Your XP cannot be negative.")
-
-        if sheet.violence_hardened < 0 or sheet.violence_hardened > 10:
-            response.errors.append("Your Violence (Hardened) score must be between 0 and 10.")
-        if sheet.violence_failed < 0 or sheet.violence_failed > 5:
-            response.errors.append("Your Violence (Failed) score must be between 0 and 5.")
-
-        if sheet.unnatural_hardened < 0 or sheet.unnatural_hardened > 10:
-            response.errors.append("Your Unnatural (Hardened) score must be between 0 and 10.")
-        if sheet.unnatural_failed < 0 or sheet.unnatural_failed > 5:
-            response.errors.append("Your Unnatural (Failed) score must be between 0 and 5.")
-
-        if sheet.helplessness_hardened < 0 or sheet.helplessness_hardened > 10:
-            response.errors.append("Your Helplessness (Hardened) score must be between 0 and 10.")
-        if sheet.helplessness_failed < 0 or sheet.helplessness_failed > 5:
-            response.errors.append("Your Helplessness (Failed) score must be between 0 and 5.")
-
-        if sheet.isolation_hardened < 0 or sheet.isolation_hardened > 10:
-            response.errors.append("Your Isolation (Hardened) score must be between 0 and 10.")
-        if sheet.isolation_failed < 0 or sheet.isolation_failed > 5:
-            response.errors.append("Your Isolation (Failed) score must be between 0 and 5.")
-
-        if sheet.self_hardened < 0 or sheet.self_hardened > 10:
-            response.errors.append("Your Self (Hardened) score must be between 0 and 10.")
-        if sheet.self_failed < 0 or sheet.self_failed > 5:
-            response.errors.append("Your Self (Failed) score must be between 0 and 5.")
-
-        has_obsession_skill = 0
-        for skill in sheet.skills:
-            if skill.is_obsession:
-                has_obsession_skill += 1
-            if skill.value < 0 or skill.value > 100:
-                response.errors.append(f"Your {skill.name} skill must be between 0 and 100.")
-        if not has_obsession_skill:
-            response.errors.append("You must choose an obsession skill.")
-        elif has_obsession_skill > 1:
-            response.errors.append("You can only choose one obsession skill.")
+        response.errors.extend(_get_sheet_errors(sheet.dict(), [skill.dict() for skill in sheet.skills]))
 
         model = UnknownArmiesSheet.get_for_character(session, sheet.character_id)
         if sheet.is_editing and not model:
@@ -203,6 +160,7 @@ async def ua_sheet(request: Request, current_game_id: int, sheet: UnknownArmiesS
             session.add(model)
 
         _populate_model(model, sheet, current_game_id)
+        CharacterSheetVersion.bump(session, current_game_id, UNKNOWN_ARMIES_SHEET_TYPE.name, model.character_id)
         session.commit()
 
         response.success = True
@@ -212,6 +170,103 @@ async def ua_sheet(request: Request, current_game_id: int, sheet: UnknownArmiesS
         return response
 
 
+@unknown_armies_router.get("/{current_game_id}/unknown_armies/api/sheets")
+async def ua_api_sheets(request: Request, current_game_id: int) -> list[dict[str, Any]]:
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if not await check_permissions(context) or not (context.permissions.is_gm or context.permissions.is_player):
+            raise HTTPException(403, "You must be a player to view character sheets.")
+        assert context.current_user
+        return get_sheets(
+            session,
+            current_game_id,
+            UNKNOWN_ARMIES_SHEET_TYPE,
+            member_id=None if context.permissions.is_gm else context.current_user.id,
+        )
+
+
+@unknown_armies_router.post("/{current_game_id}/unknown_armies/api/sheets", response_model=SheetChangesResponse)
+async def ua_api_sheets_upsert(request: Request, current_game_id: int, changes: SheetChanges) -> SheetChangesResponse:
+    response = SheetChangesResponse()
+    with get_session() as session:
+        context = await RequestContext.build(session, request, current_game_id)
+        if not await check_permissions(context) or not (context.permissions.is_gm or context.permissions.is_player):
+            response.errors.append("You must be a player to edit character sheets.")
+            return response
+        assert context.current_user
+        # GMs can import the sheets of every character at once, while players can only change their own
+        report = upsert_sheets(
+            session,
+            current_game_id,
+            UNKNOWN_ARMIES_SHEET_TYPE,
+            changes.sheets,
+            member_id=None if context.permissions.is_gm else context.current_user.id,
+            validate=validate_unknown_armies_sheet,
+        )
+        if report.errors:
+            response.errors = report.errors
+            return response
+        session.commit()
+
+        response.success = True
+        response.versions = report.versions
+        return response
+
+
+def validate_unknown_armies_sheet(sheet: dict[str, Any], children: dict[str, list[dict[str, Any]]]) -> Iterable[str]:
+    return _get_sheet_errors(sheet, children["skills"])
+
+
+def _get_sheet_errors(sheet: dict[str, Any], skills: list[dict[str, Any]]) -> Iterable[str]:
+    if sheet["body"] < 0 or sheet["body"] > 100:
+        yield "Your Body score must be between 0 and 100."
+    if sheet["speed"] < 0 or sheet["speed"] > 100:
+        yield "Your Speed score must be between 0 and 100."
+    if sheet["mind"] < 0 or sheet["mind"] > 100:
+        yield "Your Mind score must be between 0 and 100."
+    if sheet["soul"] < 0 or sheet["soul"] > 100:
+        yield "Your Soul score must be between 0 and 100."
+
+    if sheet["xp"] < 0:
+        yield "Your XP cannot be negative."
+
+    if sheet["violence_hardened"] < 0 or sheet["violence_hardened"] > 10:
+        yield "Your Violence (Hardened) score must be between 0 and 10."
+    if sheet["violence_failed"] < 0 or sheet["violence_failed"] > 5:
+        yield "Your Violence (Failed) score must be between 0 and 5."
+
+    if sheet["unnatural_hardened"] < 0 or sheet["unnatural_hardened"] > 10:
+        yield "Your Unnatural (Hardened) score must be between 0 and 10."
+    if sheet["unnatural_failed"] < 0 or sheet["unnatural_failed"] > 5:
+        yield "Your Unnatural (Failed) score must be between 0 and 5."
+
+    if sheet["helplessness_hardened"] < 0 or sheet["helplessness_hardened"] > 10:
+        yield "Your Helplessness (Hardened) score must be between 0 and 10."
+    if sheet["helplessness_failed"] < 0 or sheet["helplessness_failed"] > 5:
+        yield "Your Helplessness (Failed) score must be between 0 and 5."
+
+    if sheet["isolation_hardened"] < 0 or sheet["isolation_hardened"] > 10:
+        yield "Your Isolation (Hardened) score must be between 0 and 10."
+    if sheet["isolation_failed"] < 0 or sheet["isolation_failed"] > 5:
+        yield "Your Isolation (Failed) score must be between 0 and 5."
+
+    if sheet["self_hardened"] < 0 or sheet["self_hardened"] > 10:
+        yield "Your Self (Hardened) score must be between 0 and 10."
+    if sheet["self_failed"] < 0 or sheet["self_failed"] > 5:
+        yield "Your Self (Failed) score must be between 0 and 5."
+
+    has_obsession_skill = 0
+    for skill in skills:
+        if skill["is_obsession"]:
+            has_obsession_skill += 1
+        if skill["value"] < 0 or skill["value"] > 100:
+            yield f"Your {skill['name']} skill must be between 0 and 100."
+    if not has_obsession_skill:
+        yield "You must choose an obsession skill."
+    elif has_obsession_skill > 1:
+        yield "You can only choose one obsession skill."
+
+
 def _setup_context(session: Session, context: RequestContext) -> None:
     context.extra["characters"] = (
         (character.id, character.name) for character in
@@ -1,7 +1,12 @@
+from functools import partial
 from typing import Optional, Any, Iterable
 
 from discord import Guild, TextChannel, PermissionOverwrite, CategoryChannel
+from fuzzywuzzy.fuzz import WRatio
 from fuzzywuzzy.process import extractOne
+from fuzzywuzzy.utils import full_process
+
+FUZZY_SEARCH_SCORE_CUTOFF = 50
 
 
 async def get_or_create_channel_by_name(
@@ -48,7 +53,28 @@ def get_category_by_name(guild: Guild, category_name: str) -> Optional[CategoryC
 
 
 def fuzzy_search(query: str, options: Iterable[str]) -> Optional[str]:
-    result = extractOne(query, sorted(options), score_cutoff=50)
+    result = extractOne(query, sorted(options), score_cutoff=FUZZY_SEARCH_SCORE_CUTOFF)
     if result is not None:
         return result[0]
     return None
+
+
+class FuzzyIndex:
+    """Same lookup as fuzzy_search over a fixed set of options, which are sorted and normalized once up front."""
+
+    processed_options: dict[str, str]
+
+    def __init__(self, options: Iterable[str]):
+        self.processed_options = {option: full_process(option, force_ascii=True) for option in sorted(options)}
+
+    def search(self, query: str) -> Optional[str]:
+        result = extractOne(
+            full_process(query, force_ascii=True),
+            self.processed_options,
+            processor=None,
+            scorer=partial(WRatio, full_process=False),
+            score_cutoff=FUZZY_SEARCH_SCORE_CUTOFF,
+        )
+        if result is not None:
+            return result[2]
+        return None
@@ -1,26 +1,40 @@
+import asyncio
+import http
+import logging
 from typing import Any, Optional
 
-from aiocached import cached
+import httpx
 from authlib.integrations.starlette_client import OAuth, StarletteRemoteApp
-from discord import Forbidden, NotFound
+from discord import HTTPException
 from fastapi import APIRouter
 from loginpass import Discord
 from loginpass.discord import normalize_userinfo
 from pydantic import BaseModel
+from sqlalchemy import select
 from starlette.config import Config as StarletteConfig
 from starlette.requests import Request
 from starlette.responses import RedirectResponse, Response
 
 from raconteur.config import config
+from raconteur.models.base import get_session
 from raconteur.models.game import Game
 from raconteur.web.client import get_client
 from raconteur.web.loginpass_ext import create_fastapi_routes
 
+DISCORD_OAUTH_SCOPES = ("identify", "email", "guilds", "guilds.members.read")
+DISCORD_MAX_ATTEMPTS = 3
+# Longer waits mean a global rate limit, which isn't worth holding up the login for
+DISCORD_MAX_RETRY_AFTER = 10
+
 
 class AuthenticatedUser(BaseModel):
     id: int
     username: str
     email: str
+    # Games the user is a member of, and their roles in each of them, fetched once at login
+    guild_ids: list[int] = []
+    # Games whose roles couldn't be fetched are missing, to be looked up again when visited
+    guild_roles: dict[int, list[int]] = {}
 
 
 class Permissions(BaseModel):
@@ -35,31 +49,57 @@ def get_authenticated_user(request: Request) -> Optional[AuthenticatedUser]:
     return AuthenticatedUser.parse_obj(user_data) if user_data else None
 
 
-async def get_permissions(
-        game: Optional[Game], user: Optional[AuthenticatedUser]
-) -> Permissions:
+def get_permissions(game: Optional[Game], user: Optional[AuthenticatedUser]) -> Permissions:
     permissions = Permissions()
     if game is not None and user is not None:
-        role_ids = await _get_member_roles(game.guild_id, user.id)
-        permissions.is_member = role_ids is not None
-        if role_ids:
+        permissions.is_member = game.guild_id in user.guild_ids
+        if role_ids := user.guild_roles.get(game.guild_id):
             permissions.is_gm = game.gm_role_id in role_ids
             permissions.is_player = game.player_role_id in role_ids
             permissions.is_spectator = game.spectator_role_id in role_ids
     return permissions
 
 
+async def resolve_missing_roles(request: Request, user: AuthenticatedUser, guild_id: int) -> None:
+    """Looks up through the bot the roles of a game which couldn't be fetched at login, and caches them on success."""
+    if guild_id not in user.guild_ids or guild_id in user.guild_roles:
+        return
+    client = await get_client()
+    try:
+        member = await client.http.get_member(guild_id, user.id)
+    except HTTPException as e:
+        logging.warning(f"Failed to fetch the roles of user {user.id} in guild {guild_id}: {e}")
+        return
+    user.guild_roles[guild_id] = [int(role_id) for role_id in member["roles"]]
+    request.session["user"] = user.dict()
+
+
 async def async_normalize_info(client: Any, data: Any) -> dict[str, Any]:
     # Fix for async apps: authlib expects an async function, but the Discord integration doesn't provide that
     return normalize_userinfo(client, data)
 
 
 async def handle_authorize(
-        remote: StarletteRemoteApp, token: Optional[str], user_info: Optional[dict[str, Any]], request: Request
+        remote: StarletteRemoteApp,
+        token: Optional[dict[str, Any]],
+        user_info: Optional[dict[str, Any]],
+        request: Request,
 ) -> Response:
     request.session["user"] = None
     if user_info:
-        user = AuthenticatedUser(id=int(user_info["sub"]), username=user_info["name"], email=user_info["email"])
+        try:
+            guild_ids, guild_roles = await _get_guild_memberships(remote, token)
+        except httpx.HTTPError as e:
+            # Without the guild list there's no telling which games are accessible, so the login has to be retried
+            logging.warning(f"Failed to fetch the guilds of user {user_info['sub']}: {e}")
+            return RedirectResponse(request.url_for("home"))
+        user = AuthenticatedUser(
+            id=int(user_info["sub"]),
+            username=user_info["name"],
+            email=user_info["email"],
+            guild_ids=guild_ids,
+            guild_roles=guild_roles,
+        )
         request.session["user"] = user.dict()
     return RedirectResponse(request.url_for("home"))
 
@@ -75,16 +115,47 @@ def get_auth_router() -> APIRouter:
     )
     oauth = OAuth(oauth_config)
     Discord.OAUTH_CONFIG["userinfo_compliance_fix"] = async_normalize_info
+    Discord.OAUTH_CONFIG["client_kwargs"]["scope"] = " ".join(DISCORD_OAUTH_SCOPES)
     router = create_fastapi_routes([Discord], oauth, handle_authorize)
     router.add_api_route("/logout", logout)
     return router
 
 
-@cached(ttl=60)
-async def _get_member_roles(guild_id: int, user_id: int) -> Optional[list[int]]:
-    client = await get_client()
-    try:
-        user = await client.http.get_member(guild_id, user_id)
-    except (Forbidden, NotFound):
+async def _get_guild_memberships(
+        remote: StarletteRemoteApp, token: Optional[dict[str, Any]]
+) -> tuple[list[int], dict[int, list[int]]]:
+    guild_ids = {int(guild["id"]) for guild in await _get_discord_resource(remote, token, "users/@me/guilds") or []}
+
+    # Roles are only needed for the guilds which are also games, which are usually few of all the user's guilds
+    with get_session() as session:
+        game_guild_ids = list(session.execute(select(Game.guild_id).where(Game.guild_id.in_(guild_ids))).scalars())
+    guild_roles = {}
+    # One at a time, as this endpoint has a tight rate limit for each user
+    for guild_id in game_guild_ids:
+        try:
+            member = await _get_discord_resource(remote, token, f"users/@me/guilds/{guild_id}/member")
+        except httpx.HTTPError as e:
+            logging.warning(f"Failed to fetch the roles in guild {guild_id}, they will be fetched on access: {e}")
+            continue
+        if member is not None:
+            guild_roles[guild_id] = [int(role_id) for role_id in member["roles"]]
+    return game_guild_ids, guild_roles
+
+
+async def _get_discord_resource(remote: StarletteRemoteApp, token: Optional[dict[str, Any]], path: str) -> Any:
+    """Fetches a resource from the Discord API on behalf of the user, waiting out short rate limits.
+
+    Returns None if the resource doesn't exist, and raises on any other failure.
+    """
+    for attempt in range(1, DISCORD_MAX_ATTEMPTS + 1):
+        response = await remote.get(path, token=token)
+        if response.status_code != http.HTTPStatus.TOO_MANY_REQUESTS:
+            break
+        retry_after = float(response.json().get("retry_after", 1))
+        if attempt == DISCORD_MAX_ATTEMPTS or retry_after > DISCORD_MAX_RETRY_AFTER:
+            break
+        await asyncio.sleep(retry_after)
+    if response.status_code == http.HTTPStatus.NOT_FOUND:
         return None
-    return [int(role_id) for role_id in user["roles"]]
+    response.raise_for_status()
+    return response.json()
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio
 from dataclasses import dataclass, field
 from typing import Optional, Any
 
@@ -10,7 +9,8 @@ from sqlalchemy.orm import Session
 from starlette.requests import Request
 
 from raconteur.models.game import Game
-from raconteur.web.auth import AuthenticatedUser, get_authenticated_user, Permissions, get_permissions
+from raconteur.web.auth import AuthenticatedUser, get_authenticated_user, Permissions, get_permissions, \
+    resolve_missing_roles
 
 
 @dataclass
@@ -38,19 +38,23 @@ class RequestContext:
     async def build(
             cls, session: Session, request: Request, current_game_id: Optional[int]
     ) -> RequestContext:
-        games = [game for game, in session.execute(select(Game).order_by(Game.name))]
-        current_game = next((game for game in games if game.guild_id == current_game_id), None)
         current_user = get_authenticated_user(request)
-        all_permissions = await asyncio.gather(*[get_permissions(game, current_user) for game in games])
-        accessible_games = [game for i, game in enumerate(games) if all_permissions[i].is_member]
-
-        if current_game and current_game not in accessible_games:
+        # The guilds of the user are resolved once at login, so the accessible games are found without calling Discord
+        guild_ids = set(current_user.guild_ids) if current_user else set()
+        accessible_games = list(session.execute(
+            select(Game).where(Game.guild_id.in_(guild_ids)).order_by(Game.name)
+        ).scalars())
+        current_game = next((game for game in accessible_games if game.guild_id == current_game_id), None)
+
+        if current_game_id is not None and not current_game and session.get(Game, current_game_id):
             raise HTTPException(403, "You do not have access to this game.")
+        if current_game and current_user:
+            await resolve_missing_roles(request, current_user, current_game.guild_id)
 
         return cls(
             request=request,
             games=accessible_games,
             current_game=current_game,
             current_user=current_user,
-            permissions=await get_permissions(current_game, current_user),
+            permissions=get_permissions(current_game, current_user),
         )